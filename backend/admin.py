@@ -0,0 +1,31 @@
+"""Guard for operations that spend Gemini budget or drop stored reviews.
+
+Clearing the review store and ``refresh=true`` (regenerate a review even when
+one is stored) need an ``X-Admin-Token`` header matching ``ADMIN_TOKEN``.
+Without ``ADMIN_TOKEN`` they are off; old reviews still go away through
+prompt versioning and the store's max age.
+"""
+import hmac
+import os
+
+from fastapi import Header, HTTPException
+from fastapi.responses import JSONResponse
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+def is_admin(token):
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+def require_admin(x_admin_token: str = Header(None)):
+    """Dependency for admin-only endpoints."""
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="This endpoint needs the X-Admin-Token header.")
+
+
+def refresh_forbidden(refresh, token):
+    """403 response when a caller without the admin token asks for ``refresh``, else None."""
+    if refresh and not is_admin(token):
+        return JSONResponse(status_code=403, content={"error": "refresh=true needs the X-Admin-Token header."})
+    return None
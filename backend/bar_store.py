@@ -0,0 +1,331 @@
+"""Local OHLCV bar store with incremental append.
+
+Bars live on disk as one memory-mapped NumPy structured array per
+(symbol, interval), plus a small JSON sidecar recording the exchange
+timezone and how far back the stored history is known to be complete.
+A request fetches the full range once; after that only bars newer than
+the last stored one are downloaded and any range is served as a slice.
+Bars are split and dividend adjusted, so a delta that brings a new split or
+dividend refetches the stored range instead of appending to bars adjusted
+the old way.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from providers import yf
+
+DEFAULT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "bars")
+BAR_STORE_PATH = os.getenv("BAR_STORE_PATH", DEFAULT_ROOT)
+# yfinance only serves a few weeks of intraday bars, no point keeping more.
+INTRADAY_RETENTION_DAYS = int(os.getenv("BAR_STORE_INTRADAY_RETENTION_DAYS", "60"))
+
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+BAR_DTYPE = np.dtype([("ts", "<i8")] + [(name.lower(), "<f8") for name in COLUMNS])
+DAILY_INTERVALS = {"1d", "5d", "1wk", "1mo", "3mo"}
+ACTION_COLUMNS = ["Stock Splits", "Dividends"]
+
+# Periods yfinance counts in trading sessions rather than calendar time.
+SESSION_PERIODS = {"1d": 1, "5d": 5}
+CALENDAR_PERIODS = {
+    "1mo": pd.DateOffset(months=1),
+    "3mo": pd.DateOffset(months=3),
+    "6mo": pd.DateOffset(months=6),
+    "1y": pd.DateOffset(years=1),
+    "2y": pd.DateOffset(years=2),
+    "5y": pd.DateOffset(years=5),
+    "10y": pd.DateOffset(years=10),
+}
+
+
+def required_start(period, now):
+    """Earliest UTC day a ``period`` request can reach back to (None = all)."""
+    if period == "max":
+        return None
+    if period == "ytd":
+        return pd.Timestamp(year=now.year, month=1, day=1, tz="UTC")
+    if period in SESSION_PERIODS:
+        # Leave room for weekends and holidays; the slice trims to sessions.
+        return (now - pd.Timedelta(days=SESSION_PERIODS[period] + 4)).normalize()
+    if period in CALENDAR_PERIODS:
+        return (now - CALENDAR_PERIODS[period]).normalize()
+    raise ValueError(f"Unsupported period: {period}")
+
+
+def to_bars(frame):
+    """yfinance history DataFrame -> BAR_DTYPE array (UTC epoch seconds)."""
+    if frame is None or frame.empty or "Close" not in frame:
+        return np.empty(0, dtype=BAR_DTYPE)
+    frame = frame.dropna(subset=["Close"])
+    index = frame.index if frame.index.tz is not None else frame.index.tz_localize("UTC")
+    bars = np.empty(len(frame), dtype=BAR_DTYPE)
+    bars["ts"] = index.tz_convert("UTC").as_unit("s").asi8
+    for name in COLUMNS:
+        bars[name.lower()] = frame[name].to_numpy(dtype=float) if name in frame else np.nan
+    return bars
+
+
+def localize_frame(frame, tz, interval):
+    """Daily bars without a timezone are exchange-local dates; give them ``tz``."""
+    if frame is None or frame.empty or frame.index.tz is not None or not tz or interval not in DAILY_INTERVALS:
+        return frame
+    return frame.tz_localize(tz, ambiguous=False, nonexistent="shift_forward")
+
+
+def latest_action(frame):
+    """UTC epoch seconds of the last bar with a split or dividend, or None."""
+    if frame is None or frame.empty:
+        return None
+    hits = np.zeros(len(frame), dtype=bool)
+    for name in ACTION_COLUMNS:
+        if name in frame:
+            hits |= frame[name].fillna(0).to_numpy(dtype=float) != 0
+    if not hits.any():
+        return None
+    index = frame.index if frame.index.tz is not None else frame.index.tz_localize("UTC")
+    return int(index[np.flatnonzero(hits)[-1]].tz_convert("UTC").timestamp())
+
+
+def to_frame(bars, tz, interval):
+    index = pd.to_datetime(bars["ts"], unit="s", utc=True).tz_convert(tz or "UTC")
+    index.name = "Date" if interval in DAILY_INTERVALS else "Datetime"
+    return pd.DataFrame({name: bars[name.lower()] for name in COLUMNS}, index=index)
+
+
+def localize(value, tz="UTC"):
+    """Timestamp in ``tz``; naive dates are read as exchange-local, like yfinance does."""
+    value = pd.Timestamp(value)
+    return value.tz_localize(tz or "UTC") if value.tz is None else value.tz_convert(tz or "UTC")
+
+
+def merge(old, new):
+    """Replace everything in ``old`` from ``new``'s first bar onwards."""
+    if old is None or not len(old):
+        return new
+    if not len(new):
+        return old
+    return np.concatenate([old[old["ts"] < new["ts"][0]], new])
+
+
+class BarStore:
+    def __init__(self, root):
+        self.root = root
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock_for(self, symbol, interval):
+        with self._locks_guard:
+            return self._locks.setdefault((symbol, interval), threading.Lock())
+
+    def _paths(self, symbol, interval):
+        directory = os.path.join(self.root, interval)
+        safe = symbol.replace("/", "_")
+        return os.path.join(directory, f"{safe}.npy"), os.path.join(directory, f"{safe}.json")
+
+    def read(self, symbol, interval):
+        bars_path, meta_path = self._paths(symbol, interval)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            return np.load(bars_path, mmap_mode="r"), meta
+        except (OSError, ValueError):
+            return None, None
+
+    def write(self, symbol, interval, bars, meta):
+        bars_path, meta_path = self._paths(symbol, interval)
+        os.makedirs(os.path.dirname(bars_path), exist_ok=True)
+        # Write to temp files and swap in, so readers never see a partial file.
+        # Temp names are per writer: other workers may be storing the same symbol.
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(bars_path + suffix, "wb") as f:
+            np.save(f, np.ascontiguousarray(bars))
+        with open(meta_path + suffix, "w") as f:
+            json.dump(meta, f)
+        os.replace(bars_path + suffix, bars_path)
+        os.replace(meta_path + suffix, meta_path)
+
+    @staticmethod
+    def covers(meta, start):
+        if meta is None:
+            return False
+        if meta.get("complete"):
+            return True
+        return start is not None and meta.get("coversFrom") is not None and meta["coversFrom"] <= start.timestamp()
+
+    @staticmethod
+    def covered_start(meta):
+        """Start of the range a partition holds (None = full history)."""
+        if meta.get("complete") or meta.get("coversFrom") is None:
+            return None
+        return pd.Timestamp(meta["coversFrom"], unit="s", tz="UTC")
+
+    @staticmethod
+    def readjusted(meta, fetched, interval):
+        """Whether a delta carries a split or dividend the stored bars don't reflect."""
+        action = latest_action(localize_frame(fetched, (meta or {}).get("tz"), interval))
+        return action is not None and action > (meta or {}).get("adjustedThrough", float("-inf"))
+
+    @staticmethod
+    def delta_start(bars, meta, interval):
+        """Where an incremental fetch starts: the last stored bar, inclusive,
+        so a still-forming bar (today's daily bar) gets overwritten."""
+        last = pd.Timestamp(int(bars["ts"][-1]), unit="s", tz="UTC")
+        if interval in DAILY_INTERVALS:
+            return last.tz_convert(meta.get("tz") or "UTC").normalize()
+        return last
+
+    def _fetch(self, symbol, interval, start=None):
+        ticker = yf.Ticker(symbol)
+        if start is None:
+            return ticker.history(period="max", interval=interval)
+        return ticker.history(start=start, interval=interval)
+
+    def _download(self, symbols, interval, start=None):
+        """One bulk ``yf.download`` split back into per-symbol frames."""
+        kwargs = {"period": "max"} if start is None else {"start": start}
+        # ignore_tz=False: daily bars keep their exchange timezone, as Ticker.history returns them
+        data = yf.download(
+            symbols, interval=interval, group_by="ticker", auto_adjust=True, actions=True,
+            ignore_tz=False, threads=True, progress=False, **kwargs,
+        )
+        frames = {}
+        for symbol in symbols:
+            if isinstance(data.columns, pd.MultiIndex):
+                if symbol not in data.columns.get_level_values(0):
+                    frames[symbol] = pd.DataFrame()
+                    continue
+                frame = data[symbol]
+            else:
+                frame = data
+            frames[symbol] = frame.dropna(how="all")
+        return frames
+
+    def _store(self, symbol, interval, bars, meta, fetched, start, full, now, replace=False):
+        """Merge freshly fetched bars and persist. ``full`` means ``fetched``
+        is a complete download from ``start`` rather than a delta;
+        ``replace`` drops the stored bars instead of merging into them.
+
+        ``bars`` must not be a memory map of the file being replaced.
+        """
+        fetched = localize_frame(fetched, (meta or {}).get("tz"), interval)
+        new = to_bars(fetched)
+        if not len(new):
+            # Unknown symbol, a throttled response or simply no new bars:
+            # keep what we have and don't claim any new coverage.
+            return bars, meta
+        meta = dict(meta or {})
+        if fetched.index.tz is not None:
+            meta["tz"] = str(fetched.index.tz)
+        if full:
+            meta["complete"] = start is None
+            meta["coversFrom"] = None if start is None else start.timestamp()
+            # Everything up to here carries the adjustment of this download
+            meta["adjustedThrough"] = int(new["ts"][-1])
+        bars = new if replace else merge(bars, new)
+        if interval not in DAILY_INTERVALS and len(bars):
+            cutoff = (now - pd.Timedelta(days=INTRADAY_RETENTION_DAYS)).timestamp()
+            bars = bars[bars["ts"] >= cutoff]
+            if meta.get("complete") or (meta.get("coversFrom") or 0) < cutoff:
+                meta["complete"], meta["coversFrom"] = False, cutoff
+        meta["updatedAt"] = now.timestamp()
+        self.write(symbol, interval, bars, meta)
+        return bars, meta
+
+    def _slice(self, bars, meta, interval, period=None, start=None, end=None):
+        if bars is None or not len(bars):
+            return pd.DataFrame(columns=COLUMNS)
+        ts = bars["ts"]
+        tz = meta.get("tz")
+        lo = 0 if start is None else int(np.searchsorted(ts, localize(start, tz).timestamp(), side="left"))
+        hi = len(ts) if end is None else int(np.searchsorted(ts, localize(end, tz).timestamp(), side="left"))
+        frame = to_frame(bars[lo:hi], meta.get("tz"), interval)
+        if period in SESSION_PERIODS and not frame.empty:
+            sessions = frame.index.normalize().unique()
+            frame = frame[frame.index >= sessions[-min(SESSION_PERIODS[period], len(sessions))]]
+        return frame
+
+    def bars(self, symbol, interval="1d", period=None, start=None, end=None):
+        """Bars for ``period`` or ``[start, end)``, fetching only what is missing."""
+        now = pd.Timestamp.now(tz="UTC")
+        if period is not None:
+            need = start = required_start(period, now)
+        else:
+            # A day of slack so exchanges east of UTC are covered as well
+            need = localize(start).normalize() - pd.Timedelta(days=1) if start is not None else None
+        end_ts = localize(end) if end is not None else None
+
+        with self._lock_for(symbol, interval):
+            bars, meta = self.read(symbol, interval)
+            if bars is None or not len(bars) or not self.covers(meta, need):
+                fetched = self._fetch(symbol, interval, need)
+            elif end_ts is None or end_ts.timestamp() > bars["ts"][-1]:
+                fetched = self._fetch(symbol, interval, self.delta_start(bars, meta, interval))
+            else:
+                # The requested window is entirely in the past and already stored.
+                return self._slice(bars, meta, interval, period, start, end)
+            full = bars is None or not len(bars) or not self.covers(meta, need)
+            replace = not full and self.readjusted(meta, fetched, interval)
+            if replace:
+                # A new split or dividend changed every earlier adjusted price
+                need = self.covered_start(meta)
+                fetched, full = self._fetch(symbol, interval, need), True
+            # Copy off the memory map before the file underneath it is replaced.
+            bars = None if bars is None else np.array(bars)
+            bars, meta = self._store(symbol, interval, bars, meta, fetched, need, full, now, replace)
+            return self._slice(bars, meta, interval, period, start, end)
+
+    def stored(self, symbol, interval="1d", period=None, start=None, end=None):
+        """Like ``bars`` but without fetching; None if nothing is stored."""
+        if period is not None:
+            start = required_start(period, pd.Timestamp.now(tz="UTC"))
+        with self._lock_for(symbol, interval):
+            bars, meta = self.read(symbol, interval)
+            if bars is None or not len(bars):
+                return None
+            return self._slice(np.array(bars), meta, interval, period, start, end)
+
+    def bars_batch(self, symbols, interval, period):
+        """``bars`` for many symbols with at most two bulk downloads: one full
+        download for symbols not yet stored and one delta for the rest."""
+        now = pd.Timestamp.now(tz="UTC")
+        need = required_start(period, now)
+        stored, missing, delta_starts, metas = [], [], [], {}
+        for symbol in symbols:
+            bars, meta = self.read(symbol, interval)
+            if bars is not None and len(bars) and self.covers(meta, need):
+                stored.append(symbol)
+                delta_starts.append(self.delta_start(bars, meta, interval))
+                metas[symbol] = meta
+            else:
+                missing.append(symbol)
+            del bars
+
+        fetched = {}
+        if missing:
+            fetched.update((s, (f, True)) for s, f in self._download(missing, interval, need).items())
+        if stored:
+            start = min(delta_starts)
+            fetched.update((s, (f, False)) for s, f in self._download(stored, interval, start).items())
+        # Symbols whose delta brings a new split or dividend get their stored range again
+        readjust = {s: self.covered_start(metas[s]) for s in stored if self.readjusted(metas[s], fetched[s][0], interval)}
+        if readjust:
+            starts = list(readjust.values())
+            start = None if None in starts else min(starts)
+            fetched.update((s, (f, True)) for s, f in self._download(list(readjust), interval, start).items())
+
+        result = {}
+        for symbol in symbols:
+            frame, full = fetched[symbol]
+            with self._lock_for(symbol, interval):
+                bars, meta = self.read(symbol, interval)
+                bars = None if bars is None else np.array(bars)
+                bars, meta = self._store(symbol, interval, bars, meta, frame, readjust.get(symbol, need), full, now,
+                                         replace=symbol in readjust)
+                result[symbol] = self._slice(bars, meta, interval, period, need)
+        return result
+
+
+store = BarStore(BAR_STORE_PATH)
@@ -0,0 +1,264 @@
+"""Offline stand-ins for yfinance and Gemini used by the benchmarks.
+
+Fixtures recorded with ``run_benchmarks.py record`` are replayed from
+``benchmarks/fixtures/<SYMBOL>/``; any symbol without a recording gets a
+deterministic synthetic one, so the suite always runs without network.
+"""
+import json
+import os
+import pickle
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+TZ = "America/New_York"
+INTRADAY_FREQ = {"1m": "1min", "15m": "15min"}
+
+BUFFETT_RESPONSE = """**Recommendation:** BUY
+
+### Business Overview
+{company} sells products customers buy again and again, with pricing power that has held up through several cycles.
+
+### Economic Moat
+- Strong brand recognition and switching costs
+- Scale advantages in distribution
+- A loyal customer base that renews every year
+
+### Management Quality
+Management allocates capital rationally, buys back shares below intrinsic value and communicates candidly.
+
+### Financial Health
+Return on equity has stayed above 20% for a decade with modest leverage and growing free cash flow.
+
+### Valuation
+At current prices the business trades at a reasonable discount to a conservative estimate of intrinsic value.
+
+### Final Verdict
+A wonderful business at a fair price; worth owning for the long term.
+"""
+
+MUNGER_RESPONSE = """### Charlie Munger Management Review – {company}
+
+| Factor | Explanation | Rating |
+| ------ | ----------- | :----: |
+| Integrity and honesty in shareholder communications | Clear, candid letters that own up to mistakes. | ★★★★☆ |
+| Competence in capital allocation | Buybacks and acquisitions have compounded value. | ★★★★★ |
+| Long-term vision vs. short-term focus | Invests through cycles and ignores quarterly noise. | ★★★★☆ |
+| Alignment with shareholder interests | Management owns meaningful stock. | ★★★★☆ |
+| Track record of value creation | Book value per share has compounded for decades. | ★★★★★ |
+
+**Overall Munger Management Score:** 4.4 ★ – Exceptional
+
+> **Summary:** A rational, owner-oriented team running a durable franchise. **Recommendation:** BUY
+"""
+
+
+def symbol_seed(symbol):
+    return zlib.crc32(symbol.encode("utf-8"))
+
+
+def fixture_path(symbol, name):
+    return os.path.join(FIXTURES_DIR, symbol.upper(), name)
+
+
+def load_recorded(symbol, name):
+    path = fixture_path(symbol, name)
+    if not os.path.exists(path):
+        return None
+    if path.endswith(".json"):
+        with open(path) as f:
+            return json.load(f)
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def synthetic_index(interval, start, end):
+    if interval in INTRADAY_FREQ:
+        days = pd.bdate_range(start.tz_convert(TZ).normalize().tz_localize(None), end.tz_convert(TZ).tz_localize(None))
+        sessions = [
+            pd.date_range(day + pd.Timedelta(hours=9, minutes=30), day + pd.Timedelta(hours=15, minutes=59),
+                          freq=INTRADAY_FREQ[interval], tz=TZ)
+            for day in days
+        ]
+        index = sessions[0].append(sessions[1:]) if sessions else pd.DatetimeIndex([], tz=TZ)
+        index = index[(index >= start) & (index <= end)]
+        index.name = "Datetime"
+        return index
+    index = pd.bdate_range(start.tz_convert(TZ).tz_localize(None).normalize(), end.tz_convert(TZ).tz_localize(None), tz=TZ)
+    index.name = "Date"
+    return index
+
+
+def synthetic_history(symbol, interval="1d", start=None, end=None):
+    end = pd.Timestamp.now(tz=TZ) if end is None else end
+    start = pd.Timestamp("2005-01-03", tz=TZ) if start is None else start
+    index = synthetic_index(interval, start, end)
+    # Seed by symbol *and* bar time so overlapping fetches agree on prices.
+    rng = np.random.default_rng(symbol_seed(symbol))
+    base = 50 + rng.random() * 250
+    minutes = (index.as_unit("s").asi8 // 60).astype(np.float64)
+    drift = np.sin(minutes / 9000.0) * 0.2 + minutes / 5e7
+    noise = np.sin(minutes * 0.37 + symbol_seed(symbol) % 97) * 0.01
+    close = base * np.exp(drift + noise)
+    return pd.DataFrame({
+        "Open": close * 0.998,
+        "High": close * 1.01,
+        "Low": close * 0.99,
+        "Close": close,
+        "Volume": np.full(len(index), 1_000_000.0),
+    }, index=index)
+
+
+def synthetic_info(symbol):
+    rng = np.random.default_rng(symbol_seed(symbol))
+    price = float(50 + rng.random() * 250)
+    return {
+        "shortName": f"{symbol} Corp",
+        "longName": f"{symbol} Corporation",
+        "sector": ["Technology", "Healthcare", "Financial Services", "Energy"][symbol_seed(symbol) % 4],
+        "regularMarketPrice": price,
+        "regularMarketPreviousClose": price * 0.99,
+        "regularMarketOpen": price * 0.995,
+        "regularMarketTime": int(time.time()),
+        "dayLow": price * 0.98,
+        "dayHigh": price * 1.02,
+        "fiftyTwoWeekLow": price * 0.7,
+        "fiftyTwoWeekHigh": price * 1.2,
+        "marketCap": price * 1e9,
+        "trailingPE": 25.0,
+        "regularMarketVolume": 1_000_000,
+        "dividendYield": 0.5,
+        "trailingEps": price / 25,
+    }
+
+
+def synthetic_earnings_dates(symbol, limit=12):
+    today = pd.Timestamp.now(tz=TZ).normalize()
+    offset = symbol_seed(symbol) % 60
+    index = pd.DatetimeIndex([today - pd.Timedelta(days=offset + 91 * i) for i in range(limit)], name="Earnings Date")
+    rng = np.random.default_rng(symbol_seed(symbol))
+    estimate = np.round(1 + rng.random(limit), 2)
+    actual = np.round(estimate + rng.normal(0, 0.1, limit), 2)
+    return pd.DataFrame({"EPS Estimate": estimate, "Reported EPS": actual, "EPS Actual": actual}, index=index)
+
+
+class FakeTicker:
+    """Replays recorded fixtures, falling back to synthetic data."""
+
+    latency = 0.0
+
+    def __init__(self, symbol):
+        self.symbol = symbol.upper()
+
+    def _pause(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    @property
+    def info(self):
+        self._pause()
+        return load_recorded(self.symbol, "info.json") or synthetic_info(self.symbol)
+
+    def history(self, period=None, interval="1d", start=None, end=None, **kwargs):
+        self._pause()
+        start = pd.Timestamp(start) if start is not None else None
+        if start is not None and start.tz is None:
+            start = start.tz_localize(TZ)
+        end = pd.Timestamp(end) if end is not None else None
+        if end is not None and end.tz is None:
+            end = end.tz_localize(TZ)
+        recorded = load_recorded(self.symbol, f"history_{interval}.pkl")
+        if recorded is not None:
+            frame = recorded
+            if start is not None:
+                frame = frame[frame.index >= start]
+            if end is not None:
+                frame = frame[frame.index < end]
+            return frame
+        return synthetic_history(self.symbol, interval, start, end)
+
+    def get_earnings_dates(self, limit=12):
+        self._pause()
+        recorded = load_recorded(self.symbol, "earnings_dates.pkl")
+        if recorded is not None:
+            return recorded.head(limit)
+        return synthetic_earnings_dates(self.symbol, limit)
+
+
+def fake_download(symbols, interval="1d", start=None, period=None, **kwargs):
+    if isinstance(symbols, str):
+        symbols = symbols.split()
+    frames = {symbol: FakeTicker(symbol).history(interval=interval, start=start) for symbol in symbols}
+    return pd.concat(frames, axis=1)
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """Canned Gemini answers with a configurable generation time."""
+
+    latency = 0.0
+    chunk_size = 200
+
+    def __init__(self, model_name=None, **kwargs):
+        self.model_name = model_name
+
+    @staticmethod
+    def _text_for(prompt):
+        template = MUNGER_RESPONSE if "Munger" in prompt else BUFFETT_RESPONSE
+        return template.format(company="The company")
+
+    @staticmethod
+    def _json_for(prompt):
+        # Structured mode: the canned markdown, parsed into the review's JSON shape
+        from buffett_review_route import parse_llm_response
+        from munger_review_route import parse_munger_response
+
+        if "Munger" in prompt:
+            return json.dumps(parse_munger_response(MUNGER_RESPONSE.format(company="The company")))
+        sections = parse_llm_response(BUFFETT_RESPONSE.format(company="The company"))
+        recommendation = sections.pop("recommendation", "HOLD")
+        return json.dumps({
+            "recommendation": recommendation,
+            "sections": [{"title": title, "content": content} for title, content in sections.items()],
+        })
+
+    def generate_content(self, prompt, stream=False, generation_config=None, **kwargs):
+        if getattr(generation_config, "response_mime_type", None) == "application/json":
+            text = self._json_for(prompt)
+        else:
+            text = self._text_for(prompt)
+        if not stream:
+            time.sleep(self.latency)
+            return FakeResponse(text)
+        return self._stream(text)
+
+    def _stream(self, text):
+        parts = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+        for part in parts:
+            time.sleep(self.latency / max(len(parts), 1))
+            yield FakeResponse(part)
+
+
+def record(symbols):
+    """Save live yfinance responses for ``symbols`` as replayable fixtures."""
+    import yfinance as yf
+
+    for symbol in symbols:
+        symbol = symbol.upper()
+        os.makedirs(os.path.dirname(fixture_path(symbol, "x")), exist_ok=True)
+        ticker = yf.Ticker(symbol)
+        with open(fixture_path(symbol, "info.json"), "w") as f:
+            json.dump(ticker.info, f)
+        for interval, period in (("1d", "max"), ("15m", "60d"), ("1m", "7d")):
+            with open(fixture_path(symbol, f"history_{interval}.pkl"), "wb") as f:
+                pickle.dump(ticker.history(period=period, interval=interval), f)
+        with open(fixture_path(symbol, "earnings_dates.pkl"), "wb") as f:
+            pickle.dump(ticker.get_earnings_dates(limit=40), f)
+        print(f"Recorded fixtures for {symbol}")
@@ -0,0 +1,365 @@
+"""Benchmark every route of the FastAPI app against offline fixtures.
+
+Requests go straight through the ASGI app (no sockets, no HTTP client), with
+yfinance and Gemini replaced by the stand-ins in ``fixtures.py``. For each
+endpoint the run reports throughput, latency percentiles, time to first byte
+and peak Python heap, and it also micro-benchmarks the LLM response parsers
+and measures cold start: ``import main`` and the time until ``/api/ready``
+answers 200, each in a fresh interpreter.
+
+    python benchmarks/run_benchmarks.py --concurrency 16 --requests 400 --output bench.json
+    python benchmarks/run_benchmarks.py --compare bench.json --output bench-new.json
+    python benchmarks/run_benchmarks.py record AAPL MSFT    # needs network
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from unittest import mock
+from urllib.parse import urlencode
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(BENCH_DIR))
+
+import fixtures  # noqa: E402
+
+
+def endpoints(symbols):
+    """(name, method, path, params) for every route exercised by the run."""
+    batch = ",".join(symbols[:50])
+    holdings = ",".join(f"{s}:{i % 7 + 1}" for i, s in enumerate(symbols))
+    return [
+        ("stock-summary", "GET", "/api/stock-summary", lambda s: {"symbol": s}),
+        ("stock-summary-batch", "GET", "/api/stock-summary/batch", lambda s: {"symbols": batch}),
+        ("price-history-1y", "GET", "/api/price-history", lambda s: {"symbol": s, "range": "1y"}),
+        ("price-history-1d", "GET", "/api/price-history", lambda s: {"symbol": s, "range": "1d", "mode": "percent"}),
+        ("price-history-max-columnar", "GET", "/api/price-history",
+         lambda s: {"symbol": s, "range": "max", "format": "columnar", "points": 800, "indicators": "sma50,drawdown"}),
+        ("price-history-batch", "GET", "/api/price-history/batch", lambda s: {"symbols": batch, "range": "6m"}),
+        ("earnings-analysis", "GET", "/api/earnings-analysis", lambda s: {"symbol": s}),
+        ("earnings-study-batch", "GET", "/api/earnings-study", lambda s: {"symbols": batch, "quarters": 40}),
+        ("portfolio", "GET", "/api/portfolio", lambda s: {"holdings": holdings, "range": "5y"}),
+        ("buffett-review", "GET", "/api/buffett-review", lambda s: {"symbol": s}),
+        ("buffett-review-stream", "GET", "/api/buffett-review/stream", lambda s: {"symbol": s}),
+        ("munger-review", "GET", "/api/munger-review", lambda s: {"symbol": s}),
+        ("munger-review-stream", "GET", "/api/munger-review/stream", lambda s: {"symbol": s}),
+        ("snapshot", "GET", "/api/snapshot", lambda s: {"symbol": s, "format": "columnar", "points": 800}),
+        ("stats", "GET", "/api/stats", lambda s: {}),
+    ]
+
+
+async def asgi_request(app, method, path, params):
+    """Run one request through the ASGI app; returns (status, body, ttfb seconds)."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": urlencode(params).encode(), "root_path": "",
+        "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    started = time.perf_counter()
+    response_done = asyncio.Event()
+    request_sent = False
+    status, body, first_byte = None, [], None
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await response_done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status, first_byte
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            if first_byte is None and message.get("body"):
+                first_byte = time.perf_counter() - started
+            body.append(message.get("body", b""))
+            if not message.get("more_body"):
+                response_done.set()
+
+    await app(scope, receive, send)
+    response_done.set()
+    return status, b"".join(body), first_byte
+
+
+class Lifespan:
+    """Drive the app's ASGI lifespan so startup/shutdown hooks run as under uvicorn."""
+
+    def __init__(self, app):
+        self.app = app
+        self.queue = asyncio.Queue()
+        self.events = asyncio.Queue()
+
+    async def __aenter__(self):
+        async def send(message):
+            await self.events.put(message)
+
+        self.task = asyncio.ensure_future(self.app({"type": "lifespan", "asgi": {"version": "3.0"}}, self.queue.get, send))
+        await self.queue.put({"type": "lifespan.startup"})
+        await self.events.get()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.queue.put({"type": "lifespan.shutdown"})
+        await self.events.get()
+        await self.task
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {
+        "p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99),
+        "mean": round(statistics.fmean(ordered) * 1000, 3), "max": round(ordered[-1] * 1000, 3),
+    }
+
+
+async def run_endpoint(app, endpoint, symbols, requests, concurrency):
+    name, method, path, params = endpoint
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(symbols[i % len(symbols)])
+    latencies, ttfbs, errors = [], [], 0
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            symbol = queue.get_nowait()
+            started = time.perf_counter()
+            status, body, ttfb = await asgi_request(app, method, path, params(symbol))
+            latencies.append(time.perf_counter() - started)
+            if ttfb is not None:
+                ttfbs.append(ttfb)
+            if status is None or status >= 400 or b"event: error" in body:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughputRps": round(requests / elapsed, 2),
+        "latencyMs": percentiles(latencies),
+        "ttfbMs": percentiles(ttfbs),
+    }
+
+
+async def measure_memory(app, endpoint, symbols, requests, concurrency):
+    """Peak Python heap while serving ``requests`` (run separately, tracing is slow)."""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    await run_endpoint(app, endpoint, symbols, requests, concurrency)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+def benchmark_parsers(iterations):
+    from buffett_review_route import parse_llm_response
+    from munger_review_route import parse_munger_response
+    from review_schema import BuffettReview, MungerReview
+
+    header, rest = fixtures.MUNGER_RESPONSE.split("| ------ | ----------- | :----: |\n")
+    rows, tail = rest.split("\n\n", 1)
+    large_munger = header + "| ------ | ----------- | :----: |\n" + "\n".join([rows] * 100) + "\n\n" + tail
+    large_buffett = fixtures.BUFFETT_RESPONSE + "".join(
+        f"\n### Appendix {i}\n" + "Detailed commentary on the numbers. " * 40 for i in range(200)
+    )
+    sections = parse_llm_response(large_buffett)
+    large_buffett_json = json.dumps({
+        "recommendation": sections.pop("recommendation", "HOLD"),
+        "sections": [{"title": title, "content": content} for title, content in sections.items()],
+    })
+    large_munger_json = json.dumps(parse_munger_response(large_munger))
+    results = {}
+    for name, parser, text in (
+        ("parse_llm_response", parse_llm_response, large_buffett),
+        ("parse_munger_response", parse_munger_response, large_munger),
+        ("validate BuffettReview", BuffettReview.model_validate_json, large_buffett_json),
+        ("validate MungerReview", MungerReview.model_validate_json, large_munger_json),
+    ):
+        seconds = timeit.timeit(lambda: parser(text), number=iterations)
+        results[name] = {
+            "inputChars": len(text),
+            "iterations": iterations,
+            "meanMs": round(seconds / iterations * 1000, 4),
+        }
+    return results
+
+
+COLD_START_SCRIPT = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter() - started
+sys.path.insert(0, {bench_dir!r})
+from run_benchmarks import Lifespan, asgi_request
+
+async def until_ready():
+    async with Lifespan(main.app):
+        while (await asgi_request(main.app, "GET", "/api/ready", {{}}))[0] != 200:
+            await asyncio.sleep(0.005)
+        return time.perf_counter() - started
+
+print(json.dumps({{"import": imported, "ready": asyncio.run(until_ready())}}))
+"""
+
+
+def measure_cold_start(runs):
+    """Time ``import main`` and start-up until ready, each run in a new process."""
+    script = COLD_START_SCRIPT.format(bench_dir=BENCH_DIR)
+    imports, readies = [], []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, "-W", "ignore", "-c", script],
+                                         cwd=os.path.dirname(BENCH_DIR), text=True)
+        timings = json.loads(output.strip().splitlines()[-1])
+        imports.append(timings["import"])
+        readies.append(timings["ready"])
+    return {"runs": runs, "importMs": percentiles(imports), "readyMs": percentiles(readies)}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def patched_upstreams(args, data_dir):
+    fixtures.FakeTicker.latency = args.market_latency
+    fixtures.FakeGenerativeModel.latency = args.llm_latency
+    return [
+        mock.patch("yfinance.Ticker", fixtures.FakeTicker),
+        mock.patch("yfinance.download", fixtures.fake_download),
+        mock.patch("google.generativeai.GenerativeModel", fixtures.FakeGenerativeModel),
+        mock.patch.dict(os.environ, {
+            "GEMINI_API_KEY": "benchmark",
+            # Measure request handling alone, without background warm-up
+            "PREFETCH_ENABLED": "0",
+            # The fakes can't be overloaded; don't let the limiter shape the numbers
+            "YAHOO_RATE_LIMIT": "100000",
+            "YAHOO_BURST": "100000",
+            "GEMINI_RATE_LIMIT": "100000",
+            "GEMINI_BURST": "100000",
+            "REVIEW_CACHE_PATH": os.path.join(data_dir, "reviews.sqlite3"),
+            "BAR_STORE_PATH": os.path.join(data_dir, "bars"),
+        }),
+    ]
+
+
+async def run(args):
+    import main
+
+    symbols = [f"SYM{i:03d}" for i in range(args.symbols)]
+    selected = [e for e in endpoints(symbols) if not args.only or e[0] in args.only]
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "symbols": args.symbols,
+            "marketLatencyMs": args.market_latency * 1000,
+            "llmLatencyMs": args.llm_latency * 1000,
+        },
+        "endpoints": {},
+    }
+    async with Lifespan(main.app):
+        for endpoint in selected:
+            result = await run_endpoint(main.app, endpoint, symbols, args.requests, args.concurrency)
+            if args.memory:
+                result["peakMemoryKb"] = await measure_memory(
+                    main.app, endpoint, symbols, max(args.requests // 5, 1), args.concurrency
+                )
+            report["endpoints"][endpoint[0]] = result
+            print(f"{endpoint[0]:<28} {result['throughputRps']:>9.1f} rps  "
+                  f"p50 {result['latencyMs']['p50']:>8.2f} ms  p95 {result['latencyMs']['p95']:>8.2f} ms  "
+                  f"p99 {result['latencyMs']['p99']:>8.2f} ms  errors {result['errors']}")
+    report["parsers"] = benchmark_parsers(args.parser_iterations)
+    for name, result in report["parsers"].items():
+        print(f"{name:<28} {result['meanMs']:>9.3f} ms/call on {result['inputChars']} chars")
+    if args.cold_start_runs:
+        report["coldStart"] = measure_cold_start(args.cold_start_runs)
+        print(f"{'cold start':<28} import p50 {report['coldStart']['importMs']['p50']:>8.1f} ms  "
+              f"ready p50 {report['coldStart']['readyMs']['p50']:>8.1f} ms")
+    return report
+
+
+def compare(report, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline_path} ({baseline['meta'].get('commit')}):")
+    for name, result in report["endpoints"].items():
+        old = baseline.get("endpoints", {}).get(name)
+        if not old:
+            continue
+        p50_change = (result["latencyMs"]["p50"] / old["latencyMs"]["p50"] - 1) * 100 if old["latencyMs"]["p50"] else 0
+        rps_change = (result["throughputRps"] / old["throughputRps"] - 1) * 100 if old["throughputRps"] else 0
+        print(f"{name:<28} p50 {p50_change:+7.1f}%   throughput {rps_change:+7.1f}%")
+    old = baseline.get("coldStart")
+    if old and report.get("coldStart"):
+        for key in ("importMs", "readyMs"):
+            change = (report["coldStart"][key]["p50"] / old[key]["p50"] - 1) * 100 if old[key]["p50"] else 0
+            print(f"{'cold start ' + key[:-2]:<28} p50 {change:+7.1f}%")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "record"])
+    parser.add_argument("record_symbols", nargs="*", help="symbols to record (record command only)")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--symbols", type=int, default=20, help="size of the synthetic symbol universe")
+    parser.add_argument("--market-latency", type=float, default=0.0, help="simulated yfinance latency (s)")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="simulated Gemini generation time (s)")
+    parser.add_argument("--parser-iterations", type=int, default=200)
+    parser.add_argument("--only", nargs="*", help="endpoint names to run")
+    parser.add_argument("--cold-start-runs", type=int, default=5, help="fresh processes to time (0 to skip)")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="skip the tracemalloc pass")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        fixtures.record(args.record_symbols)
+        return
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        patches = patched_upstreams(args, data_dir)
+        for patch in patches:
+            patch.start()
+        try:
+            report = asyncio.run(run(args))
+        finally:
+            for patch in reversed(patches):
+                patch.stop()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,30 +1,43 @@
-import os
-import google.generativeai as genai
-import inspect
-
-print("-" * 20)
-print(f"DEBUG: Using google-generativeai version: {genai.__version__}")
-print(f"DEBUG: Library path: {inspect.getfile(genai)}")
-print("-" * 20)
-
-from fastapi import APIRouter, Query, HTTPException
-from fastapi.responses import JSONResponse
-from dotenv import load_dotenv
-import yfinance as yf
-from prompts import BUFFETT_ANALYSIS_PROMPT
+from fastapi import APIRouter, Depends, Header, Query, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+import admin
+import market_data
+import providers
+import review_store
+import review_schema
+import metrics
+import upstream
+from executors import run_market_data
+from providers import genai
+from single_flight import llm_flight
+from streaming import sse_event, stream_text
+from prompts import BUFFETT_ANALYSIS_PROMPT, BUFFETT_JSON_PROMPT, PROMPT_VERSIONS
 import re
 
-# Load environment variables from .env file
-load_dotenv()
-
 router = APIRouter()
 
-# Configure the Gemini API key
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    print("Warning: GEMINI_API_KEY not found in .env file.")
-else:
-    genai.configure(api_key=GEMINI_API_KEY)
+# Gemini is configured by providers on first use
+GEMINI_API_KEY = providers.GEMINI_API_KEY
+
+MODEL_NAME = 'models/gemini-1.5-pro'
+PROMPT_VERSION = PROMPT_VERSIONS['buffett']
+
+def review_prompt(company_name):
+    """The prompt single (non-streamed) reviews are generated and stored under."""
+    template = BUFFETT_JSON_PROMPT if review_schema.STRUCTURED_OUTPUT else BUFFETT_ANALYSIS_PROMPT
+    return template.format(company_name=company_name)
+
+def stored_prompts(company_name):
+    """Prompts reviews of the company are stored under: the single, then the streamed path."""
+    return list(dict.fromkeys((review_prompt(company_name), BUFFETT_ANALYSIS_PROMPT.format(company_name=company_name))))
+
+def cached_review(company_name, max_age_hours=None):
+    """A stored review of the company from either the single or the streamed path."""
+    for prompt in stored_prompts(company_name):
+        cached = review_store.store.get(MODEL_NAME, prompt, max_age_hours, version=PROMPT_VERSION)
+        if cached:
+            return cached
+    return None
 
 def parse_llm_response(response_text):
     sections = {}
@@ -50,36 +63,173 @@ def parse_llm_response(response_text):
 
     return sections
 
+class SectionStream:
+    """Incremental ``parse_llm_response``.
+
+    ``feed`` returns the (title, content) pairs completed by a chunk; a section
+    is complete once the next ``###`` header has fully arrived.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._emitted = 0
+
+    def feed(self, chunk):
+        self.text += chunk
+        return self._take(final=False)
+
+    def close(self):
+        return self._take(final=True)
+
+    def _take(self, final):
+        parts = re.split(r'###\s*(.*?)\n', self.text)
+        # parts = [preamble, title1, content1, title2, content2, ...]
+        available = (len(parts) + 1) // 2
+        complete = available if final else available - 1
+        sections = []
+        while self._emitted < complete:
+            k = self._emitted
+            if k == 0:
+                preamble = parts[0].strip()
+                if preamble:
+                    match = re.match(r'\*\*Recommendation:\*\*\s*(BUY|SELL|HOLD)', preamble, re.IGNORECASE)
+                    if match:
+                        sections.append(('recommendation', match.group(1).upper()))
+                    else:
+                        sections.append(('Introduction', preamble))
+            else:
+                sections.append((parts[2 * k - 1].strip(), parts[2 * k].strip()))
+            self._emitted += 1
+        return sections
+
+def generate_text(prompt):
+    model = genai.GenerativeModel(MODEL_NAME)
+    with metrics.llm_generation(MODEL_NAME, "single") as generation:
+        response = model.generate_content(prompt)
+        generation.usage = getattr(response, 'usage_metadata', None)
+
+    if not response.text:
+        raise HTTPException(status_code=500, detail="LLM did not return a valid response.")
+    return response.text
+
+async def generate_buffett_review(symbol, prompt):
+    if review_schema.STRUCTURED_OUTPUT:
+        review, raw_text = await review_schema.generate(MODEL_NAME, prompt, review_schema.BuffettReview)
+        parsed_sections = review.payload()
+    else:
+        raw_text = await upstream.gemini.call(generate_text, prompt)
+        parsed_sections = parse_llm_response(raw_text)
+
+    await run_market_data(review_store.store.put, 'buffett', symbol, MODEL_NAME, prompt, raw_text, parsed_sections,
+                          version=PROMPT_VERSION)
+    return parsed_sections
+
+async def buffett_review(symbol, refresh=False, info=None):
+    """Parsed Buffett review sections, from the review store or a fresh generation.
+
+    ``info`` skips the fundamentals lookup for callers that already have it.
+    """
+    if info is None:
+        info = await market_data.get_fundamentals(symbol)
+    company_name = info.get('longName', symbol)
+    if not company_name:
+        raise market_data.NoData(f"No data found for symbol: {symbol}")
+
+    prompt = review_prompt(company_name)
+
+    # Serve a stored review unless a refresh was asked for
+    if not refresh:
+        cached = await run_market_data(cached_review, company_name)
+        if cached:
+            return cached["parsed"]
+
+    # One Gemini call per prompt, shared by concurrent requests and, with a
+    # shared cache backend, by the other workers (a refresh always generates)
+    def generate():
+        return generate_buffett_review(symbol, prompt)
+
+    return await llm_flight.do(
+        (MODEL_NAME, review_store.prompt_hash(prompt)),
+        generate if refresh else lambda: review_store.generate_once(MODEL_NAME, prompt, PROMPT_VERSION, generate),
+    )
+
 @router.get("/api/buffett-review")
-def get_buffett_review(symbol: str = Query(..., min_length=1)):
+async def get_buffett_review(symbol: str = Query(..., min_length=1), refresh: bool = Query(False),
+                            x_admin_token: str = Header(None)):
     if not GEMINI_API_KEY:
         raise HTTPException(status_code=500, detail="Server configuration error: Gemini API key not set.")
+    forbidden = admin.refresh_forbidden(refresh, x_admin_token)
+    if forbidden:
+        return forbidden
 
     try:
-        # 1. Fetch company name from yfinance
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
-        company_name = info.get('longName', symbol)
+        return {"sections": await buffett_review(symbol, refresh)}
+    except market_data.NoData as e:
+        return JSONResponse(status_code=404, content={"error": str(e)})
+    except upstream.UpstreamError as e:
+        return upstream.unavailable_response(e)
+    except Exception as e:
+        # Log the error for debugging
+        print(f"Error in get_buffett_review: {e}")
+        return JSONResponse(status_code=500, content={"error": "Failed to generate Buffett-style review.", "details": str(e)})
 
+@router.delete("/api/buffett-review/cache", dependencies=[Depends(admin.require_admin)])
+async def invalidate_buffett_reviews(symbol: str = Query(None)):
+    prompts = await review_store.company_prompts(symbol, stored_prompts) if symbol else ()
+    removed = await run_market_data(review_store.store.invalidate, symbol=symbol, kind='buffett', prompts=prompts)
+    return {"removed": removed}
+
+async def buffett_review_events(symbol, refresh=False):
+    try:
+        info = await market_data.get_fundamentals(symbol)
+        company_name = info.get('longName', symbol)
         if not company_name:
-             return JSONResponse(status_code=404, content={"error": f"No data found for symbol: {symbol}"})
+            yield sse_event("error", {"error": f"No data found for symbol: {symbol}"})
+            return
 
-        # 2. Build the prompt
         prompt = BUFFETT_ANALYSIS_PROMPT.format(company_name=company_name)
 
-        # 3. Call the Gemini API
-        model = genai.GenerativeModel('models/gemini-1.5-pro')
-        response = model.generate_content(prompt)
-
-        # 4. Parse the response and return as JSON
-        if not response.text:
-            raise HTTPException(status_code=500, detail="LLM did not return a valid response.")
-        
-        parsed_sections = parse_llm_response(response.text)
-        
-        return {"sections": parsed_sections}
+        if not refresh:
+            cached = await run_market_data(cached_review, company_name)
+            if cached:
+                for title, content in cached["parsed"].items():
+                    yield sse_event("section", {"title": title, "content": content})
+                yield sse_event("done", {"sections": cached["parsed"]})
+                return
+
+        model = genai.GenerativeModel(MODEL_NAME)
+        parser = SectionStream()
+        async with upstream.gemini.guard():
+            async for text in stream_text(model, prompt):
+                for title, content in parser.feed(text):
+                    yield sse_event("section", {"title": title, "content": content})
+        for title, content in parser.close():
+            yield sse_event("section", {"title": title, "content": content})
+
+        if not parser.text:
+            yield sse_event("error", {"error": "LLM did not return a valid response."})
+            return
+
+        parsed_sections = parse_llm_response(parser.text)
+        await run_market_data(review_store.store.put, 'buffett', symbol, MODEL_NAME, prompt, parser.text, parsed_sections,
+                              version=PROMPT_VERSION)
+        yield sse_event("done", {"sections": parsed_sections})
 
     except Exception as e:
-        # Log the error for debugging
-        print(f"Error in get_buffett_review: {e}")
-        return JSONResponse(status_code=500, content={"error": "Failed to generate Buffett-style review.", "details": str(e)})
+        print(f"Error in stream_buffett_review: {e}")
+        yield sse_event("error", {"error": "Failed to generate Buffett-style review.", "details": str(e)})
+
+@router.get("/api/buffett-review/stream")
+async def stream_buffett_review(symbol: str = Query(..., min_length=1), refresh: bool = Query(False),
+                               x_admin_token: str = Header(None)):
+    if not GEMINI_API_KEY:
+        raise HTTPException(status_code=500, detail="Server configuration error: Gemini API key not set.")
+    forbidden = admin.refresh_forbidden(refresh, x_admin_token)
+    if forbidden:
+        return forbidden
+
+    return StreamingResponse(
+        buffett_review_events(symbol, refresh),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
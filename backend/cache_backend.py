@@ -0,0 +1,419 @@
+"""Cache backends for the market data, review and screening paths.
+
+``CACHE_BACKEND`` picks the implementation behind ``make_cache``:
+
+* ``memory`` (the default): per-process TTL + LRU caches, right for a single
+  worker;
+* ``sqlite``: one SQLite file in WAL mode (``SHARED_CACHE_PATH``) that every
+  worker on the host reads and writes, fronted by a per-process copy that is
+  kept for at most ``SHARED_CACHE_LOCAL_TTL`` seconds. Values are pickled.
+
+With the shared backend workers also coordinate, so an upstream fetch
+happens once per host rather than once per worker. ``coordinate`` takes a
+lease in the same file before fetching, and the other workers wait for the
+result to show up instead of fetching it too. ``leader`` elects the one
+worker that runs background jobs such as the prefetch scheduler.
+"""
+import asyncio
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from executors import run_market_data
+from settings import env_number
+
+MISSING = object()
+
+
+BACKENDS = ("memory", "sqlite")
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").strip().lower()
+if CACHE_BACKEND not in BACKENDS:
+    raise ValueError(f"CACHE_BACKEND must be one of {', '.join(BACKENDS)}, not {CACHE_BACKEND!r}")
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cache.sqlite3")
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", DEFAULT_PATH)
+# Bounds how far a worker's view can lag behind what another worker stored.
+SHARED_CACHE_LOCAL_TTL = env_number("SHARED_CACHE_LOCAL_TTL", 5)
+# A lease outlives a crashed holder by at most this long.
+SHARED_CACHE_LEASE_TTL = env_number("SHARED_CACHE_LEASE_TTL", 60)
+# How long a worker waits on another worker's fetch before fetching itself.
+SHARED_CACHE_FILL_WAIT = env_number("SHARED_CACHE_FILL_WAIT", 30)
+# Shared entries are trimmed back to ``maxsize`` every this many writes.
+PRUNE_EVERY = 64
+
+PROCESS_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+class TTLCache:
+    shared = False
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                # Expired entries stay (LRU-bounded) as a fallback for get_stale
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_stale(self, key):
+        """The last value stored for ``key``, even if it has expired."""
+        with self._lock:
+            entry = self._data.get(key)
+            return MISSING if entry is None else entry[1]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def values(self):
+        """Every value that hasn't expired."""
+        now = time.monotonic()
+        with self._lock:
+            return [value for expires_at, value in self._data.values() if expires_at > now]
+
+    async def aget(self, key):
+        return self.get(key)
+
+    async def aget_many(self, keys):
+        """{key: value} for the ``keys`` with a fresh value."""
+        found = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not MISSING:
+                found[key] = value
+        return found
+
+    async def aget_stale(self, key):
+        return self.get_stale(key)
+
+    async def aset_many(self, items, ttl=None):
+        for key, value in items:
+            self.set(key, value, ttl=ttl)
+
+    async def fill(self, keys, fetch):
+        """``await fetch(keys)`` -> {key: value}. No other process shares this cache."""
+        return await fetch(list(keys))
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL,
+    stored_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_age ON entries (namespace, stored_at);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class SharedStore:
+    """The SQLite file behind every shared cache; one connection per thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            with self._init_lock:
+                if not self._initialized:
+                    directory = os.path.dirname(self.path)
+                    if directory:
+                        os.makedirs(directory, exist_ok=True)
+                # Autocommit: every statement is its own short transaction
+                conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+                conn.execute("PRAGMA journal_mode=WAL")
+                # Losing the last few writes on power loss is fine for a cache
+                conn.execute("PRAGMA synchronous=NORMAL")
+                if not self._initialized:
+                    conn.executescript(_SCHEMA)
+                    self._initialized = True
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, namespace, keys):
+        """{key: (value, expires_at)} for the stored ``keys``, expired or not."""
+        keys = list(keys)
+        if not keys:
+            return {}
+        rows = self._conn().execute(
+            f"SELECT key, value, expires_at FROM entries WHERE namespace = ? AND key IN ({','.join('?' * len(keys))})",
+            [namespace, *keys],
+        ).fetchall()
+        return {key: (value, expires_at) for key, value, expires_at in rows}
+
+    def items(self, namespace):
+        return self._conn().execute(
+            "SELECT key, value FROM entries WHERE namespace = ? AND expires_at > ?", (namespace, time.time())
+        ).fetchall()
+
+    def set(self, namespace, key, value, expires_at):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", (namespace, key, value, expires_at, time.time())
+        )
+
+    def delete(self, namespace, key=None):
+        if key is None:
+            self._conn().execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+        else:
+            self._conn().execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def count(self, namespace):
+        return self._conn().execute("SELECT COUNT(*) FROM entries WHERE namespace = ?", (namespace,)).fetchone()[0]
+
+    def prune(self, namespace, maxsize):
+        """Drop the oldest entries beyond ``maxsize``."""
+        self._conn().execute(
+            "DELETE FROM entries WHERE namespace = ? AND key IN ("
+            "SELECT key FROM entries WHERE namespace = ? ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+            (namespace, namespace, maxsize),
+        )
+
+    def acquire(self, name, owner, ttl):
+        """Take or renew the lease ``name``; True if ``owner`` holds it afterwards."""
+        now = time.time()
+        cursor = self._conn().execute(
+            "INSERT INTO leases VALUES (?, ?, ?) ON CONFLICT(name) DO UPDATE SET "
+            "owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE leases.owner = excluded.owner OR leases.expires_at <= ?",
+            (name, owner, now + ttl, now),
+        )
+        return cursor.rowcount == 1
+
+    def release(self, name, owner):
+        self._conn().execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+
+shared_store = SharedStore(SHARED_CACHE_PATH)
+
+
+def _encode(key):
+    return repr(key)
+
+
+class SQLiteCache:
+    """TTL cache in the shared SQLite file, with a short-lived per-process front.
+
+    Eviction is oldest-written first rather than LRU, so a read never turns
+    into a write. Hit and miss counts are per process.
+
+    The plain methods block on SQLite. Async code uses the ``a*`` variants,
+    which answer from the front on the loop and run everything that touches
+    the file on the market-data pool.
+    """
+
+    shared = True
+
+    def __init__(self, namespace, maxsize, ttl, store=None):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.store = store or shared_store
+        self.hits = 0
+        self.misses = 0
+        self._front = TTLCache(maxsize, SHARED_CACHE_LOCAL_TTL)
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _peek(self, keys):
+        """Fresh shared values for ``keys``, copied into the local front."""
+        rows = self.store.get_many(self.namespace, [_encode(key) for key in keys])
+        now, found = time.time(), {}
+        for key in keys:
+            row = rows.get(_encode(key))
+            if row is not None and row[1] > now:
+                found[key] = pickle.loads(row[0])
+                self._front.set(key, found[key], ttl=min(SHARED_CACHE_LOCAL_TTL, row[1] - now))
+        return found
+
+    def _count(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def get(self, key):
+        value = self._front.get(key)
+        if value is MISSING:
+            value = self._peek([key]).get(key, MISSING)
+        self._count(value is not MISSING, value is MISSING)
+        return value
+
+    async def aget(self, key):
+        return (await self.aget_many([key])).get(key, MISSING)
+
+    async def aget_many(self, keys):
+        """{key: value} for the ``keys`` with a fresh value."""
+        keys = list(keys)
+        found = {}
+        for key in keys:
+            value = self._front.get(key)
+            if value is not MISSING:
+                found[key] = value
+        rest = [key for key in keys if key not in found]
+        if rest:
+            found.update(await run_market_data(self._peek, rest))
+        self._count(len(found), len(keys) - len(found))
+        return found
+
+    def get_stale(self, key):
+        """The last value any worker stored for ``key``, even if it has expired."""
+        row = self.store.get_many(self.namespace, [_encode(key)]).get(_encode(key))
+        return self._front.get_stale(key) if row is None else pickle.loads(row[0])
+
+    async def aget_stale(self, key):
+        return await run_market_data(self.get_stale, key)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self.store.set(self.namespace, _encode(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), time.time() + ttl)
+        self._front.set(key, value, ttl=min(SHARED_CACHE_LOCAL_TTL, ttl))
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % PRUNE_EVERY == 0
+        if prune:
+            self.store.prune(self.namespace, self.maxsize)
+
+    async def aset_many(self, items, ttl=None):
+        def write():
+            for key, value in items:
+                self.set(key, value, ttl=ttl)
+
+        await run_market_data(write)
+
+    def invalidate(self, key=None):
+        self._front.invalidate(key)
+        self.store.delete(self.namespace, None if key is None else _encode(key))
+
+    def values(self):
+        return [pickle.loads(value) for _, value in self.store.items(self.namespace)]
+
+    async def fill(self, keys, fetch):
+        """``await fetch(missing)`` -> {key: value} for the ``keys`` no other worker fills first.
+
+        One worker on the host fetches a given key set at a time; the rest
+        wait (up to ``SHARED_CACHE_FILL_WAIT``) for its values to land here.
+        """
+        keys = list(keys)
+        found = {}
+
+        def ready():
+            found.update(self._peek([key for key in keys if key not in found]))
+            return found if len(found) == len(keys) else MISSING
+
+        async def fetch_rest():
+            found.update(await fetch([key for key in keys if key not in found]))
+            return found
+
+        name = self.namespace + ":" + hashlib.sha1(repr(sorted(map(_encode, keys))).encode()).hexdigest()
+        return await coordinate(name, ready, fetch_rest, run_market_data, store=self.store)
+
+    def stats(self):
+        return {"size": self.store.count(self.namespace), "maxsize": self.maxsize,
+                "hits": self.hits, "misses": self.misses}
+
+
+def make_cache(namespace, maxsize, ttl):
+    """A cache of the configured ``CACHE_BACKEND``."""
+    if CACHE_BACKEND == "sqlite":
+        return SQLiteCache(namespace, maxsize, ttl)
+    return TTLCache(maxsize, ttl)
+
+
+def _try_claim(store, name, owner, ready, lease_ttl):
+    """One attempt at lease ``name``: ``(True, MISSING)`` when this caller should fetch.
+
+    Otherwise ``(False, value)`` with whatever ``ready()`` returns now.
+    """
+    if store.acquire(name, owner, lease_ttl):
+        # A peer may have finished between our miss and taking the lease
+        value = ready()
+        if value is MISSING:
+            return True, MISSING
+        store.release(name, owner)
+        return False, value
+    return False, ready()
+
+
+async def coordinate(name, ready, fetch, run, store=None, wait=None, lease_ttl=None):
+    """Cross-worker single flight for the work named ``name``.
+
+    ``ready()`` (blocking, run with ``run``) returns the result once some
+    worker has produced it, else MISSING; ``fetch()`` is awaited to produce
+    it. Only the lease holder fetches; the others poll ``ready`` for up to
+    ``wait`` seconds. ``lease_ttl`` should cover a slow ``fetch``. With the
+    memory backend this is just ``await fetch()``.
+
+    Each lease attempt is one short call on ``run``; the waits between them
+    are ``asyncio.sleep`` on the loop, so pollers don't hold pool threads.
+    """
+    store = store or (shared_store if CACHE_BACKEND == "sqlite" else None)
+    if store is None:
+        return await fetch()
+    owner = uuid.uuid4().hex
+    deadline = time.monotonic() + (SHARED_CACHE_FILL_WAIT if wait is None else wait)
+    lease_ttl = SHARED_CACHE_LEASE_TTL if lease_ttl is None else lease_ttl
+    delay = 0.02
+    while True:
+        held, value = await run(_try_claim, store, name, owner, ready, lease_ttl)
+        if held or value is not MISSING or time.monotonic() >= deadline:
+            break
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.25)
+    if value is not MISSING:
+        return value
+    try:
+        return await fetch()
+    finally:
+        if held:
+            await run(store.release, name, owner)
+
+
+async def leader(name, ttl):
+    """True while this process holds the ``name`` leadership lease (renewed on every call)."""
+    if CACHE_BACKEND != "sqlite":
+        return True
+    return await run_market_data(shared_store.acquire, f"leader:{name}", PROCESS_ID, ttl)
@@ -1,55 +1,261 @@
+import asyncio
 from fastapi import APIRouter, Query
 from fastapi.responses import JSONResponse
-import yfinance as yf
 from datetime import timedelta
+import numpy as np
 import pandas as pd
+import event_study
+import market_data
+import upstream
+from metrics import stage
+from series import json_values
 
 router = APIRouter()
 
+def earnings_window_prices(hist):
+    closes = hist["Close"].to_numpy(dtype=float)
+    pct_change = (closes - closes[0]) / closes[0] * 100
+    # Cumulative change is the running sum of day-over-day % changes
+    daily_pct = np.zeros_like(closes)
+    daily_pct[1:] = np.diff(closes) / closes[:-1] * 100
+    cum_pct_change = pct_change[0] + np.cumsum(daily_pct)
+    dates = hist.index.strftime('%Y-%m-%d').tolist()
+    return [
+        {"date": d, "close": c, "pctChange": p, "cumPctChange": cp}
+        for d, c, p, cp in zip(
+            dates,
+            np.round(closes, 2).tolist(),
+            np.round(pct_change, 2).tolist(),
+            np.round(cum_pct_change, 2).tolist(),
+        )
+    ]
+
+def earnings_window(earnings_date):
+    """Price window shown around an earnings date: 15 days either side."""
+    start = (earnings_date - timedelta(days=15)).strftime('%Y-%m-%d')
+    end = (earnings_date + timedelta(days=15)).strftime('%Y-%m-%d')
+    return start, end
+
+async def build_earnings_analysis(symbol):
+    """Latest earnings date with the price reaction around it.
+
+    Raises ``market_data.NoData`` when there is no earnings or price data.
+    """
+    # Get earnings dates DataFrame (may be empty)
+    earnings_dates = await market_data.get_earnings_dates(symbol, limit=1)
+    if earnings_dates is None or earnings_dates.empty:
+        raise market_data.NoData("No earnings data found for this symbol.")
+    # Get latest earnings date
+    earnings_date = earnings_dates.index[0]
+    earnings_date_str = earnings_date.strftime('%Y-%m-%d')
+    actual_eps = earnings_dates.iloc[0]["EPS Actual"] if "EPS Actual" in earnings_dates.columns else None
+    expected_eps = earnings_dates.iloc[0]["EPS Estimate"] if "EPS Estimate" in earnings_dates.columns else None
+    surprise = None
+    if actual_eps is not None and expected_eps is not None:
+        surprise = actual_eps - expected_eps
+    # Get price data 15 days before and after earnings
+    start, end = earnings_window(earnings_date)
+    hist = await market_data.get_history(symbol, start=start, end=end)
+    if hist is None or hist.empty:
+        raise market_data.NoData("No price data found for this symbol around earnings date.")
+    # Calculate daily and cumulative % change over the whole window at once
+    with stage("transform"):
+        prices = earnings_window_prices(hist)
+    return {
+        "earningsDate": earnings_date_str,
+        "actualEPS": actual_eps,
+        "expectedEPS": expected_eps,
+        "prices": prices,
+        "surprise": surprise
+    }
+
 @router.get("/api/earnings-analysis")
-def earnings_analysis(symbol: str = Query(..., min_length=1)):
+async def earnings_analysis(symbol: str = Query(..., min_length=1)):
     try:
-        ticker = yf.Ticker(symbol)
-        # Get earnings dates DataFrame (may be empty)
-        earnings_dates = ticker.get_earnings_dates(limit=1)
-        if earnings_dates is None or earnings_dates.empty:
-            return JSONResponse(status_code=404, content={"error": "No earnings data found for this symbol."})
-        # Get latest earnings date
-        earnings_date = earnings_dates.index[0]
-        earnings_date_str = earnings_date.strftime('%Y-%m-%d')
-        actual_eps = earnings_dates.iloc[0]["EPS Actual"] if "EPS Actual" in earnings_dates.columns else None
-        expected_eps = earnings_dates.iloc[0]["EPS Estimate"] if "EPS Estimate" in earnings_dates.columns else None
-        surprise = None
-        if actual_eps is not None and expected_eps is not None:
-            surprise = actual_eps - expected_eps
-        # Get price data 15 days before and after earnings
-        start = (earnings_date - timedelta(days=15)).strftime('%Y-%m-%d')
-        end = (earnings_date + timedelta(days=15)).strftime('%Y-%m-%d')
-        hist = ticker.history(start=start, end=end)
-        if hist is None or hist.empty:
-            return JSONResponse(status_code=404, content={"error": "No price data found for this symbol around earnings date."})
-        # Calculate daily and cumulative % change
-        prices = []
-        base_close = hist.iloc[0]["Close"]
-        cum_pct_change = 0
-        for idx, row in hist.iterrows():
-            pct_change = ((row["Close"] - base_close) / base_close) * 100
-            if len(prices) > 0:
-                cum_pct_change = prices[-1]["cumPctChange"] + ((row["Close"] - prices[-1]["close"]) / prices[-1]["close"]) * 100
-            else:
-                cum_pct_change = pct_change
-            prices.append({
-                "date": idx.strftime('%Y-%m-%d'),
-                "close": round(row["Close"], 2),
-                "pctChange": round(pct_change, 2),
-                "cumPctChange": round(cum_pct_change, 2)
-            })
-        return {
-            "earningsDate": earnings_date_str,
-            "actualEPS": actual_eps,
-            "expectedEPS": expected_eps,
-            "prices": prices,
-            "surprise": surprise
-        }
+        return await build_earnings_analysis(symbol)
+    except market_data.NoData as e:
+        return JSONResponse(status_code=404, content={"error": str(e)})
+    except upstream.UpstreamError as e:
+        return upstream.unavailable_response(e)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": "Earnings analysis unavailable", "details": str(e)})
+
+
+# The study reads one bulk daily history per symbol; "max" shares the frames
+# the prefetcher keeps warm for the max-range chart.
+EARNINGS_STUDY_PERIOD = "max"
+# get_earnings_dates also returns the upcoming (unreported) quarters.
+EARNINGS_UPCOMING_ROWS = 4
+
+
+def reported_earnings(dates, quarters):
+    """The last ``quarters`` announcements that are already out, oldest first.
+
+    Returns ``(timestamps, actual, estimate, surprise_pct)`` with the
+    timestamps as naive exchange-local times.
+    """
+    if dates is None or dates.empty:
+        return pd.DatetimeIndex([]), np.array([]), np.array([]), np.array([])
+    now = pd.Timestamp.now(tz=dates.index.tz)
+    dates = dates[dates.index <= now].sort_index().tail(quarters)
+
+    def column(*names):
+        for name in names:
+            if name in dates.columns:
+                return pd.to_numeric(dates[name], errors="coerce").to_numpy(dtype=float)
+        return np.full(len(dates), np.nan)
+
+    actual = column("Reported EPS", "EPS Actual")
+    estimate = column("EPS Estimate")
+    surprise = column("Surprise(%)")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        surprise = np.where(np.isnan(surprise), (actual - estimate) / np.abs(estimate) * 100, surprise)
+    timestamps = dates.index
+    if timestamps.tz is not None:
+        timestamps = timestamps.tz_convert(event_study.MARKET_TZ).tz_localize(None)
+    return timestamps, actual, estimate, np.where(np.isfinite(surprise), surprise, np.nan)
+
+
+def study_closes(frames, benchmark):
+    """Daily closes on the benchmark's session calendar, one column per symbol."""
+    calendar = event_study.session_dates(frames[benchmark].index)
+    columns = {}
+    for symbol, hist in frames.items():
+        if hist is None or hist.empty:
+            continue
+        close = pd.Series(hist["Close"].to_numpy(dtype=float), index=event_study.session_dates(hist.index))
+        columns[symbol] = close[~close.index.duplicated(keep="last")].reindex(calendar)
+    return pd.DataFrame(columns, index=calendar)
+
+
+def _pct(values, digits=3):
+    return json_values(np.round(np.asarray(values, dtype=float) * 100, digits))
+
+
+def _round(values, digits=3):
+    return json_values(np.round(np.asarray(values, dtype=float), digits))
+
+
+def drift_summary(car):
+    mean, stderr, counts = event_study.average_path(car)
+    return {"meanCarPct": _pct(mean), "stdErrPct": _pct(stderr), "events": counts.tolist()}
+
+
+def regression_summary(surprise, reaction):
+    """Reaction (%) regressed on EPS surprise (%)."""
+    return event_study.regression(surprise, np.asarray(reaction, dtype=float) * 100)
+
+
+async def build_earnings_study(symbols, benchmark="SPY", quarters=40, pre=5, post=20,
+                               model="market", reaction_days=2, matrices=True):
+    """Event study over the last ``quarters`` earnings of every symbol.
+
+    Earnings dates are fetched per symbol (yfinance has no bulk call for
+    them), prices in one bulk history fetch, and all events of all symbols
+    go through ``event_study`` together. Raises ``market_data.NoData`` when
+    no symbol has a usable event.
+    """
+    benchmark = market_data.normalize_symbol(benchmark)
+    dates, frames = await asyncio.gather(
+        asyncio.gather(*(market_data.get_earnings_dates(s, limit=quarters + EARNINGS_UPCOMING_ROWS) for s in symbols),
+                       return_exceptions=True),
+        market_data.get_history_batch(list(dict.fromkeys(symbols + [benchmark])), EARNINGS_STUDY_PERIOD),
+    )
+    if frames.get(benchmark) is None or frames[benchmark].empty:
+        raise market_data.NoData(f"No price data found for benchmark {benchmark}.")
+
+    with stage("transform"):
+        closes = study_closes(frames, benchmark)
+        errors, spans, parts = {}, {}, []
+        for symbol, result in zip(symbols, dates):
+            if isinstance(result, upstream.UpstreamError) and len(symbols) == 1:
+                raise result
+            if isinstance(result, Exception):
+                errors[symbol] = str(result)
+                continue
+            if symbol not in closes.columns:
+                errors[symbol] = "No price data found for this symbol."
+                continue
+            events = reported_earnings(result, quarters)
+            if not len(events[0]):
+                errors[symbol] = "No earnings data found for this symbol."
+                continue
+            start = sum(len(p[0]) for p in parts)
+            spans[symbol] = (start, start + len(events[0]))
+            parts.append(events)
+        if not parts:
+            raise market_data.NoData(next(iter(errors.values()), "No earnings data found."))
+
+        timestamps = pd.DatetimeIndex(np.concatenate([p[0].values for p in parts]))
+        actual, estimate, surprise = (np.concatenate([p[i] for p in parts]) for i in (1, 2, 3))
+        owners = [symbol for symbol, (start, end) in spans.items() for _ in range(end - start)]
+        study = event_study.event_study(closes, benchmark, owners, timestamps, pre=pre, post=post,
+                                        model=model, reaction_days=reaction_days)
+
+        calendar = closes.index
+        day0 = study["day0"]
+        labels = calendar[np.clip(day0, 0, len(calendar) - 1)].strftime("%Y-%m-%d")
+        event_dates = np.where(day0 < len(calendar), labels, None)
+        results = []
+        for symbol, (start, end) in spans.items():
+            rows = slice(start, end)
+            entry = {
+                "symbol": symbol,
+                "events": [
+                    {"announced": ts.strftime("%Y-%m-%d %H:%M"), "eventDate": date, "epsActual": a,
+                     "epsEstimate": e, "surprisePct": s, "reactionPct": r, "driftPct": d, "beta": b}
+                    for ts, date, a, e, s, r, d, b in zip(
+                        timestamps[rows], event_dates[rows], _round(actual[rows], 4), _round(estimate[rows], 4),
+                        _round(surprise[rows]), _pct(study["reaction"][rows]), _pct(study["drift"][rows]),
+                        _round(study["beta"][rows]),
+                    )
+                ],
+                "drift": drift_summary(study["car"][rows]),
+                "regression": regression_summary(surprise[rows], study["reaction"][rows]),
+            }
+            if matrices:
+                entry["returnsPct"] = _pct(study["returns"][rows])
+                entry["carPct"] = _pct(study["car"][rows])
+            results.append(entry)
+
+    return {
+        "benchmark": benchmark,
+        "model": model,
+        "offsets": study["offsets"].tolist(),
+        "reactionDays": reaction_days,
+        "symbols": results,
+        "pooled": {
+            "drift": drift_summary(study["car"]),
+            "regression": regression_summary(surprise, study["reaction"]),
+        },
+        "errors": errors,
+    }
+
+
+@router.get("/api/earnings-study")
+async def earnings_study(
+    symbols: str = Query(..., min_length=1),
+    benchmark: str = Query("SPY", min_length=1),
+    quarters: int = Query(40, ge=1, le=100),
+    pre: int = Query(5, ge=0, le=60),
+    post: int = Query(20, ge=1, le=120),
+    model: str = Query("market", regex="^(market|adjusted)$"),
+    reaction_days: int = Query(2, ge=1, le=10, alias="reactionDays"),
+    matrices: bool = Query(True),
+):
+    try:
+        symbol_list = market_data.parse_symbols(symbols)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    try:
+        study = await build_earnings_study(symbol_list, benchmark, quarters, pre, post, model,
+                                           min(reaction_days, post + 1), matrices)
+        # Already plain JSON types; a JSONResponse skips FastAPI's per-value
+        # encoder pass over the event matrices.
+        return JSONResponse(content=study)
+    except market_data.NoData as e:
+        return JSONResponse(status_code=404, content={"error": str(e)})
+    except upstream.UpstreamError as e:
+        return upstream.unavailable_response(e)
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": "Earnings study unavailable", "details": str(e)})
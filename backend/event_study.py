@@ -0,0 +1,153 @@
+"""Vectorized earnings event study.
+
+The events of every symbol are stacked into one list of (symbol column,
+event day) pairs. Their event windows and market-model estimation windows
+are each a single fancy-indexing gather from a (days x symbols) matrix of
+daily returns built from one bulk history fetch. There is no Python loop
+over events and no history lookup per event.
+
+Returns are simple daily returns; abnormal returns are measured against the
+benchmark column, either with a market model (alpha and beta estimated per
+event over ``ESTIMATION_DAYS`` sessions ending ``ESTIMATION_GAP`` sessions
+before the window) or market-adjusted (alpha 0, beta 1).
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+MARKET_TZ = "America/New_York"
+# Announcements at or after the close move the next session.
+MARKET_CLOSE_HOUR = 16
+ESTIMATION_DAYS = 250
+ESTIMATION_GAP = 10
+# Below this many estimation sessions the market model falls back to market-adjusted.
+MIN_ESTIMATION_DAYS = 60
+
+
+def session_dates(index):
+    """Naive midnight timestamps for a (possibly tz-aware) daily bar index."""
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_convert(MARKET_TZ).tz_localize(None)
+    # Truncating the datetime64 values skips normalize()'s frequency inference
+    return pd.DatetimeIndex(index.values.astype("datetime64[D]"))
+
+
+def daily_returns(closes):
+    values = np.asarray(closes, dtype=float)
+    out = np.full(values.shape, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[1:] = values[1:] / values[:-1] - 1
+    return out
+
+
+def event_days(calendar, timestamps):
+    """Index into ``calendar`` of the first session that can react to each announcement."""
+    stamps = pd.DatetimeIndex(timestamps)
+    if stamps.tz is not None:
+        stamps = stamps.tz_convert(MARKET_TZ).tz_localize(None)
+    dates = stamps.normalize()
+    after_close = stamps.hour >= MARKET_CLOSE_HOUR
+    before = np.searchsorted(calendar.values, dates.values, side="left")
+    after = np.searchsorted(calendar.values, dates.values, side="right")
+    return np.where(after_close, after, before)
+
+
+def _gather(returns, rows, cols):
+    """returns[rows, cols] with out-of-range rows as NaN."""
+    inside = (rows >= 1) & (rows < returns.shape[0])
+    return np.where(inside, returns[np.clip(rows, 0, returns.shape[0] - 1), cols], np.nan)
+
+
+def market_model(returns, market, day0, cols, pre):
+    """Per-event (alpha, beta) from the estimation window before each event."""
+    steps = np.arange(ESTIMATION_DAYS, 0, -1)
+    rows = day0[:, None] - pre - ESTIMATION_GAP - steps[None, :]
+    stock = _gather(returns, rows, cols[:, None])
+    bench = _gather(market[:, None], rows, np.zeros_like(rows))
+    both = ~np.isnan(stock) & ~np.isnan(bench)
+    stock, bench = np.where(both, stock, np.nan), np.where(both, bench, np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        stock_mean = np.nanmean(stock, axis=1)
+        bench_mean = np.nanmean(bench, axis=1)
+        cov = np.nanmean((stock - stock_mean[:, None]) * (bench - bench_mean[:, None]), axis=1)
+        var = np.nanmean((bench - bench_mean[:, None]) ** 2, axis=1)
+        beta = cov / var
+    enough = (both.sum(axis=1) >= MIN_ESTIMATION_DAYS) & np.isfinite(beta)
+    beta = np.where(enough, beta, 1.0)
+    alpha = np.where(enough, stock_mean - beta * bench_mean, 0.0)
+    return alpha, beta
+
+
+def _cumulative(values):
+    """Running sum along each row that stays NaN where the input is missing."""
+    return np.where(np.isnan(values), np.nan, np.nancumsum(values, axis=1))
+
+
+def event_study(closes, benchmark, symbols, timestamps, pre=5, post=20, model="market", reaction_days=2):
+    """Event windows for every (symbol, timestamp) pair.
+
+    ``closes`` holds daily closes, one column per symbol plus ``benchmark``,
+    on the benchmark's session calendar. Returns a dict of arrays, one row
+    per event: ``day0`` (calendar index), ``returns`` (cumulative raw return
+    from the start of the window), ``car`` (cumulative abnormal return),
+    ``reaction`` (abnormal return over the first ``reaction_days`` sessions)
+    and ``drift`` (over the rest of the window), plus ``alpha``/``beta`` and
+    the window ``offsets``. Values are fractions, not percent.
+    """
+    calendar = session_dates(closes.index)
+    returns = daily_returns(closes.to_numpy(dtype=float))
+    market = returns[:, closes.columns.get_loc(benchmark)]
+    cols = closes.columns.get_indexer(list(symbols))
+    day0 = event_days(calendar, timestamps)
+    offsets = np.arange(-pre, post + 1)
+
+    rows = day0[:, None] + offsets[None, :]
+    stock = _gather(returns, rows, cols[:, None])
+    bench = _gather(market[:, None], rows, np.zeros_like(rows))
+    if model == "market":
+        alpha, beta = market_model(returns, market, day0, cols, pre)
+    else:
+        alpha, beta = np.zeros(len(day0)), np.ones(len(day0))
+    abnormal = stock - (alpha[:, None] + beta[:, None] * bench)
+
+    compounded = np.where(np.isnan(stock), np.nan, np.nancumprod(1 + np.nan_to_num(stock), axis=1) - 1)
+    reacting = (offsets >= 0) & (offsets < reaction_days)
+    drifting = offsets >= reaction_days
+    return {
+        "offsets": offsets,
+        "day0": day0,
+        "returns": compounded,
+        "car": _cumulative(abnormal),
+        "reaction": abnormal[:, reacting].sum(axis=1),
+        "drift": abnormal[:, drifting].sum(axis=1),
+        "alpha": alpha,
+        "beta": beta,
+    }
+
+
+def average_path(car):
+    """Mean cumulative abnormal return per offset, with its standard error."""
+    counts = (~np.isnan(car)).sum(axis=0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mean = np.nanmean(car, axis=0)
+        stderr = np.nanstd(car, axis=0, ddof=1) / np.sqrt(counts)
+    return mean, stderr, counts
+
+
+def regression(x, y):
+    """Least squares ``y = intercept + slope * x`` over the pairs where both are known."""
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    known = ~np.isnan(x) & ~np.isnan(y)
+    x, y = x[known], y[known]
+    if x.size < 3 or np.ptp(x) == 0:
+        return {"n": int(x.size), "slope": None, "intercept": None, "r2": None}
+    dx, dy = x - x.mean(), y - y.mean()
+    slope = (dx @ dy) / (dx @ dx)
+    ss_tot = dy @ dy
+    r2 = (slope * (dx @ dy)) / ss_tot if ss_tot else None
+    return {"n": int(x.size), "slope": float(slope), "intercept": float(y.mean() - slope * x.mean()),
+            "r2": None if r2 is None else float(r2)}
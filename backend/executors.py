@@ -0,0 +1,39 @@
+"""Bounded thread pools for blocking upstream work.
+
+yfinance and google-generativeai are blocking libraries, so handlers are
+``async`` and hand the blocking calls to one pool per upstream. Gemini
+generations can take 30 seconds; keeping them in their own small pool means
+they can never occupy the threads that serve cheap quote lookups.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+MARKET_DATA_WORKERS = int(os.getenv("MARKET_DATA_WORKERS", "16"))
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "4"))
+
+market_data_executor = ThreadPoolExecutor(max_workers=MARKET_DATA_WORKERS, thread_name_prefix="market-data")
+llm_executor = ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="llm")
+
+
+async def _run(executor, fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    # Carry context variables into the worker thread, like asyncio.to_thread does.
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, fn, *args, **kwargs)
+    return await loop.run_in_executor(executor, call)
+
+
+async def run_market_data(fn, *args, **kwargs):
+    return await _run(market_data_executor, fn, *args, **kwargs)
+
+
+async def run_llm(fn, *args, **kwargs):
+    return await _run(llm_executor, fn, *args, **kwargs)
+
+
+def shutdown():
+    market_data_executor.shutdown(wait=False, cancel_futures=True)
+    llm_executor.shutdown(wait=False, cancel_futures=True)
@@ -1,13 +1,9 @@
-import google.generativeai as genai
-import os
-from dotenv import load_dotenv
+import providers
+from providers import genai
 
-load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
+if not providers.GEMINI_API_KEY:
     print("No GEMINI_API_KEY found in .env file.")
     exit(1)
-genai.configure(api_key=GEMINI_API_KEY)
 
 print("Available Gemini models:")
 for model in genai.list_models():
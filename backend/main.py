@@ -1,17 +1,59 @@
-from fastapi import FastAPI, Query
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import yfinance as yf
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+# First: reads .env before the other modules read their settings
+import providers
+import buffett_review_route
+import cache_backend
+import executors
+import munger_review_route
+import series
+import market_data
+import metrics
+import prefetch
+import review_store
+import screening_route
+import upstream
+from prompts import PROMPT_VERSIONS
+from single_flight import market_data_flight, llm_flight
+from streaming import sse_event
 from price_history_route import router as price_history_router
+from price_history_route import MODE_PATTERN, RANGE_PATTERN, YF_RANGE_MAP, snapshot_available, snapshot_payload
 from earnings_analysis_route import router as earnings_analysis_router
+from earnings_analysis_route import build_earnings_analysis
 from buffett_review_route import router as buffett_review_router
 from munger_review_route import router as munger_review_router
+from portfolio_route import router as portfolio_router
+from screening_route import router as screening_router
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # Import yfinance and Gemini off the request path; /api/ready reports when done
+    if providers.PROVIDER_WARMUP:
+        providers.warmup.start()
+    # Reviews from older prompt or schema versions are never served again
+    for kind, version in PROMPT_VERSIONS.items():
+        review_store.store.drop_other_versions(kind, version)
+    # Keep the watchlist and popular symbols warm in the background
+    if prefetch.PREFETCH_ENABLED:
+        prefetch.scheduler.start()
+    yield
+    await providers.warmup.stop()
+    await prefetch.scheduler.stop()
+    await screening_route.jobs.shutdown()
+    executors.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(price_history_router)
 app.include_router(earnings_analysis_router)
 app.include_router(buffett_review_router)
 app.include_router(munger_review_router)
+app.include_router(portfolio_router)
+app.include_router(screening_router)
 
 # Allow all origins for development (adjust for production)
 app.add_middleware(
@@ -20,46 +62,216 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Series-Length", "X-Series-Mode", "X-Series-Columns", "X-Stale-Data", "Retry-After", "Server-Timing"],
 )
+app.add_middleware(prefetch.DemandTracker, scheduler=prefetch.scheduler)
+app.add_middleware(upstream.StalenessMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Format market cap (e.g., $2.8 T)
+def format_market_cap(val):
+    if val == 'N/A' or val is None:
+        return 'N/A'
+    try:
+        val = float(val)
+        if val >= 1e12:
+            return f"${val/1e12:.1f} T"
+        elif val >= 1e9:
+            return f"${val/1e9:.1f} B"
+        elif val >= 1e6:
+            return f"${val/1e6:.1f} M"
+        elif val >= 1e3:
+            return f"${val/1e3:.1f} K"
+        else:
+            return f"${val:,.0f}"
+    except Exception:
+        return 'N/A'
+
+def build_stock_summary(info):
+    # yfinance may return an empty dict for invalid symbols
+    if not info or 'shortName' not in info:
+        return None
+    name = info.get('shortName', 'N/A')
+    price = info.get('regularMarketPrice', 'N/A')
+    market_cap = info.get('marketCap', 'N/A')
+    pe_ratio = info.get('trailingPE', 'N/A')
+    sector = info.get('sector', 'N/A')
+    return {
+        "name": name,
+        "price": price if price is not None else 'N/A',
+        "marketCap": format_market_cap(market_cap),
+        "peRatio": pe_ratio if pe_ratio is not None else 'N/A',
+        "sector": sector if sector is not None else 'N/A',
+    }
 
 @app.get("/api/stock-summary")
-def stock_summary(symbol: str = Query(..., min_length=1)):
+async def stock_summary(symbol: str = Query(..., min_length=1)):
     try:
-        ticker = yf.Ticker(symbol)
-        info = ticker.info
-        # yfinance may return an empty dict for invalid symbols
-        if not info or 'shortName' not in info:
+        info = await market_data.get_info(symbol)
+        summary = build_stock_summary(info)
+        if summary is None:
             return JSONResponse(status_code=404, content={"error": "No data found for this symbol."})
-        name = info.get('shortName', 'N/A')
-        price = info.get('regularMarketPrice', 'N/A')
-        market_cap = info.get('marketCap', 'N/A')
-        pe_ratio = info.get('trailingPE', 'N/A')
-        sector = info.get('sector', 'N/A')
-        # Format market cap (e.g., $2.8 T)
-        def format_market_cap(val):
-            if val == 'N/A' or val is None:
-                return 'N/A'
-            try:
-                val = float(val)
-                if val >= 1e12:
-                    return f"${val/1e12:.1f} T"
-                elif val >= 1e9:
-                    return f"${val/1e9:.1f} B"
-                elif val >= 1e6:
-                    return f"${val/1e6:.1f} M"
-                elif val >= 1e3:
-                    return f"${val/1e3:.1f} K"
-                else:
-                    return f"${val:,.0f}"
-            except Exception:
-                return 'N/A'
-        summary = {
-            "name": name,
-            "price": price if price is not None else 'N/A',
-            "marketCap": format_market_cap(market_cap),
-            "peRatio": pe_ratio if pe_ratio is not None else 'N/A',
-            "sector": sector if sector is not None else 'N/A',
-        }
         return summary
+    except upstream.UpstreamError as e:
+        return upstream.unavailable_response(e)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": "Failed to fetch stock summary.", "details": str(e)})
+
+@app.get("/api/stock-summary/batch")
+async def stock_summary_batch(symbols: str = Query(..., min_length=1)):
+    try:
+        symbol_list = market_data.parse_symbols(symbols)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    try:
+        infos = await market_data.get_info_batch(symbol_list)
+        results = []
+        for symbol, info in infos.items():
+            if isinstance(info, Exception):
+                results.append({"symbol": symbol, "error": "Failed to fetch stock summary.", "details": str(info)})
+                continue
+            summary = build_stock_summary(info)
+            if summary is None:
+                results.append({"symbol": symbol, "error": "No data found for this symbol."})
+            else:
+                results.append({"symbol": symbol, **summary})
+        return {"results": results}
+    except upstream.UpstreamError as e:
+        return upstream.unavailable_response(e)
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": "Failed to fetch stock summaries.", "details": str(e)})
+
+SNAPSHOT_PANELS = ("summary", "chart", "earnings", "buffett", "munger")
+
+async def snapshot_panel(name, build):
+    """Run one panel's builder. The payload carries the status the panel's
+    own endpoint would have answered with, plus any stale sources it used."""
+    with upstream.collect_stale() as stale:
+        try:
+            payload = {"status": 200, "data": await build()}
+        except market_data.NoData as e:
+            payload = {"status": 404, "error": str(e)}
+        except upstream.UpstreamError as e:
+            payload = {
+                "status": 503,
+                "error": "Upstream data provider is unavailable, try again later.",
+                "details": str(e),
+                "retryAfter": max(1, math.ceil(e.retry_after or 1)),
+            }
+        except HTTPException as e:
+            payload = {"status": e.status_code, "error": e.detail}
+        except Exception as e:
+            payload = {"status": 500, "error": f"Failed to load {name}.", "details": str(e)}
+    if stale:
+        payload["stale"] = sorted(stale)
+    return name, payload
+
+async def snapshot_events(symbol, panels, range="1y", mode="price", indicators=(), format="records", points=None):
+    """One event per panel, in the order they finish, then ``done``.
+
+    The quote is fetched once and shared by every panel that needs it, so
+    the fast panels arrive within one Yahoo round trip and the reviews
+    follow as Gemini answers (or straight away when they are stored).
+    """
+    started = time.perf_counter()
+    yf_range, interval = YF_RANGE_MAP.get(range, ("1y", "1d"))
+    info = asyncio.ensure_future(market_data.get_info(symbol))
+
+    async def summary():
+        result = build_stock_summary(await info)
+        if result is None:
+            raise market_data.NoData("No data found for this symbol.")
+        return result
+
+    async def chart():
+        hist = await market_data.get_history(symbol, period=yf_range, interval=interval)
+        if not snapshot_available(hist, await info):
+            raise market_data.NoData("Data unavailable")
+        return snapshot_payload(symbol, hist, await info, mode, indicators, interval, format, points)
+
+    def require_key(route):
+        if not route.GEMINI_API_KEY:
+            raise HTTPException(status_code=500, detail="Server configuration error: Gemini API key not set.")
+
+    async def buffett():
+        require_key(buffett_review_route)
+        return {"sections": await buffett_review_route.buffett_review(symbol, info=await info)}
+
+    async def munger():
+        require_key(munger_review_route)
+        return await munger_review_route.munger_review(symbol, info=await info)
+
+    builders = {
+        "summary": summary,
+        "chart": chart,
+        "earnings": lambda: build_earnings_analysis(symbol),
+        "buffett": buffett,
+        "munger": munger,
+    }
+    tasks = [asyncio.ensure_future(snapshot_panel(name, builders[name])) for name in panels]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            name, payload = await finished
+            yield sse_event(name, payload)
+        yield sse_event("done", {"panels": list(panels), "elapsedMs": round((time.perf_counter() - started) * 1000, 1)})
+    finally:
+        # The client went away: stop waiting (shared LLM calls still finish and get stored)
+        for task in tasks:
+            task.cancel()
+        if not info.done():
+            info.cancel()
+        elif not info.cancelled():
+            info.exception()  # retrieved here when no panel needed the quote
+
+@app.get("/api/snapshot")
+async def snapshot(
+    symbol: str = Query(..., min_length=1),
+    panels: str = Query(None),
+    range: str = Query("1y", regex=RANGE_PATTERN),
+    mode: str = Query("price", regex=MODE_PATTERN),
+    indicators: str = Query(None),
+    format: str = Query("records", regex="^(records|columnar)$"),
+    points: int = Query(None, ge=3, le=20000)
+):
+    """Every dashboard panel for a symbol in one server-sent event stream."""
+    try:
+        indicator_names = series.parse_indicators(indicators)
+        panel_names = [p.strip().lower() for p in (panels or "").split(",") if p.strip()] or list(SNAPSHOT_PANELS)
+        unknown = [p for p in panel_names if p not in SNAPSHOT_PANELS]
+        if unknown:
+            raise ValueError(f"Unknown panels: {', '.join(unknown)}. Choose from {', '.join(SNAPSHOT_PANELS)}.")
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+
+    return StreamingResponse(
+        snapshot_events(symbol, list(dict.fromkeys(panel_names)), range, mode, indicator_names, format, points),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/ready")
+def ready():
+    """200 once the upstream client libraries are loaded, 503 until then."""
+    status = providers.warmup.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status, headers={"Retry-After": "1"})
+    return status
+
+@app.get("/api/stats")
+def stats():
+    return {
+        "worker": {"id": cache_backend.PROCESS_ID, "cacheBackend": cache_backend.CACHE_BACKEND},
+        "providers": providers.warmup.status()["providers"],
+        "cache": market_data.cache_stats(),
+        "singleFlight": {
+            "marketData": market_data_flight.stats(),
+            "llm": llm_flight.stats(),
+        },
+        "prefetch": prefetch.scheduler.stats(),
+        "screeningJobs": screening_route.jobs.stats(),
+        "upstream": upstream.stats(),
+    }
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,269 @@
+"""Shared in-process market data layer.
+
+Every router goes through these helpers instead of building its own
+``yf.Ticker`` so one dashboard load only hits Yahoo once per symbol.
+Quotes, slow-moving fundamentals and history bars each have their own
+freshness policy; all caches are TTL bounded and come from ``cache_backend``,
+so with ``CACHE_BACKEND=sqlite`` every worker on the host shares them and a
+miss is fetched by one worker while the others wait for its result. Cache
+hits are answered on the event loop; misses run on the market data executor.
+History misses go to the local bar store, which only downloads bars it
+doesn't have yet.
+"""
+import pandas as pd
+
+import metrics
+import upstream
+from bar_store import store as bar_store
+from cache_backend import MISSING, make_cache
+from executors import run_market_data
+from providers import yf
+from settings import env_number
+from single_flight import market_data_flight
+
+
+class NoData(LookupError):
+    """Yahoo has no data for the symbol (as opposed to Yahoo being unavailable)."""
+
+
+CACHE_SIZE = int(env_number("MARKET_DATA_CACHE_SIZE", 512))
+# regularMarketPrice and friends move every tick; keep them short-lived.
+QUOTE_TTL = env_number("MARKET_DATA_QUOTE_TTL", 15)
+# sector, longName, earnings calendar etc. barely change intraday.
+FUNDAMENTALS_TTL = env_number("MARKET_DATA_FUNDAMENTALS_TTL", 6 * 3600)
+DAILY_HISTORY_TTL = env_number("MARKET_DATA_DAILY_HISTORY_TTL", 15 * 60)
+INTRADAY_HISTORY_TTL = env_number("MARKET_DATA_INTRADAY_HISTORY_TTL", 60)
+
+DAILY_INTERVALS = {"1d", "5d", "1wk", "1mo", "3mo"}
+MAX_BATCH_SYMBOLS = int(env_number("MAX_BATCH_SYMBOLS", 300))
+
+quote_cache = make_cache("quote", CACHE_SIZE, QUOTE_TTL)
+fundamentals_cache = make_cache("fundamentals", CACHE_SIZE, FUNDAMENTALS_TTL)
+history_cache = make_cache("history", CACHE_SIZE, DAILY_HISTORY_TTL)
+
+
+def normalize_symbol(symbol):
+    """The form symbols are cached and keyed under."""
+    return symbol.strip().upper()
+
+
+def parse_symbols(raw):
+    """Split a comma separated symbol list, dropping blanks and duplicates."""
+    symbols = list(dict.fromkeys(normalize_symbol(s) for s in raw.split(",") if s.strip()))
+    if not symbols:
+        raise ValueError("At least one symbol is required.")
+    if len(symbols) > MAX_BATCH_SYMBOLS:
+        raise ValueError(f"At most {MAX_BATCH_SYMBOLS} symbols are allowed per request.")
+    return symbols
+
+
+async def _stale_or_raise(error, source, *candidates):
+    """Serve the first stale candidate after an upstream failure, else re-raise."""
+    if isinstance(error, upstream.UpstreamError):
+        for cache, key in candidates:
+            value = await cache.aget_stale(key)
+            if value is not MISSING:
+                upstream.mark_stale(source)
+                return value
+    raise error
+
+
+def _fetch_info(key, ttl=None):
+    info = yf.Ticker(key).info or {}
+    quote_cache.set(key, info, ttl=ttl)
+    fundamentals_cache.set(("info", key), info)
+    return info
+
+
+async def get_info(symbol, refresh=False, ttl=None):
+    """Full ``ticker.info`` blob, fresh enough for quote fields.
+
+    ``refresh`` skips the cache and ``ttl`` overrides how long the fetched
+    quote stays cached; the prefetch scheduler uses both to warm quotes.
+    """
+    key = normalize_symbol(symbol)
+    info = MISSING if refresh else await quote_cache.aget(key)
+    if info is not MISSING:
+        return info
+
+    def fetch():
+        return upstream.yahoo.call(_fetch_info, key, ttl)
+
+    try:
+        with metrics.stage("yahoo.info"):
+            if refresh:
+                # A refresh must hit Yahoo even when another worker's quote is still fresh
+                return await market_data_flight.do(("info", key, "refresh", ttl), fetch)
+            return await market_data_flight.do(("info", key), lambda: _fill_one(quote_cache, key, fetch))
+    except Exception as e:
+        return await _stale_or_raise(e, "quote", (quote_cache, key), (fundamentals_cache, ("info", key)))
+
+
+async def get_fundamentals(symbol):
+    """``ticker.info`` for slow fields only (sector, longName, ...).
+
+    May be hours old, so never read quote fields from the result.
+    """
+    key = normalize_symbol(symbol)
+    info = await fundamentals_cache.aget(("info", key))
+    if info is not MISSING:
+        return info
+    return await get_info(key)
+
+
+async def get_history(symbol, period=None, interval="1d", start=None, end=None):
+    """Cached OHLCV bars like ``ticker.history``. Treat the result as read-only."""
+    key = (normalize_symbol(symbol), period, interval, start, end)
+    hist = await history_cache.aget(key)
+    if hist is not MISSING:
+        return hist
+
+    def fetch():
+        hist = bar_store.bars(key[0], interval, period=period, start=start, end=end)
+        history_cache.set(key, hist, ttl=_history_ttl(interval))
+        return hist
+
+    try:
+        with metrics.stage("yahoo.history"):
+            return await market_data_flight.do(
+                ("history",) + key, lambda: _fill_one(history_cache, key, lambda: upstream.yahoo.call(fetch))
+            )
+    except upstream.UpstreamError:
+        hist = await history_cache.aget_stale(key)
+        if hist is MISSING:
+            # Fall back to whatever the bar store already has on disk
+            hist = await run_market_data(bar_store.stored, key[0], interval, period=period, start=start, end=end)
+        if hist is None or hist is MISSING:
+            raise
+        upstream.mark_stale("history")
+        return hist
+
+
+async def get_earnings_dates(symbol, limit=12):
+    key = ("earnings", normalize_symbol(symbol), limit)
+    dates = await fundamentals_cache.aget(key)
+    if dates is not MISSING:
+        return dates
+
+    def fetch():
+        dates = yf.Ticker(key[1]).get_earnings_dates(limit=limit)
+        fundamentals_cache.set(key, dates)
+        return dates
+
+    try:
+        with metrics.stage("yahoo.earnings_dates"):
+            return await market_data_flight.do(
+                key, lambda: _fill_one(fundamentals_cache, key, lambda: upstream.yahoo.call(fetch))
+            )
+    except Exception as e:
+        return await _stale_or_raise(e, "earnings", (fundamentals_cache, key))
+
+
+async def _fill_one(cache, key, fetch):
+    """``await fetch()`` unless another worker sharing ``cache`` is already fetching ``key``."""
+    async def fetch_key(keys):
+        return {key: await fetch()}
+
+    return (await cache.fill([key], fetch_key))[key]
+
+
+def _history_ttl(interval):
+    return DAILY_HISTORY_TTL if interval in DAILY_INTERVALS else INTRADAY_HISTORY_TTL
+
+
+async def get_history_batch(symbols, period, interval="1d", refresh=False, ttl=None):
+    """History for many symbols, fetching every cache miss in bulk.
+
+    ``refresh`` skips the cache and ``ttl`` overrides how long the fetched
+    frames stay cached; the prefetch scheduler uses both to warm the cache.
+    """
+    keys = [normalize_symbol(s) for s in symbols]
+    cached = {} if refresh else await history_cache.aget_many((key, period, interval, None, None) for key in keys)
+    result = {cache_key[0]: hist for cache_key, hist in cached.items()}
+    missing = [key for key in dict.fromkeys(keys) if key not in result]
+    if missing:
+        def fetch(symbols):
+            frames = bar_store.bars_batch(symbols, interval, period)
+            for key, hist in frames.items():
+                history_cache.set((key, period, interval, None, None), hist, ttl=ttl or _history_ttl(interval))
+            return frames
+
+        async def download(cache_keys):
+            frames = await upstream.yahoo.call(fetch, [cache_key[0] for cache_key in cache_keys])
+            return {cache_key: frames[cache_key[0]] for cache_key in cache_keys}
+
+        async def fill():
+            cache_keys = [(key, period, interval, None, None) for key in missing]
+            # A refresh must hit Yahoo even when another worker's entries are still fresh
+            filled = await (download(cache_keys) if refresh else history_cache.fill(cache_keys, download))
+            return {cache_key[0]: hist for cache_key, hist in filled.items()}
+
+        try:
+            with metrics.stage("yahoo.download"):
+                frames = await market_data_flight.do(("download", tuple(missing), period, interval), fill)
+        except upstream.UpstreamError as e:
+            frames = {key: await _stale_or_raise(e, "history", (history_cache, (key, period, interval, None, None)))
+                      for key in missing}
+        result.update(frames)
+    return {key: result[key] for key in keys}
+
+
+async def get_info_batch(symbols, refresh=False, ttl=None):
+    """Info with a fresh price for many symbols.
+
+    yfinance has no bulk ``info`` endpoint, so symbols whose fundamentals are
+    already cached get ``regularMarketPrice`` and
+    ``regularMarketPreviousClose`` from one bulk daily download; only symbols
+    we have never seen fall back to ``get_info``. Every other field of such a
+    dict is as old as the fundamentals, so the dicts stay with the caller and
+    never go into ``quote_cache``, where ``get_info`` would serve them as a
+    full quote. Failures are returned in place as exceptions. ``refresh`` and
+    ``ttl`` apply to the bulk daily bars, as in ``get_history_batch``.
+    """
+    keys = [normalize_symbol(s) for s in symbols]
+    result = {} if refresh else await quote_cache.aget_many(keys)
+    unpriced = [key for key in dict.fromkeys(keys) if key not in result]
+    fundamentals = await fundamentals_cache.aget_many(("info", key) for key in unpriced)
+    need_price = [key for key in unpriced if ("info", key) in fundamentals]
+    cold = [key for key in unpriced if ("info", key) not in fundamentals]
+
+    if need_price:
+        try:
+            frames = await get_history_batch(need_price, period="5d", interval="1d", refresh=refresh, ttl=ttl)
+        except Exception:
+            frames = {}
+        for key in need_price:
+            closes = frames.get(key, pd.DataFrame()).get("Close", pd.Series(dtype=float)).dropna()
+            if closes.empty:
+                cold.append(key)
+                continue
+            info = dict(fundamentals[("info", key)])
+            info["regularMarketPrice"] = float(closes.iloc[-1])
+            if len(closes) > 1:
+                info["regularMarketPreviousClose"] = float(closes.iloc[-2])
+            result[key] = info
+
+    if cold:
+        infos = await upstream.fan_out(upstream.yahoo, [lambda key=key: get_info(key) for key in cold])
+        result.update(zip(cold, infos))
+    return {key: result[key] for key in keys}
+
+
+def _collect_cache_metrics():
+    stats = cache_stats()
+    for field in ("hits", "misses"):
+        yield (f"trady_cache_{field}_total", "counter", f"Market data cache {field}.",
+               [({"cache": name}, cache[field]) for name, cache in stats.items()])
+    yield ("trady_cache_entries", "gauge", "Entries held per market data cache.",
+           [({"cache": name}, cache["size"]) for name, cache in stats.items()])
+
+
+def cache_stats():
+    return {
+        "quote": quote_cache.stats(),
+        "fundamentals": fundamentals_cache.stats(),
+        "history": history_cache.stats(),
+    }
+
+
+metrics.registry.add_collector(_collect_cache_metrics)
@@ -0,0 +1,250 @@
+"""Prometheus-style metrics and per-request stage timing.
+
+A small in-process registry rendered in the Prometheus text format at
+``/metrics``, so no client library is needed. Besides the request
+histograms recorded by ``MetricsMiddleware``, code wraps interesting work in
+``stage("name")``; each stage is observed in ``trady_stage_seconds`` and,
+when the client asks for it (``X-Server-Timing: 1`` request header, or
+``SERVER_TIMING_ENABLED=1`` for every request), reported back in a
+``Server-Timing`` response header.
+"""
+import contextvars
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "0").lower() in ("1", "true", "yes")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, key)} {_number(v)}" for key, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def count(self, **labels):
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = self.header()
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = _labels(self.labelnames, key, [("le", _number(bound))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def add_collector(self, collect):
+        """``collect()`` returns ``(name, kind, help, [(labels_dict, value), ...])`` tuples,
+        for values that already live elsewhere (cache stats, breaker state...)."""
+        self.collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collect in self.collectors:
+            for name, kind, help, samples in collect():
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = Histogram(
+    "trady_request_duration_seconds", "Time to the end of the response body, per route.",
+    ("method", "route", "status"),
+)
+REQUESTS_IN_FLIGHT = Gauge("trady_requests_in_flight", "Requests currently being served.")
+STAGE_SECONDS = Histogram("trady_stage_seconds", "Time spent per stage of a request.", ("stage",))
+UPSTREAM_IN_FLIGHT = Gauge("trady_upstream_in_flight", "Upstream calls currently running.", ("provider",))
+REVIEW_CACHE = Counter("trady_review_cache_total", "Review store lookups.", ("model", "result"))
+LLM_SECONDS = Histogram(
+    "trady_llm_generation_seconds", "Gemini generation latency.", ("model", "mode"),
+    buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 45, 60, 90, 120),
+)
+LLM_TOKENS = Counter("trady_llm_tokens_total", "Gemini tokens used.", ("model", "type"))
+REVIEW_VALIDATION = Counter(
+    "trady_review_validation_total", "Structured review answers by validation outcome.", ("model", "result"),
+)
+
+_timings = contextvars.ContextVar("server_timings", default=None)
+
+
+@contextmanager
+def stage(name):
+    """Time a block as stage ``name`` of the current request."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        timings = _timings.get()
+        if timings is not None:
+            timings.append((name, elapsed))
+
+
+class _Generation:
+    usage = None
+
+
+@contextmanager
+def llm_generation(model, mode):
+    """Time a Gemini generation; set ``.usage`` on the yielded object to the
+    response's ``usage_metadata`` to also count its tokens."""
+    generation = _Generation()
+    started = time.perf_counter()
+    with stage("gemini.generate"):
+        yield generation
+    LLM_SECONDS.observe(time.perf_counter() - started, model=model, mode=mode)
+    for kind, field in (("prompt", "prompt_token_count"), ("completion", "candidates_token_count")):
+        count = getattr(generation.usage, field, None)
+        if isinstance(count, int) and count > 0:
+            LLM_TOKENS.inc(count, model=model, type=kind)
+
+
+def server_timing(timings):
+    # Repeated stages (e.g. two history lookups) are summed into one entry.
+    totals = {}
+    for name, seconds in timings:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ", ".join(f'{name.replace(".", "-")};dur={seconds * 1000:.1f}' for name, seconds in totals.items())
+
+
+class MetricsMiddleware:
+    """Records request histograms and, on request, adds a ``Server-Timing`` header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        wants_timing = SERVER_TIMING_ENABLED or (b"x-server-timing", b"1") in scope.get("headers", [])
+        timings = [] if wants_timing else None
+        token = _timings.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if timings is not None:
+                    handler = ("handler", time.perf_counter() - started)
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing(timings + [handler]).encode("latin-1")))
+                    headers.append((b"timing-allow-origin", b"*"))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            _timings.reset(token)
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=status,
+            )
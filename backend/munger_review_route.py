@@ -1,23 +1,43 @@
-import os
-import google.generativeai as genai
-from fastapi import APIRouter, Query, HTTPException
-from fastapi.responses import JSONResponse
-from dotenv import load_dotenv
-import yfinance as yf
-from prompts import MUNGER_ANALYSIS_PROMPT
+from fastapi import APIRouter, Depends, Header, Query, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+import admin
+import market_data
+import providers
+import review_store
+import review_schema
+import metrics
+import upstream
+from executors import run_market_data
+from providers import genai
+from single_flight import llm_flight
+from streaming import sse_event, stream_text
+from prompts import MUNGER_ANALYSIS_PROMPT, MUNGER_JSON_PROMPT, PROMPT_VERSIONS
 import re
 
-# Load environment variables from .env file
-load_dotenv()
-
 router = APIRouter()
 
-# Configure the Gemini API key
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    print("Warning: GEMINI_API_KEY not found in .env file.")
-else:
-    genai.configure(api_key=GEMINI_API_KEY)
+# Gemini is configured by providers on first use
+GEMINI_API_KEY = providers.GEMINI_API_KEY
+
+MODEL_NAME = 'models/gemini-1.5-pro'
+PROMPT_VERSION = PROMPT_VERSIONS['munger']
+
+def review_prompt(company_name):
+    """The prompt single (non-streamed) reviews are generated and stored under."""
+    template = MUNGER_JSON_PROMPT if review_schema.STRUCTURED_OUTPUT else MUNGER_ANALYSIS_PROMPT
+    return template.format(company_name=company_name)
+
+def stored_prompts(company_name):
+    """Prompts reviews of the company are stored under: the single, then the streamed path."""
+    return list(dict.fromkeys((review_prompt(company_name), MUNGER_ANALYSIS_PROMPT.format(company_name=company_name))))
+
+def cached_review(company_name, max_age_hours=None):
+    """A stored review of the company from either the single or the streamed path."""
+    for prompt in stored_prompts(company_name):
+        cached = review_store.store.get(MODEL_NAME, prompt, max_age_hours, version=PROMPT_VERSION)
+        if cached:
+            return cached
+    return None
 
 def parse_munger_response(response_text):
     ratings = []
@@ -63,30 +83,170 @@ def parse_munger_response(response_text):
         "verdict": verdict
     }
 
+class RatingStream:
+    """Incremental parser for the ratings table of a Munger review.
+
+    ``feed`` returns the rating rows completed by a chunk, in the same shape
+    ``parse_munger_response`` produces. Score, summary and verdict only make
+    sense once the whole text is in, so those still come from the full parse.
+    """
+
+    HEADER = re.compile(r"^\|\s*Factor\s*\|\s*Explanation\s*\|\s*Rating\s*\|\s*$")
+
+    def __init__(self):
+        self.text = ""
+        self._pending = ""
+        self._state = "before"
+
+    def feed(self, chunk):
+        self.text += chunk
+        *lines, self._pending = (self._pending + chunk).split("\n")
+        return [row for row in map(self._line, lines) if row]
+
+    def _line(self, line):
+        if self._state == "before":
+            if self.HEADER.match(line):
+                self._state = "separator"
+        elif self._state == "separator":
+            self._state = "rows"
+        elif self._state == "rows":
+            if line.count('|') < 4:
+                self._state = "after"
+                return None
+            parts = [p.strip() for p in line.split('|') if p.strip()]
+            if len(parts) == 3:
+                return {
+                    "criterion": parts[0],
+                    "explanation": parts[1],
+                    "rating": parts[2].count('★')
+                }
+        return None
+
+def generate_text(prompt):
+    model = genai.GenerativeModel(MODEL_NAME)
+    with metrics.llm_generation(MODEL_NAME, "single") as generation:
+        response = model.generate_content(prompt)
+        generation.usage = getattr(response, 'usage_metadata', None)
+
+    if not response.text:
+        raise HTTPException(status_code=500, detail="LLM did not return a valid response.")
+    return response.text
+
+async def generate_munger_review(symbol, prompt):
+    if review_schema.STRUCTURED_OUTPUT:
+        review, raw_text = await review_schema.generate(MODEL_NAME, prompt, review_schema.MungerReview)
+        parsed_data = review.payload()
+    else:
+        raw_text = await upstream.gemini.call(generate_text, prompt)
+        parsed_data = parse_munger_response(raw_text)
+
+    await run_market_data(review_store.store.put, 'munger', symbol, MODEL_NAME, prompt, raw_text, parsed_data,
+                          version=PROMPT_VERSION)
+    return parsed_data
+
+async def munger_review(symbol, refresh=False, info=None):
+    """Parsed Munger review, from the review store or a fresh generation.
+
+    ``info`` skips the fundamentals lookup for callers that already have it.
+    """
+    if info is None:
+        info = await market_data.get_fundamentals(symbol)
+    company_name = info.get('longName', symbol)
+    if not company_name:
+        raise market_data.NoData(f"No data found for symbol: {symbol}")
+
+    prompt = review_prompt(company_name)
+
+    # Serve a stored review unless a refresh was asked for
+    if not refresh:
+        cached = await run_market_data(cached_review, company_name)
+        if cached:
+            return cached["parsed"]
+
+    # One Gemini call per prompt, shared by concurrent requests and, with a
+    # shared cache backend, by the other workers (a refresh always generates)
+    def generate():
+        return generate_munger_review(symbol, prompt)
+
+    return await llm_flight.do(
+        (MODEL_NAME, review_store.prompt_hash(prompt)),
+        generate if refresh else lambda: review_store.generate_once(MODEL_NAME, prompt, PROMPT_VERSION, generate),
+    )
+
 @router.get("/api/munger-review")
-def get_munger_review(symbol: str = Query(..., min_length=1)):
+async def get_munger_review(symbol: str = Query(..., min_length=1), refresh: bool = Query(False),
+                            x_admin_token: str = Header(None)):
     if not GEMINI_API_KEY:
         raise HTTPException(status_code=500, detail="Server configuration error: Gemini API key not set.")
+    forbidden = admin.refresh_forbidden(refresh, x_admin_token)
+    if forbidden:
+        return forbidden
 
     try:
-        ticker = yf.Ticker(symbol)
-        company_name = ticker.info.get('longName', symbol)
+        return await munger_review(symbol, refresh)
+    except market_data.NoData as e:
+        return JSONResponse(status_code=404, content={"error": str(e)})
+    except upstream.UpstreamError as e:
+        return upstream.unavailable_response(e)
+    except Exception as e:
+        print(f"Error in get_munger_review: {e}")
+        return JSONResponse(status_code=500, content={"error": "Failed to generate Munger-style review.", "details": str(e)})
+
+@router.delete("/api/munger-review/cache", dependencies=[Depends(admin.require_admin)])
+async def invalidate_munger_reviews(symbol: str = Query(None)):
+    prompts = await review_store.company_prompts(symbol, stored_prompts) if symbol else ()
+    removed = await run_market_data(review_store.store.invalidate, symbol=symbol, kind='munger', prompts=prompts)
+    return {"removed": removed}
 
+async def munger_review_events(symbol, refresh=False):
+    try:
+        info = await market_data.get_fundamentals(symbol)
+        company_name = info.get('longName', symbol)
         if not company_name:
-            return JSONResponse(status_code=404, content={"error": f"No data found for symbol: {symbol}"})
+            yield sse_event("error", {"error": f"No data found for symbol: {symbol}"})
+            return
 
         prompt = MUNGER_ANALYSIS_PROMPT.format(company_name=company_name)
 
-        model = genai.GenerativeModel('models/gemini-1.5-pro')
-        response = model.generate_content(prompt)
-
-        if not response.text:
-            raise HTTPException(status_code=500, detail="LLM did not return a valid response.")
-        
-        parsed_data = parse_munger_response(response.text)
-        
-        return parsed_data
+        if not refresh:
+            cached = await run_market_data(cached_review, company_name)
+            if cached:
+                for rating in cached["parsed"]["ratings"]:
+                    yield sse_event("rating", rating)
+                yield sse_event("done", cached["parsed"])
+                return
+
+        model = genai.GenerativeModel(MODEL_NAME)
+        parser = RatingStream()
+        async with upstream.gemini.guard():
+            async for text in stream_text(model, prompt):
+                for rating in parser.feed(text):
+                    yield sse_event("rating", rating)
+
+        if not parser.text:
+            yield sse_event("error", {"error": "LLM did not return a valid response."})
+            return
+
+        parsed_data = parse_munger_response(parser.text)
+        await run_market_data(review_store.store.put, 'munger', symbol, MODEL_NAME, prompt, parser.text, parsed_data,
+                              version=PROMPT_VERSION)
+        yield sse_event("done", parsed_data)
 
     except Exception as e:
-        print(f"Error in get_munger_review: {e}")
-        return JSONResponse(status_code=500, content={"error": "Failed to generate Munger-style review.", "details": str(e)})
+        print(f"Error in stream_munger_review: {e}")
+        yield sse_event("error", {"error": "Failed to generate Munger-style review.", "details": str(e)})
+
+@router.get("/api/munger-review/stream")
+async def stream_munger_review(symbol: str = Query(..., min_length=1), refresh: bool = Query(False),
+                               x_admin_token: str = Header(None)):
+    if not GEMINI_API_KEY:
+        raise HTTPException(status_code=500, detail="Server configuration error: Gemini API key not set.")
+    forbidden = admin.refresh_forbidden(refresh, x_admin_token)
+    if forbidden:
+        return forbidden
+
+    return StreamingResponse(
+        munger_review_events(symbol, refresh),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
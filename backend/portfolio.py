@@ -0,0 +1,168 @@
+"""Vectorized portfolio risk metrics.
+
+Holdings are the columns of one (bars x holdings) matrix of closes built from
+a single bulk history fetch and aligned on the benchmark's bars. Every metric
+below is a whole-matrix NumPy operation; nothing loops over holdings or bars
+in Python.
+
+Weights are held constant (rebalanced every bar). A holding contributes a
+zero return on bars before its first price, as cash would; closes missing in
+between (another exchange's holiday) are carried forward.
+"""
+import numpy as np
+import pandas as pd
+
+VAR_CONFIDENCE = 0.95
+
+
+def bar_keys(indexes, daily):
+    """Alignment keys of several bar indexes, concatenated in order.
+
+    Daily bars are keyed by their local session date, intraday bars by their
+    UTC instant. Indexes in the same timezone are converted in one call
+    rather than one per symbol.
+    """
+    # UTC epoch ns for tz-aware indexes, wall time for naive ones
+    parts = [index.values.astype("datetime64[ns]", copy=False).view("int64") for index in indexes]
+    if daily:
+        zones = {}
+        for i, index in enumerate(indexes):
+            if index.tz is not None:
+                zones.setdefault(str(index.tz), []).append(i)
+        for zone, members in zones.items():
+            utc = pd.DatetimeIndex(np.concatenate([parts[i] for i in members]).view("datetime64[ns]"), tz="UTC")
+            local = np.split(utc.tz_convert(zone).tz_localize(None).asi8,
+                             np.cumsum([len(parts[i]) for i in members])[:-1])
+            for i, values in zip(members, local):
+                parts[i] = values
+    stamps = np.concatenate(parts).view("datetime64[ns]")
+    return stamps.astype("datetime64[D]") if daily else stamps
+
+
+def forward_fill(matrix):
+    """Carry each column's last valid value down over NaN gaps."""
+    valid = ~np.isnan(matrix)
+    rows = np.where(valid, np.arange(matrix.shape[0])[:, None], 0)
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    filled = matrix[rows, np.arange(matrix.shape[1])]
+    # Before a column's first valid value there is nothing to carry
+    filled[~np.maximum.accumulate(valid, axis=0)] = np.nan
+    return filled
+
+
+def aligned_closes(calendar, indexes, closes, daily):
+    """(len(calendar) x len(indexes)) closes, each column placed on ``calendar``.
+
+    ``indexes`` and ``closes`` hold one bar index and one close array per
+    column. Bars that fall outside the calendar are dropped and gaps are
+    forward-filled.
+    """
+    stamps = bar_keys(indexes, daily).astype(calendar.dtype)
+    values = np.concatenate(closes).astype(float)
+    cols = np.repeat(np.arange(len(indexes)), [len(index) for index in indexes])
+    rows = np.searchsorted(calendar, stamps)
+    hit = rows < len(calendar)
+    hit[hit] = calendar[rows[hit]] == stamps[hit]
+    matrix = np.full((len(calendar), len(indexes)), np.nan)
+    matrix[rows[hit], cols[hit]] = values[hit]
+    return forward_fill(matrix)
+
+
+def bar_returns(closes):
+    """Simple returns between consecutive rows (one row fewer than ``closes``)."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return closes[1:] / closes[:-1] - 1
+
+
+def portfolio_returns(returns, weights):
+    return np.where(np.isnan(returns), 0.0, returns) @ weights
+
+
+def drawdown(returns):
+    """Value path (starting at 1) and its drawdown from the running peak.
+
+    Both have one more point than ``returns``: the starting value.
+    """
+    value = np.concatenate(([1.0], np.cumprod(1 + returns)))
+    return value, value / np.maximum.accumulate(value) - 1
+
+
+def historical_var(returns, confidence=VAR_CONFIDENCE):
+    """One-bar historical VaR and expected shortfall, as positive losses."""
+    if not returns.size:
+        return np.nan, np.nan
+    cutoff = np.quantile(returns, 1 - confidence)
+    return -cutoff, -returns[returns <= cutoff].mean()
+
+
+def risk_metrics(returns, periods_per_year, confidence=VAR_CONFIDENCE):
+    """Return, volatility, drawdown and tail risk of one return series (fractions)."""
+    value, drawdowns = drawdown(returns)
+    trough = int(drawdowns.argmin())
+    var, shortfall = historical_var(returns, confidence)
+    years = len(returns) / periods_per_year
+    return {
+        "totalReturn": value[-1] - 1,
+        "annualizedReturn": value[-1] ** (1 / years) - 1 if years and value[-1] > 0 else np.nan,
+        "annualizedVolatility": returns.std(ddof=1) * np.sqrt(periods_per_year) if len(returns) > 1 else np.nan,
+        "maxDrawdown": -drawdowns[trough],
+        # Indexes into the value path (0 is the starting value)
+        "peak": int(value[:trough + 1].argmax()),
+        "trough": trough,
+        "var": var,
+        "expectedShortfall": shortfall,
+    }
+
+
+def _pairwise(returns, other):
+    """Pairwise-complete moments of the columns of ``returns`` against those of ``other``.
+
+    Each pair only uses the bars where both have a return. Returns the
+    pair counts, covariances and the two variances over the same bars.
+    """
+    symmetric = other is returns
+    a_valid, b_valid = ~np.isnan(returns), ~np.isnan(other)
+    a, b = np.where(a_valid, returns, 0.0), np.where(b_valid, other, 0.0)
+    a_mask, b_mask = a_valid.astype(float), b_valid.astype(float)
+    n = a_mask.T @ b_mask
+    sum_a = a.T @ b_mask
+    square_a = (a * a).T @ b_mask
+    # Against itself, the sums over b are the transposed sums over a
+    sum_b = sum_a.T if symmetric else a_mask.T @ b
+    square_b = square_a.T if symmetric else a_mask.T @ (b * b)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_a, mean_b = sum_a / n, sum_b / n
+        cov = (a.T @ b) / n - mean_a * mean_b
+        var_a = square_a / n - mean_a ** 2
+        var_b = square_b / n - mean_b ** 2
+    return n, cov, var_a, var_b
+
+
+def correlation(returns):
+    """Pairwise-complete correlation matrix of the columns of ``returns``."""
+    n, cov, var_a, var_b = _pairwise(returns, returns)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = cov / np.sqrt(var_a * var_b)
+    corr[(n < 2) | ~np.isfinite(corr)] = np.nan
+    return np.clip(corr, -1.0, 1.0)
+
+
+def betas(returns, market):
+    """Beta of every column of ``returns`` against ``market``, over shared bars."""
+    n, cov, _, var_market = _pairwise(returns, market[:, None])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        beta = (cov / var_market)[:, 0]
+    beta[(n[:, 0] < 2) | ~np.isfinite(beta)] = np.nan
+    return beta
+
+
+def risk_contributions(returns, weights):
+    """Share of the portfolio variance each holding accounts for (sums to 1)."""
+    filled = np.where(np.isnan(returns), 0.0, returns)
+    centered = filled - filled.mean(axis=0)
+    portfolio = centered @ weights
+    variance = portfolio @ portfolio
+    if not variance:
+        return np.full(len(weights), np.nan)
+    # weights * (covariance @ weights) without forming the covariance matrix
+    return weights * (centered.T @ portfolio) / variance
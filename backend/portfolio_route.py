@@ -0,0 +1,185 @@
+import math
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse
+import numpy as np
+import market_data
+import portfolio
+import series
+import upstream
+from metrics import stage
+from price_history_route import RANGE_PATTERN, YF_RANGE_MAP
+
+router = APIRouter()
+
+
+def parse_holdings(raw):
+    """``AAPL:0.6,MSFT:0.4`` (or ``AAPL,MSFT`` for equal weights) -> {symbol: weight}.
+
+    Weights are relative and need not add up to 1; a repeated symbol adds up
+    its weights. Portfolios are long-only, so negative weights are rejected.
+    """
+    items = [item.strip() for item in raw.split(",") if item.strip()]
+    if not items:
+        raise ValueError("At least one holding is required.")
+    weighted = [":" in item for item in items]
+    if any(weighted) and not all(weighted):
+        raise ValueError("Give a weight for every holding or for none.")
+    holdings = {}
+    for item in items:
+        symbol, _, weight = item.partition(":")
+        symbol = market_data.normalize_symbol(symbol)
+        if not symbol:
+            raise ValueError(f"Missing symbol in holding {item!r}.")
+        try:
+            value = float(weight) if weight.strip() else 1.0
+        except ValueError:
+            value = math.nan
+        if not math.isfinite(value):
+            raise ValueError(f"Invalid weight for {symbol}: {weight.strip()!r}.")
+        if value < 0:
+            raise ValueError(f"Weight for {symbol} must not be negative.")
+        holdings[symbol] = holdings.get(symbol, 0.0) + value
+    if len(holdings) > market_data.MAX_BATCH_SYMBOLS:
+        raise ValueError(f"At most {market_data.MAX_BATCH_SYMBOLS} holdings are allowed per request.")
+    if sum(holdings.values()) <= 0:
+        raise ValueError("Holding weights must add up to a positive number.")
+    return holdings
+
+
+def _pct(values, digits=3):
+    return series.json_values(np.round(np.asarray(values, dtype=float) * 100, digits))
+
+
+def _round(values, digits=3):
+    return series.json_values(np.round(np.asarray(values, dtype=float), digits))
+
+
+def metrics_summary(metrics, labels):
+    return {
+        "totalReturnPct": _pct(metrics["totalReturn"]),
+        "annualizedReturnPct": _pct(metrics["annualizedReturn"]),
+        "annualizedVolatilityPct": _pct(metrics["annualizedVolatility"]),
+        "maxDrawdownPct": _pct(metrics["maxDrawdown"]),
+        "maxDrawdownPeak": labels[metrics["peak"]],
+        "maxDrawdownTrough": labels[metrics["trough"]],
+        "varPct": _pct(metrics["var"]),
+        "expectedShortfallPct": _pct(metrics["expectedShortfall"]),
+    }
+
+
+async def build_portfolio(holdings, benchmark="SPY", range="5y", confidence=portfolio.VAR_CONFIDENCE,
+                          points=None, matrices=True):
+    """Risk metrics of a weighted portfolio against ``benchmark``.
+
+    Prices for every holding and the benchmark come from one bulk history
+    fetch. Holdings without prices are reported under ``errors`` and the
+    remaining weights are scaled to add up to 1. Raises
+    ``market_data.NoData`` when the benchmark or every holding has no prices,
+    and ``ValueError`` when only zero-weight holdings have prices.
+    """
+    benchmark = market_data.normalize_symbol(benchmark)
+    yf_range, interval = YF_RANGE_MAP.get(range, ("5y", "1d"))
+    frames = await market_data.get_history_batch(list(dict.fromkeys(list(holdings) + [benchmark])),
+                                                 yf_range, interval)
+
+    def usable(hist):
+        return hist is not None and not hist.empty and "Close" in hist
+
+    if not usable(frames.get(benchmark)):
+        raise market_data.NoData(f"No price data found for benchmark {benchmark}.")
+    errors = {s: "No price data found for this symbol." for s in holdings if not usable(frames.get(s))}
+    symbols = [s for s in holdings if s not in errors]
+    weights = np.array([holdings[s] for s in symbols], dtype=float)
+    if not symbols:
+        raise market_data.NoData(next(iter(errors.values()), "No price data found for the holdings."))
+    if weights.sum() <= 0:
+        raise ValueError("Holdings with price data must have weights adding up to a positive number.")
+
+    with stage("transform"):
+        weights /= weights.sum()
+        daily = interval in market_data.DAILY_INTERVALS
+        calendar = np.unique(portfolio.bar_keys([frames[benchmark].index], daily))
+        columns = symbols + [benchmark]
+        closes = portfolio.aligned_closes(
+            calendar,
+            [frames[s].index for s in columns],
+            [frames[s]["Close"].to_numpy(dtype=float) for s in columns],
+            daily,
+        )
+        returns = portfolio.bar_returns(closes)
+        holding_returns, market = returns[:, :-1], returns[:, -1]
+        market = np.where(np.isnan(market), 0.0, market)
+        periods_per_year = series.PERIODS_PER_YEAR.get(interval, 252)
+        returns_p = portfolio.portfolio_returns(holding_returns, weights)
+
+        labels = np.datetime_as_string(calendar, unit="D" if daily else "m").tolist()
+        summary = metrics_summary(portfolio.risk_metrics(returns_p, periods_per_year, confidence), labels)
+        summary["beta"] = _round(portfolio.betas(returns_p[:, None], market)[0])
+        summary["benchmarkCorrelation"] = _round(
+            portfolio.correlation(np.column_stack([returns_p, market]))[0, 1])
+
+        value, drawdowns = portfolio.drawdown(returns_p)
+        keep = slice(None)
+        if points:
+            keep = series.lttb_indices(np.arange(len(value)), value, points)
+        timestamps = calendar.astype("datetime64[ms]").astype(np.int64)
+
+        result = {
+            "benchmark": benchmark,
+            "range": range,
+            "interval": interval,
+            "confidence": confidence,
+            "observations": len(returns_p),
+            "portfolio": summary,
+            "benchmarkMetrics": metrics_summary(portfolio.risk_metrics(market, periods_per_year, confidence), labels),
+            "holdings": [
+                {"symbol": s, "weight": w, "observations": n, "annualizedVolatilityPct": v, "beta": b,
+                 "riskContributionPct": c}
+                for s, w, n, v, b, c in zip(
+                    symbols,
+                    _round(weights, 6),
+                    np.count_nonzero(~np.isnan(holding_returns), axis=0).tolist(),
+                    _pct(np.nanstd(holding_returns, axis=0, ddof=1) * np.sqrt(periods_per_year))
+                    if len(holding_returns) > 1 else [None] * len(symbols),
+                    _round(portfolio.betas(holding_returns, market)),
+                    _pct(portfolio.risk_contributions(holding_returns, weights)),
+                )
+            ],
+            "series": {
+                "timestamps": timestamps[keep].tolist(),
+                "valuePct": _pct(value[keep] - 1),
+                "drawdownPct": _pct(drawdowns[keep]),
+            },
+            "errors": errors,
+        }
+        if matrices:
+            result["correlation"] = {"symbols": symbols, "matrix": _round(portfolio.correlation(holding_returns))}
+    return result
+
+
+@router.get("/api/portfolio")
+async def portfolio_analytics(
+    holdings: str = Query(..., min_length=1),
+    benchmark: str = Query("SPY", min_length=1),
+    range: str = Query("5y", regex=RANGE_PATTERN),
+    confidence: float = Query(portfolio.VAR_CONFIDENCE, gt=0.5, lt=1),
+    points: int = Query(None, ge=3, le=20000),
+    matrices: bool = Query(True),
+):
+    try:
+        holding_weights = parse_holdings(holdings)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    try:
+        result = await build_portfolio(holding_weights, benchmark, range, confidence, points, matrices)
+        with stage("serialize"):
+            # Plain JSON types already; skip FastAPI's per-value encoder over the matrix
+            return JSONResponse(content=result)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    except market_data.NoData as e:
+        return JSONResponse(status_code=404, content={"error": str(e)})
+    except upstream.UpstreamError as e:
+        return upstream.unavailable_response(e)
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": "Portfolio analytics unavailable", "details": str(e)})
@@ -0,0 +1,282 @@
+"""Background warm-up of market data and reviews for a watchlist.
+
+The scheduler runs inside the app (started from the lifespan in ``main.py``)
+and keeps the configured watchlist, plus the most requested symbols, warm:
+
+* quotes are refreshed every ``PREFETCH_QUOTE_INTERVAL`` seconds while the
+  market is open, one full ``ticker.info`` per symbol (there is no bulk
+  endpoint), queued on the Yahoo rate limiter;
+* daily bars for every daily chart range, and the quotes, are refreshed once
+  after each close and then cached until the next open;
+* once an earnings date shows up in ``get_earnings_dates`` its price window
+  is fetched, and re-fetched until the window lies in the past;
+* stale Buffett/Munger reviews are regenerated overnight, at most
+  ``PREFETCH_REVIEW_BUDGET`` per night and ``PREFETCH_REVIEW_SPACING``
+  seconds apart.
+
+Market hours are NYSE regular hours without the holiday calendar; on a
+holiday the quote job just refreshes unchanged prices.
+
+Every worker starts a scheduler, but with a shared cache backend only the
+worker holding the ``prefetch`` leadership lease runs jobs; the warmed
+entries land in the shared cache for all of them. Popularity is counted from
+the leader's own requests, which is a fair sample when load is spread evenly.
+"""
+import asyncio
+import os
+import time
+from collections import Counter
+from urllib.parse import parse_qs
+
+import pandas as pd
+
+import buffett_review_route
+import cache_backend
+import market_data
+import munger_review_route
+import review_store
+import upstream
+from earnings_analysis_route import earnings_window
+from executors import run_market_data
+from price_history_route import YF_RANGE_MAP
+from settings import env_number
+from single_flight import llm_flight
+
+MARKET_TZ = "America/New_York"
+MARKET_OPEN = pd.Timedelta(hours=9, minutes=30)
+MARKET_CLOSE = pd.Timedelta(hours=16)
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "1").lower() not in ("0", "false", "no")
+PREFETCH_WATCHLIST = os.getenv("PREFETCH_WATCHLIST", "")
+# How many of the most requested symbols are warmed on top of the watchlist.
+PREFETCH_POPULAR = int(env_number("PREFETCH_POPULAR", 20))
+PREFETCH_TICK = env_number("PREFETCH_TICK", 5)
+PREFETCH_QUOTE_INTERVAL = env_number("PREFETCH_QUOTE_INTERVAL", market_data.QUOTE_TTL)
+PREFETCH_CLOSE_DELAY_MINUTES = env_number("PREFETCH_CLOSE_DELAY_MINUTES", 20)
+PREFETCH_EARNINGS_INTERVAL = env_number("PREFETCH_EARNINGS_INTERVAL", 6 * 3600)
+# Overnight review window, in exchange-local hours [start, end).
+PREFETCH_REVIEW_START_HOUR = int(env_number("PREFETCH_REVIEW_START_HOUR", 1))
+PREFETCH_REVIEW_END_HOUR = int(env_number("PREFETCH_REVIEW_END_HOUR", 6))
+PREFETCH_REVIEW_BUDGET = int(env_number("PREFETCH_REVIEW_BUDGET", 20))
+PREFETCH_REVIEW_SPACING = env_number("PREFETCH_REVIEW_SPACING", 30)
+PREFETCH_REVIEW_INTERVAL = env_number("PREFETCH_REVIEW_INTERVAL", 15 * 60)
+# Reviews that would expire within this many hours count as stale.
+PREFETCH_REVIEW_LEAD_HOURS = env_number("PREFETCH_REVIEW_LEAD_HOURS", 24)
+
+PREFETCH_RETRY_INTERVAL = env_number("PREFETCH_RETRY_INTERVAL", 300)
+# Leadership lapses this long after the leader stops renewing it (renewed every tick).
+PREFETCH_LEADER_TTL = env_number("PREFETCH_LEADER_TTL", 120)
+
+# Bound on distinct symbols remembered for popularity ranking.
+DEMAND_LIMIT = 2000
+
+DAILY_PERIODS = sorted({period for period, interval in YF_RANGE_MAP.values() if interval == "1d"})
+
+REVIEWS = (
+    ("buffett", buffett_review_route, buffett_review_route.generate_buffett_review),
+    ("munger", munger_review_route, munger_review_route.generate_munger_review),
+)
+
+
+def market_time(now=None):
+    return pd.Timestamp.now(tz=MARKET_TZ) if now is None else pd.Timestamp(now).tz_convert(MARKET_TZ)
+
+
+def market_is_open(now=None):
+    now = market_time(now)
+    since_midnight = now - now.normalize()
+    return now.weekday() < 5 and MARKET_OPEN <= since_midnight < MARKET_CLOSE
+
+
+def next_open(now=None):
+    now = market_time(now)
+    day = now.normalize()
+    if now - day >= MARKET_OPEN:
+        day += pd.Timedelta(days=1)
+    while day.weekday() >= 5:
+        day += pd.Timedelta(days=1)
+    return day + MARKET_OPEN
+
+
+def last_closed_session(now=None, delay_minutes=PREFETCH_CLOSE_DELAY_MINUTES):
+    """Date of the latest session whose close (plus ``delay_minutes``) has passed."""
+    now = market_time(now)
+    day = now.normalize()
+    if now - day < MARKET_CLOSE + pd.Timedelta(minutes=delay_minutes):
+        day -= pd.Timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= pd.Timedelta(days=1)
+    return day.date()
+
+
+class PrefetchScheduler:
+    def __init__(self, watchlist=PREFETCH_WATCHLIST, popular=PREFETCH_POPULAR, review_budget=PREFETCH_REVIEW_BUDGET):
+        self.watchlist = market_data.parse_symbols(watchlist) if watchlist.strip() else []
+        self.popular = popular
+        self.review_budget = review_budget
+        self.demand = Counter()
+        self.last_run = {}
+        self.bars_session = None
+        self.earnings_seen = {}
+        self.reviews_night = None
+        self.reviews_generated = 0
+        self.runs = Counter()
+        self.errors = Counter()
+        self.leading = False
+        self._task = None
+
+    def note(self, symbols):
+        self.demand.update(symbols)
+        if len(self.demand) > DEMAND_LIMIT:
+            self.demand = Counter(dict(self.demand.most_common(DEMAND_LIMIT // 2)))
+
+    def symbols(self):
+        popular = [symbol for symbol, _ in self.demand.most_common(self.popular)]
+        return list(dict.fromkeys(self.watchlist + popular))
+
+    def _due(self, job, interval, now):
+        last = self.last_run.get(job)
+        return last is None or now - last >= interval
+
+    async def _run_job(self, job, coro):
+        self.last_run[job] = time.monotonic()
+        try:
+            await coro
+            self.runs[job] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.errors[job] += 1
+            print(f"Warning: prefetch job {job} failed: {e}")
+
+    async def tick(self, now=None):
+        """Run whatever jobs are due at ``now`` (a timestamp; defaults to the current time)."""
+        symbols = self.symbols()
+        if not symbols:
+            return
+        self.leading = await cache_backend.leader("prefetch", PREFETCH_LEADER_TTL)
+        if not self.leading:
+            return
+        now = market_time(now)
+        clock = time.monotonic()
+        if market_is_open(now) and self._due("quotes", PREFETCH_QUOTE_INTERVAL, clock):
+            await self._run_job("quotes", self.refresh_quotes(symbols))
+        session = last_closed_session(now)
+        # A failed refresh is retried, but not on every tick
+        if self.bars_session != session and self._due("daily_bars", PREFETCH_RETRY_INTERVAL, clock):
+            await self._run_job("daily_bars", self.refresh_daily_bars(symbols, now, session))
+        if self._due("earnings", PREFETCH_EARNINGS_INTERVAL, clock):
+            await self._run_job("earnings", self.refresh_earnings(symbols, now))
+        if PREFETCH_REVIEW_START_HOUR <= now.hour < PREFETCH_REVIEW_END_HOUR and self._due(
+            "reviews", PREFETCH_REVIEW_INTERVAL, clock
+        ):
+            await self._run_job("reviews", self.regenerate_reviews(symbols, now))
+
+    async def refresh_quotes(self, symbols, ttl=None):
+        # Not get_info_batch: its bulk-priced dicts are not full quotes
+        results = await upstream.fan_out(
+            upstream.yahoo, [lambda symbol=symbol: market_data.get_info(symbol, refresh=True, ttl=ttl)
+                             for symbol in symbols]
+        )
+        for symbol, result in zip(symbols, results):
+            # One bad symbol must not hold back the rest (or the bars job)
+            if isinstance(result, Exception):
+                print(f"Warning: prefetch quote for {symbol} failed: {result}")
+
+    async def refresh_daily_bars(self, symbols, now, session):
+        # Daily bars only change while the market is open, so after the close
+        # they can stay cached until the next open.
+        ttl = None if market_is_open(now) else max((next_open(now) - now).total_seconds(), 1)
+        for period in DAILY_PERIODS:
+            await market_data.get_history_batch(symbols, period, "1d", refresh=True, ttl=ttl)
+        await self.refresh_quotes(symbols, ttl=ttl)
+        self.bars_session = session
+
+    async def refresh_earnings(self, symbols, now):
+        for symbol in symbols:
+            dates = await market_data.get_earnings_dates(symbol, limit=1)
+            if dates is None or dates.empty:
+                continue
+            earnings_date = dates.index[0]
+            start, end = earnings_window(earnings_date)
+            window_open = pd.Timestamp(end, tz=MARKET_TZ) >= now.normalize()
+            if self.earnings_seen.get(symbol) != earnings_date or window_open:
+                await market_data.get_history(symbol, start=start, end=end)
+                self.earnings_seen[symbol] = earnings_date
+
+    async def regenerate_reviews(self, symbols, now):
+        night = now.date()
+        if self.reviews_night != night:
+            self.reviews_night, self.reviews_generated = night, 0
+        max_age = max(review_store.store.max_age_hours - PREFETCH_REVIEW_LEAD_HOURS, 0)
+        for symbol in symbols:
+            for kind, route, generate in REVIEWS:
+                # Reviews are spaced out for minutes; don't outlive our leadership
+                if self.reviews_generated >= self.review_budget or not await cache_backend.leader(
+                    "prefetch", PREFETCH_LEADER_TTL
+                ):
+                    return
+                if not route.GEMINI_API_KEY:
+                    continue
+                info = await market_data.get_fundamentals(symbol)
+                company_name = info.get('longName', symbol)
+                if not company_name:
+                    continue
+                if await run_market_data(route.cached_review, company_name, max_age_hours=max_age):
+                    continue
+                prompt = route.review_prompt(company_name)
+                await llm_flight.do(
+                    (route.MODEL_NAME, review_store.prompt_hash(prompt)),
+                    lambda: generate(symbol, prompt),
+                )
+                self.reviews_generated += 1
+                await asyncio.sleep(PREFETCH_REVIEW_SPACING)
+
+    async def run(self):
+        while True:
+            await self.tick()
+            await asyncio.sleep(PREFETCH_TICK)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        return {
+            "running": self._task is not None,
+            "leading": self.leading,
+            "symbols": self.symbols(),
+            "runs": dict(self.runs),
+            "errors": dict(self.errors),
+            "reviewsGeneratedTonight": self.reviews_generated,
+        }
+
+
+class DemandTracker:
+    """ASGI middleware that counts requested symbols so popular ones get warmed."""
+
+    def __init__(self, app, scheduler):
+        self.app = app
+        self.scheduler = scheduler
+
+    async def __call__(self, scope, receive, send):
+        # Only reads count; a screening job's universe says nothing about popularity
+        if scope["type"] == "http" and scope["method"] == "GET" and scope.get("query_string"):
+            params = parse_qs(scope["query_string"].decode("latin-1"))
+            raw = ",".join(params.get("symbol", []) + params.get("symbols", []))
+            symbols = [s.strip().upper() for s in raw.split(",") if s.strip()]
+            if symbols:
+                self.scheduler.note(symbols[:market_data.MAX_BATCH_SYMBOLS])
+        await self.app(scope, receive, send)
+
+
+scheduler = PrefetchScheduler()
@@ -1,80 +1,187 @@
+import asyncio
 from fastapi import APIRouter, Query
-from fastapi.responses import JSONResponse
-import yfinance as yf
-import pandas as pd
+from fastapi.responses import JSONResponse, Response
+import market_data
+import series
+import upstream
+from metrics import stage
 
 router = APIRouter()
 
+RANGE_PATTERN = "^(1d|5d|1m|6m|ytd|1y|5y|max)$"
+MODE_PATTERN = "^(price|percent)$"
+FORMAT_PATTERN = "^(records|columnar|binary)$"
+
+# UI range -> (yfinance period, bar interval)
+YF_RANGE_MAP = {
+    "1d": ("1d", "1m"),
+    "5d": ("5d", "15m"),
+    "1m": ("1mo", "1d"),
+    "6m": ("6mo", "1d"),
+    "ytd": ("ytd", "1d"),
+    "1y": ("1y", "1d"),
+    "5y": ("5y", "1d"),
+    "max": ("max", "1d"),
+}
+
+def chart_arrays(hist, mode, indicators=(), interval="1d", points=None):
+    index = hist.index
+    closes = hist['Close'].to_numpy(dtype=float)
+    values = series.percent_from_first(closes) if mode == 'percent' else closes
+
+    computed = {}
+    if indicators:
+        computed = series.compute_indicators(closes, indicators, series.PERIODS_PER_YEAR.get(interval, 252))
+        if mode == 'percent':
+            # Moving averages are plotted on the same axis as the series
+            for name in computed:
+                if name.startswith(('sma', 'ema')):
+                    computed[name] = series.percent_from_first_of(computed[name], closes)
+
+    if points:
+        keep = series.lttb_indices(series.epoch_ms(index), values, points)
+        index, values = index[keep], values[keep]
+        computed = {name: v[keep] for name, v in computed.items()}
+
+    return index, values, computed
+
+def build_chart(hist, mode, indicators=(), interval="1d", format="records", points=None):
+    index, values, computed = chart_arrays(hist, mode, indicators, interval, points)
+    if format == 'columnar':
+        chart = {
+            "mode": mode,
+            "format": "columnar",
+            "timestamps": series.epoch_ms(index).tolist(),
+            "values": series.json_values(values),
+        }
+    else:
+        timestamps = index.astype(str).tolist()
+        chart = {
+            "mode": mode,
+            "series": [{"timestamp": t, "value": v} for t, v in zip(timestamps, series.json_values(values))],
+        }
+    if computed:
+        chart["indicators"] = {name: series.json_values(v) for name, v in computed.items()}
+    return chart
+
+def pack_chart(hist, mode, indicators=(), interval="1d", points=None):
+    """Chart as packed little-endian columns: int64 epoch-ms timestamps, then
+    float64 values, then one float64 column per indicator (NaN marks gaps).
+    """
+    index, values, computed = chart_arrays(hist, mode, indicators, interval, points)
+    columns = [series.epoch_ms(index).astype('<i8'), values.astype('<f8')]
+    columns += [v.astype('<f8') for v in computed.values()]
+    body = b''.join(column.tobytes() for column in columns)
+    headers = {
+        "X-Series-Length": str(len(index)),
+        "X-Series-Mode": mode,
+        "X-Series-Columns": ",".join(["timestamps", "values", *computed]),
+    }
+    return Response(content=body, media_type="application/octet-stream", headers=headers)
+
+def snapshot_available(hist, info):
+    return not hist.empty and "Close" in hist and bool(info) and 'shortName' in info
+
+def snapshot_payload(symbol, hist, info, mode, indicators=(), interval="1d", format="records", points=None):
+    """Header, chart and key metrics of the snapshot panel."""
+    price = info.get('regularMarketPrice')
+    prev_close = info.get('regularMarketPreviousClose')
+    change = price - prev_close if price and prev_close else 0
+    change_percent = (change / prev_close * 100) if prev_close and change else 0
+
+    header = {
+        "name": info.get('shortName', symbol),
+        "symbol": symbol.upper(),
+        "price": price,
+        "change": change,
+        "changePercent": change_percent,
+        "timestamp": info.get('regularMarketTime'),
+    }
+
+    with stage("transform"):
+        chart = build_chart(hist, mode, indicators, interval, format, points)
+
+    metrics = {
+        "prevClose": info.get("regularMarketPreviousClose", "N/A"),
+        "open": info.get("regularMarketOpen", "N/A"),
+        "dayRange": f"{info.get('dayLow', 'N/A')} - {info.get('dayHigh', 'N/A')}",
+        "fiftyTwoWeekRange": f"{info.get('fiftyTwoWeekLow', 'N/A')} - {info.get('fiftyTwoWeekHigh', 'N/A')}",
+        "marketCap": info.get("marketCap", "N/A"),
+        "peRatio": info.get("trailingPE", "N/A"),
+        "volume": info.get("regularMarketVolume", "N/A"),
+        "dividendYield": info.get("dividendYield", "N/A"),
+        "eps": info.get("trailingEps", "N/A"),
+    }
+
+    return {"header": header, "chart": chart, "metrics": metrics}
+
 @router.get("/api/price-history")
-def price_history(
+async def price_history(
     symbol: str = Query(..., min_length=1),
-    range: str = Query("1y", regex="^(1d|5d|1m|6m|ytd|1y|5y|max)$"),
-    mode: str = Query("price", regex="^(price|percent)$")
+    range: str = Query("1y", regex=RANGE_PATTERN),
+    mode: str = Query("price", regex=MODE_PATTERN),
+    indicators: str = Query(None),
+    format: str = Query("records", regex=FORMAT_PATTERN),
+    points: int = Query(None, ge=3, le=20000)
 ):
     try:
-        yf_range_map = {
-            "1d": ("1d", "1m"),
-            "5d": ("5d", "15m"),
-            "1m": ("1mo", "1d"),
-            "6m": ("6mo", "1d"),
-            "ytd": ("ytd", "1d"),
-            "1y": ("1y", "1d"),
-            "5y": ("5y", "1d"),
-            "max": ("max", "1d"),
-        }
-        yf_range, interval = yf_range_map.get(range, ("1y", "1d"))
-        ticker = yf.Ticker(symbol)
-        hist = ticker.history(period=yf_range, interval=interval)
-        info = ticker.info
+        indicator_names = series.parse_indicators(indicators)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    try:
+        yf_range, interval = YF_RANGE_MAP.get(range, ("1y", "1d"))
+        hist, info = await asyncio.gather(
+            market_data.get_history(symbol, period=yf_range, interval=interval),
+            market_data.get_info(symbol),
+        )
 
-        if hist.empty or "Close" not in hist or not info or 'shortName' not in info:
+        if not snapshot_available(hist, info):
             return JSONResponse(status_code=404, content={"error": "Data unavailable"})
 
-        price = info.get('regularMarketPrice')
-        prev_close = info.get('regularMarketPreviousClose')
-        change = price - prev_close if price and prev_close else 0
-        change_percent = (change / prev_close * 100) if prev_close and change else 0
-
-        header = {
-            "name": info.get('shortName', symbol),
-            "symbol": symbol.upper(),
-            "price": price,
-            "change": change,
-            "changePercent": change_percent,
-            "timestamp": info.get('regularMarketTime'),
-        }
+        # Binary mode carries only the chart; header and metrics stay on the JSON formats
+        if format == 'binary':
+            with stage("transform"):
+                return pack_chart(hist, mode, indicator_names, interval, points)
 
-        hist = hist.reset_index()
-        if 'Datetime' in hist.columns:
-            hist['timestamp'] = hist['Datetime'].astype(str)
-        else:
-            hist['timestamp'] = hist['Date'].astype(str)
-
-        series_data = hist[['timestamp', 'Close']].copy()
-        series_data.rename(columns={'Close': 'value'}, inplace=True)
-        series_data = series_data.where(pd.notnull(series_data), None).to_dict('records')
-
-        if mode == 'percent' and series_data:
-            first_value = next((item['value'] for item in series_data if item['value'] is not None), None)
-            if first_value:
-                for item in series_data:
-                    if item['value'] is not None:
-                        item['value'] = ((item['value'] / first_value) - 1) * 100
-
-        chart = {"mode": mode, "series": series_data}
-
-        metrics = {
-            "prevClose": info.get("regularMarketPreviousClose", "N/A"),
-            "open": info.get("regularMarketOpen", "N/A"),
-            "dayRange": f"{info.get('dayLow', 'N/A')} - {info.get('dayHigh', 'N/A')}",
-            "fiftyTwoWeekRange": f"{info.get('fiftyTwoWeekLow', 'N/A')} - {info.get('fiftyTwoWeekHigh', 'N/A')}",
-            "marketCap": info.get("marketCap", "N/A"),
-            "peRatio": info.get("trailingPE", "N/A"),
-            "volume": info.get("regularMarketVolume", "N/A"),
-            "dividendYield": info.get("dividendYield", "N/A"),
-            "eps": info.get("trailingEps", "N/A"),
-        }
+        payload = snapshot_payload(symbol, hist, info, mode, indicator_names, interval, format, points)
 
-        return {"header": header, "chart": chart, "metrics": metrics}
+        with stage("serialize"):
+            return JSONResponse(payload)
+    except upstream.UpstreamError as e:
+        return upstream.unavailable_response(e)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": "Snapshot unavailable", "details": str(e)})
+
+@router.get("/api/price-history/batch")
+async def price_history_batch(
+    symbols: str = Query(..., min_length=1),
+    range: str = Query("1y", regex=RANGE_PATTERN),
+    mode: str = Query("price", regex=MODE_PATTERN),
+    indicators: str = Query(None),
+    format: str = Query("records", regex="^(records|columnar)$"),
+    points: int = Query(None, ge=3, le=20000)
+):
+    try:
+        symbol_list = market_data.parse_symbols(symbols)
+        indicator_names = series.parse_indicators(indicators)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    try:
+        yf_range, interval = YF_RANGE_MAP.get(range, ("1y", "1d"))
+        frames = await market_data.get_history_batch(symbol_list, period=yf_range, interval=interval)
+        results = []
+        with stage("transform"):
+            for symbol, hist in frames.items():
+                if hist is None or hist.empty or "Close" not in hist:
+                    results.append({"symbol": symbol, "error": "Data unavailable"})
+                    continue
+                try:
+                    results.append({"symbol": symbol, "chart": build_chart(hist, mode, indicator_names, interval, format, points)})
+                except Exception as e:
+                    results.append({"symbol": symbol, "error": "Data unavailable", "details": str(e)})
+        with stage("serialize"):
+            return JSONResponse({"results": results})
+    except upstream.UpstreamError as e:
+        return upstream.unavailable_response(e)
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"error": "Price history unavailable", "details": str(e)})
@@ -1,3 +1,11 @@
+# Bump a kind's version whenever its prompts or its response schema
+# (review_schema.py) change: stored reviews of any other version stop being
+# served and are dropped at startup.
+PROMPT_VERSIONS = {
+    "buffett": "2",
+    "munger": "2",
+}
+
 BUFFETT_ANALYSIS_PROMPT = """\
 Act as an expert value investor following Warren Buffett's investment philosophy. Analyze {company_name} using the following comprehensive framework. Provide a detailed, data-driven report in markdown format, with each section clearly separated.
 
@@ -66,3 +74,110 @@ Output in Markdown:
 
 > **Summary:** … **Recommendation:** BUY / WATCH / AVOID
 """
+
+# Screening prompts review several companies per call. Each company's answer
+# starts with a `=== SYMBOL ===` line so the response can be split and every
+# part parsed like a single review.
+BUFFETT_SCREEN_PROMPT = """\
+Act as an expert value investor following Warren Buffett's investment philosophy. Screen each of the following companies:
+
+{companies}
+
+For EACH company, in the order listed, write a short review in markdown. Start it with a line containing only `=== SYMBOL ===` (for example `=== AAPL ===`), then:
+
+**Recommendation:** BUY, HOLD, or SELL, followed by the estimated margin of safety percentage.
+
+### Business Fundamentals
+Two or three sentences on the business model, the durability of its moat and its growth prospects.
+
+### Financial Analysis
+Gross margin, ROE, debt-to-equity and free cash flow yield, each with its value and "(Pass)" or "(Fail)" against Buffett's usual thresholds (> 40%, consistently > 15%, < 0.5, > 8%).
+
+### Management Quality
+Two sentences on integrity and capital allocation.
+
+### Valuation
+Two sentences comparing an intrinsic value estimate with the current price.
+
+### Investment Recommendation
+Two or three sentences on why Warren Buffett would or would not invest in this company for the long term.
+
+Do not write anything before the first company or between companies.
+"""
+
+MUNGER_SCREEN_PROMPT = """\
+Role: You are Charlie Munger’s trusted investment lieutenant.
+Goal: Screen the management teams of the following companies, clearly and candidly, using Munger’s principles:
+
+{companies}
+
+For EACH company, evaluate these five factors. For each, briefly explain (1–2 sentences) and rate 1★ (poor) to 5★★★★★ (excellent).
+
+- Integrity and honesty in shareholder communications
+- Competence in capital allocation
+- Long-term vision vs. short-term focus
+- Alignment with shareholder interests
+- Track record of value creation
+
+Then compute an overall Munger Management Score (average stars) and map it:
+4.5–5★ “Exceptional”, 3.5–4.4★ “Good”, 2.5–3.4★ “Average”, <2.5★ “Poor”.
+
+Finally, write ≤60 words on whether the team embodies Munger’s standards and give a clear BUY / WATCH / AVOID recommendation based on management quality.
+
+Output in Markdown, one block per company in the order listed, each starting with a line containing only `=== SYMBOL ===` (for example `=== AAPL ===`):
+
+=== SYMBOL ===
+### Charlie Munger Management Review – Company Name
+
+| Factor | Explanation | Rating |
+| ------ | ----------- | :----: |
+| … | … | ★★★★☆ |
+
+**Overall Munger Management Score:** 4.2 ★ – Good
+
+> **Summary:** … **Recommendation:** BUY / WATCH / AVOID
+
+Do not write anything before the first company or between companies.
+"""
+
+# Structured output: the same analysis, answered as JSON constrained by the
+# models in review_schema.py instead of markdown picked apart with regexes.
+BUFFETT_JSON_PROMPT = BUFFETT_ANALYSIS_PROMPT + """
+Return the report as a JSON object rather than free-form markdown:
+- "recommendation": "BUY", "HOLD" or "SELL";
+- "sections": one object per section above, in the same order, with the section heading (without "###") as "title" and the section's markdown as "content". State the margin of safety percentage in the "Valuation" section.
+"""
+
+MUNGER_JSON_PROMPT = """Role: You are Charlie Munger’s trusted investment lieutenant.
+Goal: Help a new investor understand the quality of {company_name}’s management team—clearly and candidly—using Munger’s principles.
+
+Evaluate these five factors. For each, briefly explain (2–3 sentences) and rate it from 1 (poor) to 5 (excellent) stars:
+
+- Integrity and honesty in shareholder communications
+- Competence in capital allocation
+- Long-term vision vs. short-term focus
+- Alignment with shareholder interests
+- Track record of value creation
+
+Then compute an overall Munger Management Score (average stars) and map it:
+4.5–5 “Exceptional”, 3.5–4.4 “Good”, 2.5–3.4 “Average”, <2.5 “Poor”.
+
+Finally, write ≤120 words telling a first-time investor whether the team embodies Munger’s standards and give a clear BUY / WATCH / AVOID recommendation based on management quality.
+
+Return a JSON object:
+- "ratings": one object per factor, in the order above, with "criterion" (the factor), "explanation" and "rating" (a whole number of stars, 1–5);
+- "overallScore": the label, e.g. "Good";
+- "summary": the ≤120 word summary, without the recommendation;
+- "verdict": "BUY", "WATCH" or "AVOID".
+"""
+
+# One cheap attempt at fixing a structured answer that failed validation,
+# instead of paying for the whole review again.
+JSON_REPAIR_PROMPT = """The JSON below was supposed to match a schema but failed validation with these errors:
+
+{errors}
+
+Return the corrected JSON object. Keep all of its content; only fix the structure and the invalid values.
+
+{text}
+"""
@@ -0,0 +1,135 @@
+"""Upstream client libraries, imported lazily and configured once.
+
+yfinance (with pandas behind it) and google-generativeai take well over a
+second to import, most of the app's start-up time. Modules use the stand-ins
+below (``from providers import yf, genai``) instead of importing them, so a
+library is only loaded on first use or by the background warm-up the app
+starts with; ``GET /api/ready`` answers 200 once the warm-up is done.
+
+This is also the one place ``.env`` is read and Gemini is configured.
+"""
+import asyncio
+import importlib
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from executors import run_llm, run_market_data
+
+STARTED = time.monotonic()
+
+# Load environment variables from .env file
+load_dotenv()
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+if not GEMINI_API_KEY:
+    print("Warning: GEMINI_API_KEY not found in .env file.")
+
+# Import the client libraries in the background at start-up. Off, they load
+# on the first request that needs them.
+PROVIDER_WARMUP = os.getenv("PROVIDER_WARMUP", "1").lower() not in ("0", "false", "no")
+
+
+class LazyModule:
+    """Stands in for a module until one of its attributes is first used.
+
+    Attribute writes and deletes go to the real module, so
+    ``mock.patch('market_data.yf.Ticker')`` patches yfinance itself, as it
+    did when the module was imported directly.
+    """
+
+    def __init__(self, name, setup=None):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_setup", setup)
+        object.__setattr__(self, "_module", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+        object.__setattr__(self, "_load_seconds", None)
+
+    def load(self):
+        """Import (and set up) the module once; concurrent callers wait for it."""
+        module = self._module
+        if module is None:
+            with self._lock:
+                module = self._module
+                if module is None:
+                    started = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    if self._setup is not None:
+                        self._setup(module)
+                    object.__setattr__(self, "_load_seconds", time.perf_counter() - started)
+                    object.__setattr__(self, "_module", module)
+        return module
+
+    def status(self):
+        return {
+            "loaded": self._module is not None,
+            "loadMs": None if self._load_seconds is None else round(self._load_seconds * 1000, 1),
+        }
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self.load(), attr, value)
+
+    def __delattr__(self, attr):
+        delattr(self.load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def _configure_gemini(module):
+    if GEMINI_API_KEY:
+        module.configure(api_key=GEMINI_API_KEY)
+
+
+yf = LazyModule("yfinance")
+genai = LazyModule("google.generativeai", setup=_configure_gemini)
+
+
+class WarmUp:
+    """Background import of the client libraries, reported by ``/api/ready``."""
+
+    def __init__(self):
+        self.task = None
+        self.error = None
+        self.ready_after = None
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        try:
+            # Each library loads on the pool of the upstream it serves
+            await asyncio.gather(run_market_data(yf.load), run_llm(genai.load))
+            self.ready_after = time.monotonic() - STARTED
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            print(f"Warning: provider warm-up failed: {self.error}")
+
+    async def stop(self):
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+    def ready(self):
+        return self.ready_after is not None or not PROVIDER_WARMUP
+
+    def status(self):
+        return {
+            "ready": self.ready(),
+            "readyAfterMs": None if self.ready_after is None else round(self.ready_after * 1000, 1),
+            "error": self.error,
+            "providers": {
+                "yahoo": yf.status(),
+                "gemini": {**genai.status(), "configured": bool(GEMINI_API_KEY)},
+            },
+        }
+
+
+warmup = WarmUp()
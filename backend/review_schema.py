@@ -0,0 +1,182 @@
+"""Structured (JSON) output for the Buffett and Munger reviews.
+
+With ``REVIEW_STRUCTURED_OUTPUT`` on (the default) single reviews are
+generated as JSON constrained by a response schema built from the Pydantic
+models below, which mirror the payloads the review endpoints already return.
+Checking an answer is one ``model_validate_json`` call. An answer that fails
+gets one cheap repair: a local clean-up (code fences, surrounding prose,
+trailing commas) and, if that is not enough, a single call to a small model
+with the validation errors. The full review is never regenerated for a
+formatting slip.
+
+Streamed reviews stay on markdown, since their sections are rendered while
+the text is still arriving.
+"""
+import os
+import re
+from typing import List, Literal
+
+from pydantic import BaseModel, ValidationError, field_validator
+
+import metrics
+import upstream
+from prompts import JSON_REPAIR_PROMPT
+from providers import genai
+
+STRUCTURED_OUTPUT = os.getenv("REVIEW_STRUCTURED_OUTPUT", "1").lower() not in ("0", "false", "no")
+REPAIR_MODEL_NAME = os.getenv("REVIEW_REPAIR_MODEL", "models/gemini-1.5-flash")
+
+# Range checks live in validators rather than Field(ge=..., le=...): the
+# Gemini schema format has no minimum/maximum.
+
+
+def _upper(value):
+    return value.strip().upper() if isinstance(value, str) else value
+
+
+class MungerRating(BaseModel):
+    criterion: str
+    explanation: str
+    rating: int
+
+    @field_validator("rating")
+    @classmethod
+    def _stars(cls, value):
+        if not 0 <= value <= 5:
+            raise ValueError("rating must be between 0 and 5 stars")
+        return value
+
+
+class MungerReview(BaseModel):
+    ratings: List[MungerRating]
+    overallScore: str
+    summary: str
+    verdict: Literal["BUY", "WATCH", "AVOID"]
+
+    _verdict = field_validator("verdict", mode="before")(_upper)
+
+    @field_validator("ratings")
+    @classmethod
+    def _rated(cls, value):
+        if not value:
+            raise ValueError("at least one rating is required")
+        return value
+
+    def payload(self):
+        """Same shape as ``parse_munger_response``."""
+        return self.model_dump()
+
+
+class BuffettSection(BaseModel):
+    title: str
+    content: str
+
+
+class BuffettReview(BaseModel):
+    recommendation: Literal["BUY", "HOLD", "SELL"]
+    sections: List[BuffettSection]
+
+    _recommendation = field_validator("recommendation", mode="before")(_upper)
+
+    @field_validator("sections")
+    @classmethod
+    def _has_sections(cls, value):
+        if not value:
+            raise ValueError("at least one section is required")
+        return value
+
+    def payload(self):
+        """Same shape as ``parse_llm_response``: the badge, then title -> content."""
+        sections = {"recommendation": self.recommendation}
+        for section in self.sections:
+            sections[section.title.strip().lstrip("#").strip()] = section.content.strip()
+        return sections
+
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+def clean_json(text):
+    """Local repair: strip code fences, prose around the object and trailing commas."""
+    text = _FENCE.sub("", text.strip())
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        text = text[start:end + 1]
+    return _TRAILING_COMMA.sub(r"\1", text)
+
+
+def _describe(error):
+    return "\n".join(
+        f"- {'.'.join(map(str, e['loc'])) or '(root)'}: {e['msg']}" for e in error.errors(include_url=False)
+    )
+
+
+def _json_config(schema):
+    return genai.GenerationConfig(response_mime_type="application/json", response_schema=schema)
+
+
+def validate(schema, text, model_name):
+    """Validate a structured answer, cleaning it up locally if needed.
+
+    Returns ``(review, text)`` where ``text`` is the JSON that validated.
+    Raises ``ValidationError`` (for the cleaned-up text) when it still fails;
+    ``repair`` is the next step.
+    """
+    try:
+        review = schema.model_validate_json(text)
+        metrics.REVIEW_VALIDATION.inc(model=model_name, result="valid")
+        return review, text
+    except ValidationError:
+        pass
+
+    cleaned = clean_json(text)
+    review = schema.model_validate_json(cleaned)
+    metrics.REVIEW_VALIDATION.inc(model=model_name, result="cleaned")
+    return review, cleaned
+
+
+def repair(schema, text, error, model_name):
+    """One call to the repair model with the validation ``error``. Blocking.
+
+    Returns ``(review, text)``; raises ``ValueError`` when the repair did not
+    help either.
+    """
+    model = genai.GenerativeModel(REPAIR_MODEL_NAME)
+    with metrics.llm_generation(REPAIR_MODEL_NAME, "repair") as generation:
+        response = model.generate_content(
+            JSON_REPAIR_PROMPT.format(errors=_describe(error), text=clean_json(text)),
+            generation_config=_json_config(schema),
+        )
+        generation.usage = getattr(response, 'usage_metadata', None)
+    try:
+        review = schema.model_validate_json(clean_json(response.text or ""))
+    except ValidationError as e:
+        metrics.REVIEW_VALIDATION.inc(model=model_name, result="failed")
+        raise ValueError(f"LLM response does not match the {schema.__name__} schema:\n{_describe(e)}") from e
+    metrics.REVIEW_VALIDATION.inc(model=model_name, result="repaired")
+    return review, response.text
+
+
+def _generate_json(model_name, prompt, schema):
+    model = genai.GenerativeModel(model_name)
+    with metrics.llm_generation(model_name, "single") as generation:
+        response = model.generate_content(prompt, generation_config=_json_config(schema))
+        generation.usage = getattr(response, 'usage_metadata', None)
+    if not response.text:
+        raise ValueError("LLM did not return a valid response.")
+    return response.text
+
+
+async def generate(model_name, prompt, schema):
+    """Generate a review as ``schema``; returns ``(review, raw_json)``.
+
+    The generation and the repair are separate Gemini calls, each admitted
+    and retried on its own, so retrying a failed repair never regenerates
+    the review.
+    """
+    text = await upstream.gemini.call(_generate_json, model_name, prompt, schema)
+    try:
+        return validate(schema, text, model_name)
+    except ValidationError as e:
+        return await upstream.gemini.call(repair, schema, text, e, model_name)
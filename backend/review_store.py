@@ -0,0 +1,188 @@
+"""On-disk store for generated LLM reviews.
+
+Reviews are keyed by a hash of the exact prompt, the model name, the prompt
+version (``prompts.PROMPT_VERSIONS``) and a date bucket, so a changed prompt
+template, response schema or model never serves an old answer and every
+review rolls over after ``REVIEW_CACHE_BUCKET_DAYS``. Both the raw
+LLM text and the parsed payload are kept so parser fixes can be replayed
+without regenerating.
+
+Reads and writes are blocking SQLite calls; async callers run them on the
+market-data pool, never on the event loop or behind Gemini calls in the LLM
+pool.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import cache_backend
+import market_data
+import metrics
+from executors import run_market_data
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "reviews.sqlite3")
+REVIEW_CACHE_PATH = os.getenv("REVIEW_CACHE_PATH", DEFAULT_PATH)
+REVIEW_CACHE_BUCKET_DAYS = int(os.getenv("REVIEW_CACHE_BUCKET_DAYS", "7"))
+# Entries older than this are ignored even inside their bucket.
+REVIEW_CACHE_MAX_AGE_HOURS = float(os.getenv("REVIEW_CACHE_MAX_AGE_HOURS", "168"))
+# With a shared cache backend, how long a worker waits for a review another
+# worker is generating before generating it itself.
+REVIEW_GENERATION_WAIT = float(os.getenv("REVIEW_GENERATION_WAIT", "180"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_hash TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    raw_text TEXT NOT NULL,
+    parsed TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    version TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS reviews_symbol_kind ON reviews (symbol, kind);
+"""
+
+
+def prompt_hash(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def date_bucket(now=None, bucket_days=None):
+    bucket_days = bucket_days or REVIEW_CACHE_BUCKET_DAYS
+    now = now if now is not None else time.time()
+    day = int(now // 86400)
+    start = day - day % bucket_days
+    return datetime.fromtimestamp(start * 86400, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+class ReviewStore:
+    def __init__(self, path, bucket_days=REVIEW_CACHE_BUCKET_DAYS, max_age_hours=REVIEW_CACHE_MAX_AGE_HOURS):
+        self.path = path
+        self.bucket_days = bucket_days
+        self.max_age_hours = max_age_hours
+        self._initialized = False
+
+    @contextmanager
+    def _connect(self):
+        if not self._initialized:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            if not self._initialized:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+                # Stores created before reviews were versioned
+                if "version" not in {row[1] for row in conn.execute("PRAGMA table_info(reviews)")}:
+                    conn.execute("ALTER TABLE reviews ADD COLUMN version TEXT NOT NULL DEFAULT ''")
+                self._initialized = True
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def make_key(self, model, prompt, now=None, version=""):
+        return f"{model}:{version}:{prompt_hash(prompt)}:{date_bucket(now, self.bucket_days)}"
+
+    def get(self, model, prompt, max_age_hours=None, version="", record=True):
+        """The stored review, or None. ``record=False`` leaves the hit/miss metrics alone."""
+        max_age_hours = self.max_age_hours if max_age_hours is None else max_age_hours
+        key = self.make_key(model, prompt, version=version)
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT raw_text, parsed, created_at FROM reviews WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or time.time() - row[2] > max_age_hours * 3600:
+            if record:
+                metrics.REVIEW_CACHE.inc(model=model, result="miss")
+            return None
+        raw_text, parsed, created_at = row
+        if record:
+            metrics.REVIEW_CACHE.inc(model=model, result="hit")
+        return {"raw_text": raw_text, "parsed": json.loads(parsed), "created_at": created_at}
+
+    def put(self, kind, symbol, model, prompt, raw_text, parsed, version=""):
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO reviews VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        self.make_key(model, prompt, now, version),
+                        kind,
+                        symbol.strip().upper(),
+                        model,
+                        prompt_hash(prompt),
+                        date_bucket(now, self.bucket_days),
+                        raw_text,
+                        json.dumps(parsed),
+                        now,
+                        version,
+                    ),
+                )
+        except sqlite3.Error as e:
+            # A broken cache must never cost us an already-paid-for review.
+            print(f"Warning: failed to store {kind} review for {symbol}: {e}")
+
+    def invalidate(self, symbol=None, kind=None, prompts=()):
+        """Delete stored reviews, optionally only of one ``symbol`` and/or ``kind``.
+
+        Reviews are keyed by prompt, which names the company rather than the
+        ticker: one entry serves every ticker of the company and records
+        only the last one that stored it. Pass the company's ``prompts`` to
+        drop its entries whichever ticker stored them.
+        """
+        clauses, params = [], []
+        if symbol:
+            hashes = [prompt_hash(prompt) for prompt in prompts]
+            clauses.append(f"(symbol = ? OR prompt_hash IN ({','.join('?' * len(hashes))}))")
+            params += [symbol.strip().upper(), *hashes]
+        if kind:
+            clauses.append("kind = ?")
+            params.append(kind)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._connect() as conn:
+            return conn.execute(f"DELETE FROM reviews{where}", params).rowcount
+
+    def drop_other_versions(self, kind, version):
+        """Delete ``kind`` reviews generated by any other prompt version."""
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM reviews WHERE kind = ? AND version != ?", (kind, version)).rowcount
+
+
+store = ReviewStore(REVIEW_CACHE_PATH)
+
+
+async def generate_once(model, prompt, version, generate):
+    """``await generate()`` unless another worker is already generating this
+    review, in which case wait for it to land in the store and return that.
+
+    Only does anything across workers with ``CACHE_BACKEND=sqlite``; within a
+    process callers still go through ``llm_flight``.
+    """
+    def ready():
+        stored = store.get(model, prompt, version=version, record=False)
+        return stored["parsed"] if stored else cache_backend.MISSING
+
+    return await cache_backend.coordinate(
+        f"review:{store.make_key(model, prompt, version=version)}", ready, generate, run_market_data,
+        wait=REVIEW_GENERATION_WAIT, lease_ttl=REVIEW_GENERATION_WAIT,
+    )
+
+
+async def company_prompts(symbol, stored_prompts):
+    """``stored_prompts(company_name)`` for ``symbol``'s company; empty when the name is unavailable."""
+    try:
+        info = await market_data.get_fundamentals(symbol)
+    except Exception:
+        return []
+    name = info.get("longName", symbol)
+    return stored_prompts(name) if name else []
@@ -0,0 +1,365 @@
+"""Buffett or Munger reviews for a whole universe of symbols.
+
+A screen runs as a background job that clients poll for progress. Symbols
+with a stored review are answered from the review store; the rest are put
+``SCREEN_BATCH_SIZE`` companies to a prompt, so the instructions are paid for
+once per batch instead of once per company, with at most
+``SCREEN_CONCURRENCY`` Gemini calls in flight. The answer is split on the
+``=== SYMBOL ===`` lines the prompt asks for and each part goes through the
+same parser as a single review. Companies a batch answer leaves out (or that
+don't parse) are retried on their own, so one bad batch never loses the
+companies that did come back.
+
+A job runs in the worker that accepted it. With a shared cache backend its
+progress is published after every batch, so any worker can answer status
+polls, and a cancel sent to another worker is picked up before the next batch.
+"""
+import asyncio
+import re
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import JSONResponse
+
+import admin
+import buffett_review_route
+import cache_backend
+import market_data
+import metrics
+import munger_review_route
+import review_store
+import upstream
+from executors import run_market_data
+from prompts import BUFFETT_SCREEN_PROMPT, MUNGER_SCREEN_PROMPT
+from providers import genai
+from settings import env_number
+
+router = APIRouter()
+
+SCREEN_BATCH_SIZE = max(1, int(env_number("SCREEN_BATCH_SIZE", 5)))
+SCREEN_CONCURRENCY = max(1, int(env_number("SCREEN_CONCURRENCY", 2)))
+# Finished jobs kept around for their results.
+SCREEN_JOB_HISTORY = int(env_number("SCREEN_JOB_HISTORY", 20))
+# How long published jobs stay visible to the other workers.
+SCREEN_JOB_TTL = env_number("SCREEN_JOB_TTL", 24 * 3600)
+
+ScreenKind = namedtuple("ScreenKind", "route screen_prompt parse complete verdict")
+
+KINDS = {
+    "buffett": ScreenKind(
+        buffett_review_route, BUFFETT_SCREEN_PROMPT,
+        buffett_review_route.parse_llm_response,
+        lambda parsed: any(title not in ("recommendation", "Introduction") for title in parsed),
+        lambda parsed: parsed.get("recommendation"),
+    ),
+    "munger": ScreenKind(
+        munger_review_route, MUNGER_SCREEN_PROMPT,
+        munger_review_route.parse_munger_response,
+        lambda parsed: bool(parsed["ratings"]),
+        lambda parsed: parsed["verdict"] if parsed["verdict"] != "N/A" else None,
+    ),
+}
+
+COMPANY_MARKER = re.compile(r"^[ \t]*===[ \t]*([A-Za-z0-9.^=-]+)[ \t]*===[ \t]*$", re.MULTILINE)
+
+
+def company_lines(companies):
+    return "\n".join(f"- {symbol}: {name}" for symbol, name in companies)
+
+
+def company_prompt(spec, symbol, name):
+    """The one-company screening prompt, which screened reviews are stored under."""
+    return spec.screen_prompt.format(companies=company_lines([(symbol, name)]))
+
+
+def split_batch_response(text):
+    """Map each ``=== SYMBOL ===`` block of a screening answer to its text."""
+    parts = COMPANY_MARKER.split(text)
+    # parts = [preamble, symbol1, body1, symbol2, body2, ...]
+    return {parts[i].upper(): parts[i + 1].strip() + "\n" for i in range(1, len(parts), 2)}
+
+
+def generate_screen(model_name, prompt):
+    model = genai.GenerativeModel(model_name)
+    with metrics.llm_generation(model_name, "batch") as generation:
+        response = model.generate_content(prompt)
+        generation.usage = getattr(response, 'usage_metadata', None)
+    return response.text
+
+
+def stored_review(spec, symbol, name):
+    """A full review from the dashboard beats a screened one; either saves a call."""
+    cached = spec.route.cached_review(name) or review_store.store.get(
+        spec.route.MODEL_NAME, company_prompt(spec, symbol, name), version=spec.route.PROMPT_VERSION
+    )
+    return cached["parsed"] if cached else None
+
+
+class ScreenJob:
+    def __init__(self, kind, symbols, refresh=False):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.symbols = symbols
+        self.refresh = refresh
+        self.status = "queued"
+        self.error = None
+        self.calls = 0
+        self.results = {symbol: {"symbol": symbol, "status": "pending"} for symbol in symbols}
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.task = None
+        self.board = None
+
+    def done(self, symbol, parsed, source):
+        self.results[symbol] = {
+            "symbol": symbol,
+            "status": "done",
+            "source": source,
+            "verdict": KINDS[self.kind].verdict(parsed),
+            "review": parsed,
+        }
+
+    def failed(self, symbol, error):
+        self.results[symbol] = {"symbol": symbol, "status": "error", "error": error}
+
+    def progress(self):
+        statuses = [result["status"] for result in self.results.values()]
+        completed = len(statuses) - statuses.count("pending")
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        remaining = len(statuses) - completed
+        return {
+            "total": len(statuses),
+            "completed": completed,
+            "failed": statuses.count("error"),
+            "cached": sum(1 for r in self.results.values() if r.get("source") == "cache"),
+            "calls": self.calls,
+            "elapsedSeconds": round(elapsed, 1),
+            # Rough: assumes the rest goes as fast as what's done so far
+            "etaSeconds": round(elapsed / completed * remaining, 1) if completed and remaining else None,
+        }
+
+    def describe(self, results=True):
+        description = {
+            "jobId": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress(),
+            "createdAt": self.created_at,
+        }
+        if self.error:
+            description["error"] = self.error
+        if results:
+            description["results"] = list(self.results.values())
+        return description
+
+    async def run(self):
+        spec = KINDS[self.kind]
+        self.status, self.started_at = "running", time.time()
+        try:
+            infos = await upstream.fan_out(
+                upstream.yahoo, [lambda symbol=symbol: market_data.get_fundamentals(symbol) for symbol in self.symbols]
+            )
+            pending = []
+            for symbol, info in zip(self.symbols, infos):
+                if isinstance(info, Exception):
+                    self.failed(symbol, f"Failed to fetch company data: {info}")
+                    continue
+                name = info.get('longName', symbol)
+                if not name:
+                    self.failed(symbol, f"No data found for symbol: {symbol}")
+                    continue
+                cached = None if self.refresh else await run_market_data(stored_review, spec, symbol, name)
+                if cached:
+                    self.done(symbol, cached, "cache")
+                else:
+                    pending.append((symbol, name))
+
+            calls = asyncio.Semaphore(SCREEN_CONCURRENCY)
+            batches = [pending[i:i + SCREEN_BATCH_SIZE] for i in range(0, len(pending), SCREEN_BATCH_SIZE)]
+            tasks = [asyncio.ensure_future(self.screen_batch(spec, batch, calls)) for batch in batches]
+            try:
+                await asyncio.gather(*tasks)
+            finally:
+                # A cancel seen by one batch stops its siblings' calls (and retries) too
+                for task in tasks:
+                    task.cancel()
+            self.status = "done"
+        except asyncio.CancelledError:
+            self.status = "cancelled"
+            raise
+        except Exception as e:
+            self.status, self.error = "failed", str(e)
+        finally:
+            self.finished_at = time.time()
+            await self.publish()
+
+    async def publish(self):
+        if self.board is not None:
+            await self.board.publish(self)
+
+    async def check_cancelled(self):
+        if self.board is not None and await self.board.cancel_requested(self.id):
+            raise asyncio.CancelledError
+
+    async def screen_batch(self, spec, companies, calls):
+        try:
+            async with calls:
+                await self.check_cancelled()
+                missing = await self.review(spec, companies)
+            if len(companies) == 1:
+                for symbol, error in missing.items():
+                    self.failed(symbol, error)
+                return
+            for company in companies:
+                if company[0] in missing:
+                    async with calls:
+                        await self.check_cancelled()
+                        for symbol, error in (await self.review(spec, [company])).items():
+                            self.failed(symbol, error)
+        finally:
+            await self.publish()
+
+    async def review(self, spec, companies):
+        """Review ``companies`` in one call; returns {symbol: error} for those left without a review."""
+        prompt = spec.screen_prompt.format(companies=company_lines(companies))
+        try:
+            text = await upstream.gemini.call(generate_screen, spec.route.MODEL_NAME, prompt)
+        except Exception as e:
+            return {symbol: f"Failed to generate {self.kind} review: {e}" for symbol, _ in companies}
+        self.calls += 1
+        answers = split_batch_response(text or "")
+        missing = {}
+        for symbol, name in companies:
+            answer = answers.get(symbol)
+            parsed = spec.parse(answer) if answer else None
+            if not parsed or not spec.complete(parsed):
+                missing[symbol] = "LLM did not return a valid review for this company."
+                continue
+            await run_market_data(review_store.store.put, self.kind, symbol, spec.route.MODEL_NAME,
+                                  company_prompt(spec, symbol, name), answer, parsed, version=spec.route.PROMPT_VERSION)
+            self.done(symbol, parsed, "batch" if len(companies) > 1 else "single")
+        return missing
+
+
+class ScreenJobs:
+    def __init__(self, history=SCREEN_JOB_HISTORY):
+        self.history = history
+        self._jobs = OrderedDict()
+        # Shared between workers only with a shared cache backend
+        self._board = cache_backend.make_cache("screen_jobs", max(history, 1) * 8, SCREEN_JOB_TTL)
+        self._cancels = cache_backend.make_cache("screen_cancels", max(history, 1) * 8, SCREEN_JOB_TTL)
+
+    def start(self, job):
+        self._jobs[job.id] = job
+        job.board = self
+        job.task = asyncio.create_task(job.run())
+        finished = [j for j in self._jobs.values() if j.finished_at is not None]
+        for old in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[old.id]
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    async def publish(self, job):
+        if self._board.shared:
+            await self._board.aset_many([(job.id, job.describe())])
+
+    def remote(self, job_id, results=True):
+        """Description of a job running in another worker, or None."""
+        if not self._board.shared:
+            return None
+        description = self._board.get(job_id)
+        if description is cache_backend.MISSING:
+            return None
+        return description if results else {k: v for k, v in description.items() if k != "results"}
+
+    async def describe_all(self):
+        descriptions = [job.describe(results=False) for job in self._jobs.values()]
+        if self._board.shared:
+            board = await run_market_data(lambda: list(self._board.values()))
+            descriptions += [
+                {k: v for k, v in description.items() if k != "results"}
+                for description in board if description["jobId"] not in self._jobs
+            ]
+        return descriptions
+
+    def cancel(self, job):
+        if job.task is not None and not job.task.done():
+            job.task.cancel()
+            job.status = "cancelled"
+
+    def request_cancel(self, job_id):
+        """Ask the worker running ``job_id`` to stop before its next batch."""
+        self._cancels.set(job_id, True)
+
+    async def cancel_requested(self, job_id):
+        return self._cancels.shared and await self._cancels.aget(job_id) is not cache_backend.MISSING
+
+    async def shutdown(self):
+        running = [job.task for job in self._jobs.values() if job.task is not None and not job.task.done()]
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+    def stats(self):
+        statuses = [job.status for job in self._jobs.values()]
+        return {status: statuses.count(status) for status in sorted(set(statuses))}
+
+
+jobs = ScreenJobs()
+
+
+@router.post("/api/screen", status_code=202)
+async def start_screen(
+    symbols: str = Query(..., min_length=1),
+    kind: str = Query("munger", regex="^(buffett|munger)$"),
+    refresh: bool = Query(False),
+    x_admin_token: str = Header(None),
+):
+    if not KINDS[kind].route.GEMINI_API_KEY:
+        raise HTTPException(status_code=500, detail="Server configuration error: Gemini API key not set.")
+    forbidden = admin.refresh_forbidden(refresh, x_admin_token)
+    if forbidden:
+        return forbidden
+    try:
+        symbol_list = market_data.parse_symbols(symbols)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    job = jobs.start(ScreenJob(kind, symbol_list, refresh))
+    return job.describe(results=False)
+
+
+@router.get("/api/screen")
+async def list_screens():
+    return {"jobs": await jobs.describe_all()}
+
+
+@router.get("/api/screen/{job_id}")
+async def screen_status(job_id: str, results: bool = Query(True)):
+    job = jobs.get(job_id)
+    if job is not None:
+        return job.describe(results)
+    description = await run_market_data(jobs.remote, job_id, results)
+    if description is None:
+        return JSONResponse(status_code=404, content={"error": "No such screening job."})
+    return description
+
+
+@router.delete("/api/screen/{job_id}")
+async def cancel_screen(job_id: str):
+    job = jobs.get(job_id)
+    if job is not None:
+        # Task.cancel is not thread-safe; this handler runs on the loop
+        jobs.cancel(job)
+        return job.describe(results=False)
+    description = await run_market_data(jobs.remote, job_id, False)
+    if description is None:
+        return JSONResponse(status_code=404, content={"error": "No such screening job."})
+    if description["status"] in ("queued", "running"):
+        await run_market_data(jobs.request_cancel, job_id)
+        description["status"] = "cancelling"
+    return description
@@ -0,0 +1,151 @@
+"""Vectorized transforms for price series.
+
+Everything here works on whole NumPy columns; the only per-point Python work
+left is building the JSON lists at the very end.
+"""
+import math
+import re
+
+import numpy as np
+import pandas as pd
+
+INDICATOR_PATTERN = re.compile(r"^(logret|drawdown|vol\d+|sma\d+|ema\d+)$")
+MAX_INDICATOR_WINDOW = 1000
+
+# Bars per year for annualizing volatility, keyed by yfinance interval.
+PERIODS_PER_YEAR = {
+    "1m": 252 * 390,
+    "15m": 252 * 26,
+    "1d": 252,
+}
+
+
+def json_values(values):
+    """Float array -> list with NaN replaced by None."""
+    values = np.asarray(values, dtype=float)
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+def json_safe(value):
+    """``value`` with every non-finite float (NaN, inf) in it replaced by None.
+
+    Walks dicts, lists and tuples; for payloads serialized outside FastAPI,
+    whose JSON may not contain NaN.
+    """
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {k: json_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_safe(v) for v in value]
+    return value
+
+
+def first_valid(values):
+    valid = values[~np.isnan(values)]
+    return valid[0] if valid.size else None
+
+
+def percent_from_first(values):
+    """Percent change of every point relative to the first valid one."""
+    return percent_from_first_of(values, values)
+
+
+def percent_from_first_of(values, base):
+    """Like ``percent_from_first`` but measured against ``base``'s first value."""
+    first = first_valid(base)
+    if not first:
+        return values
+    return (values / first - 1) * 100
+
+
+def log_returns(values):
+    out = np.full(values.shape, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[1:] = np.diff(np.log(values))
+    return out
+
+
+def rolling_volatility(values, window, periods_per_year=252):
+    """Annualized rolling standard deviation of log returns."""
+    returns = pd.Series(log_returns(values))
+    return returns.rolling(window).std().to_numpy() * np.sqrt(periods_per_year)
+
+
+def drawdown(values):
+    """Percent below the running peak (0 at a new high)."""
+    peak = np.fmax.accumulate(values)
+    return (values / peak - 1) * 100
+
+
+def moving_average(values, window):
+    return pd.Series(values).rolling(window).mean().to_numpy()
+
+
+def exponential_moving_average(values, window):
+    return pd.Series(values).ewm(span=window, adjust=False).mean().to_numpy()
+
+
+def epoch_ms(index):
+    """DatetimeIndex -> int64 epoch milliseconds."""
+    return index.as_unit("ms").asi8
+
+
+def lttb_indices(x, y, threshold):
+    """Indices kept by Largest-Triangle-Three-Buckets downsampling.
+
+    Gaps (NaN values) are dropped before bucketing. The first and last valid
+    points are always kept.
+    """
+    valid = np.flatnonzero(~np.isnan(y))
+    n = valid.size
+    if threshold >= n or threshold < 3:
+        return valid
+    x = np.asarray(x, dtype=float)[valid]
+    y = y[valid]
+
+    every = (n - 2) / (threshold - 2)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        keep[i + 1] = a
+    return valid[keep]
+
+
+def parse_indicators(raw):
+    """``"sma50,vol20"`` -> ``["sma50", "vol20"]``; raises ValueError if unknown."""
+    if not raw:
+        return []
+    names = list(dict.fromkeys(name.strip().lower() for name in raw.split(",") if name.strip()))
+    for name in names:
+        if not INDICATOR_PATTERN.match(name):
+            raise ValueError(f"Unknown indicator: {name}")
+        window = re.sub(r"\D", "", name)
+        if window and not 1 < int(window) <= MAX_INDICATOR_WINDOW:
+            raise ValueError(f"Indicator window out of range: {name}")
+    return names
+
+
+def compute_indicators(values, names, periods_per_year=252):
+    result = {}
+    for name in names:
+        window = int(re.sub(r"\D", "", name) or 0)
+        if name == "logret":
+            result[name] = log_returns(values)
+        elif name == "drawdown":
+            result[name] = drawdown(values)
+        elif name.startswith("vol"):
+            result[name] = rolling_volatility(values, window, periods_per_year)
+        elif name.startswith("sma"):
+            result[name] = moving_average(values, window)
+        elif name.startswith("ema"):
+            result[name] = exponential_moving_average(values, window)
+    return result
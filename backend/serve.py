@@ -0,0 +1,37 @@
+"""Run the API with N uvicorn worker processes.
+
+    python serve.py --workers 4 --port 8000
+
+Workers default to ``WEB_CONCURRENCY`` (or 1). With more than one worker the
+shared SQLite cache backend is switched on unless ``CACHE_BACKEND`` says
+otherwise, so the workers share market data, reviews and screening jobs and
+fetch each upstream miss once per host. ``WEB_CONCURRENCY`` is exported to the
+workers so the upstream rate limits are split between them.
+"""
+import argparse
+import os
+
+import uvicorn
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "1")))
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--cache-backend", choices=["memory", "sqlite"], default=os.getenv("CACHE_BACKEND"))
+    args = parser.parse_args(argv)
+
+    workers = max(1, args.workers)
+    # Workers are fresh processes that read their configuration from the environment
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    os.environ["CACHE_BACKEND"] = args.cache_backend or ("sqlite" if workers > 1 else "memory")
+    if workers > 1 and os.environ["CACHE_BACKEND"] == "memory":
+        print("Warning: every worker keeps its own cache and prefetcher with CACHE_BACKEND=memory")
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+"""Helpers for reading settings from the environment."""
+import os
+
+
+def env_number(name, default):
+    """``name`` from the environment as a float, or ``default`` when unset or not a number."""
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
@@ -0,0 +1,73 @@
+"""Request coalescing for identical upstream lookups.
+
+When many requests ask for the same key at once, only the first one (the
+leader) starts the upstream call; everyone else awaits the same task and
+shares its result or its exception. The call runs as its own task, so a
+client disconnecting does not cancel the lookup for the other waiters.
+"""
+import asyncio
+
+import metrics
+
+
+class _Call:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+def _consume_error(task):
+    # Retrieve the exception so an abandoned call doesn't log "never retrieved".
+    if not task.cancelled():
+        task.exception()
+
+
+class SingleFlight:
+    def __init__(self, name):
+        self.name = name
+        self.executions = 0
+        self.coalesced = 0
+        self.max_waiters = 0
+        self._calls = {}
+
+    async def do(self, key, fn):
+        """Await ``fn()`` once per ``key`` across all concurrent callers."""
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = _Call(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(lambda _: self._calls.pop(key, None))
+            call.task.add_done_callback(_consume_error)
+            self.executions += 1
+            return await asyncio.shield(call.task)
+
+        call.waiters += 1
+        self.coalesced += 1
+        self.max_waiters = max(self.max_waiters, call.waiters)
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+
+    def stats(self):
+        return {
+            "inFlight": len(self._calls),
+            "waiting": sum(call.waiters for call in self._calls.values()),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "maxWaiters": self.max_waiters,
+        }
+
+
+market_data_flight = SingleFlight("market_data")
+llm_flight = SingleFlight("llm")
+
+
+def _collect_metrics():
+    flights = (market_data_flight, llm_flight)
+    yield ("trady_single_flight_executions_total", "counter", "Upstream calls started by a leader.",
+           [({"flight": f.name}, f.executions) for f in flights])
+    yield ("trady_single_flight_coalesced_total", "counter", "Requests that joined an in-flight call.",
+           [({"flight": f.name}, f.coalesced) for f in flights])
+
+
+metrics.registry.add_collector(_collect_metrics)
@@ -0,0 +1,77 @@
+"""Helpers for streaming Gemini output to the browser as server-sent events."""
+import asyncio
+import json
+import threading
+
+import metrics
+import series
+from executors import llm_executor
+
+_DONE = object()
+
+
+def sse_event(event, data):
+    # Browsers' JSON.parse rejects NaN; a non-finite value that slips past
+    # json_safe (e.g. a NumPy scalar) should fail here, not in the client
+    return f"event: {event}\ndata: {json.dumps(series.json_safe(data), allow_nan=False)}\n\n"
+
+
+async def iterate_in_executor(make_iterator, executor=llm_executor):
+    """Drive a blocking iterator on ``executor`` and yield its items here.
+
+    The iterator is created inside the worker thread, so even the initial
+    (blocking) request to the upstream never runs on the event loop. When the
+    consumer stops early (the client disconnected), the worker stops at the
+    next item and closes the iterator, freeing its thread and connection.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def put(item):
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+
+    def pump():
+        iterator = None
+        try:
+            iterator = iter(make_iterator())
+            for item in iterator:
+                if stop.is_set():
+                    break
+                put(item)
+        except BaseException as e:
+            put(e)
+        finally:
+            close = getattr(iterator, "close", None)
+            if stop.is_set() and close is not None:
+                close()
+            put(_DONE)
+
+    worker = loop.run_in_executor(executor, pump)
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+        await worker
+    finally:
+        stop.set()
+
+
+async def stream_text(model, prompt):
+    """Yield text chunks from ``model.generate_content(prompt, stream=True)``."""
+    with metrics.llm_generation(getattr(model, "model_name", "unknown"), "stream") as generation:
+        async for chunk in iterate_in_executor(lambda: model.generate_content(prompt, stream=True)):
+            # Usage totals arrive with the last chunk
+            generation.usage = getattr(chunk, "usage_metadata", None) or generation.usage
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. a trailing safety/finish chunk)
+                continue
+            if text:
+                yield text
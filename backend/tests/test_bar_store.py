@@ -0,0 +1,142 @@
+import unittest
+from unittest import mock
+import tempfile
+import sys
+import os
+
+import pandas as pd
+
+# Add the parent directory to the Python path to allow for module imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bar_store import BarStore, required_start
+
+TZ = 'America/New_York'
+
+
+def daily_frame(start, closes):
+    index = pd.date_range(start, periods=len(closes), freq='B', tz=TZ, name='Date')
+    return pd.DataFrame({
+        'Open': closes, 'High': closes, 'Low': closes, 'Close': closes, 'Volume': [1000.0] * len(closes),
+    }, index=index)
+
+
+class TestBarStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = BarStore(self.tmpdir.name)
+        self.today = pd.Timestamp.now(tz=TZ).normalize()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_second_request_only_fetches_the_delta(self):
+        full = daily_frame(self.today - pd.Timedelta(days=60), [float(i) for i in range(40)])
+        last_day = full.index[-1]
+        delta = daily_frame(last_day, [99.0, 100.0])
+
+        with mock.patch('bar_store.yf.Ticker') as ticker_cls:
+            history = ticker_cls.return_value.history
+            history.return_value = full
+            first = self.store.bars('AAPL', '1d', period='1mo')
+            history.return_value = delta
+            second = self.store.bars('AAPL', '1d', period='1mo')
+
+        self.assertIn('start', history.call_args_list[0].kwargs)
+        self.assertEqual(history.call_args_list[1].kwargs['start'], last_day)
+        # The delta overwrote the last stored bar and appended one more
+        self.assertEqual(second['Close'].iloc[-2:].tolist(), [99.0, 100.0])
+        self.assertEqual(len(second), len(first) + 1)
+        self.assertGreaterEqual(first.index[0], self.today - pd.DateOffset(months=1) - pd.Timedelta(days=1))
+
+    def test_longer_period_triggers_a_full_refetch_then_shorter_ones_are_slices(self):
+        with mock.patch('bar_store.yf.Ticker') as ticker_cls:
+            history = ticker_cls.return_value.history
+            history.return_value = daily_frame(self.today - pd.Timedelta(days=30), [1.0] * 20)
+            self.store.bars('MSFT', '1d', period='1mo')
+            history.return_value = daily_frame(self.today - pd.Timedelta(days=400), [2.0] * 280)
+            one_year = self.store.bars('MSFT', '1d', period='1y')
+            history.return_value = pd.DataFrame()
+            ytd = self.store.bars('MSFT', '1d', period='ytd')
+
+        self.assertEqual(history.call_args_list[1].kwargs['start'], required_start('1y', pd.Timestamp.now(tz='UTC')))
+        self.assertEqual(len(history.call_args_list), 3)
+        self.assertTrue(set(ytd.index) <= set(one_year.index))
+
+    def test_past_window_is_served_without_fetching(self):
+        start = pd.Timestamp('2026-01-05', tz=TZ)  # a Monday, so day offsets land on sessions
+        with mock.patch('bar_store.yf.Ticker') as ticker_cls:
+            ticker_cls.return_value.history.return_value = daily_frame(start, [float(i) for i in range(60)])
+            self.store.bars('AAPL', '1d', start=(start - pd.Timedelta(days=5)).strftime('%Y-%m-%d'))
+            ticker_cls.reset_mock()
+            window = self.store.bars(
+                'AAPL', '1d',
+                start=(start + pd.Timedelta(days=7)).strftime('%Y-%m-%d'),
+                end=(start + pd.Timedelta(days=14)).strftime('%Y-%m-%d'),
+            )
+
+        ticker_cls.return_value.history.assert_not_called()
+        self.assertEqual(len(window), 5)
+        self.assertEqual(window.index[0], start + pd.Timedelta(days=7))
+        self.assertEqual(window.index.name, 'Date')
+
+    def test_session_periods_keep_the_last_sessions(self):
+        index = pd.date_range(self.today - pd.Timedelta(days=3), periods=4 * 3, freq='8h', tz=TZ, name='Datetime')
+        frame = pd.DataFrame({'Close': range(12)}, index=index, dtype=float)
+        with mock.patch('bar_store.yf.Ticker') as ticker_cls:
+            ticker_cls.return_value.history.return_value = frame
+            one_day = self.store.bars('AAPL', '1m', period='1d')
+        self.assertEqual(one_day.index.normalize().nunique(), 1)
+        self.assertEqual(one_day.index.name, 'Datetime')
+
+    def test_batch_deltas_line_up_with_bars_stored_by_ticker_history(self):
+        full = daily_frame(self.today - pd.Timedelta(days=60), [float(i) for i in range(40)])
+        last_day = full.index[-1]
+        # A tz-naive bulk download, as yf.download returns with ignore_tz=True
+        naive = daily_frame(last_day, [99.0, 100.0]).tz_localize(None)
+        bulk = pd.concat({'AAPL': naive}, axis=1)
+
+        with mock.patch('bar_store.yf.Ticker') as ticker_cls, \
+                mock.patch('bar_store.yf.download', return_value=bulk) as download:
+            ticker_cls.return_value.history.return_value = full
+            self.store.bars('AAPL', '1d', period='1mo')
+            frame = self.store.bars_batch(['AAPL'], '1d', '1mo')['AAPL']
+
+        self.assertFalse(download.call_args.kwargs['ignore_tz'])
+        self.assertEqual(str(frame.index.tz), TZ)
+        self.assertTrue((frame.index == frame.index.normalize()).all())
+        self.assertTrue(frame.index.is_unique)
+        self.assertEqual(frame['Close'].iloc[-2:].tolist(), [99.0, 100.0])
+
+    def test_split_in_a_delta_refetches_the_stored_range(self):
+        full = daily_frame(self.today - pd.Timedelta(days=60), [100.0] * 40)
+        split_day = full.index[-1] + pd.offsets.BDay(1)
+        delta = daily_frame(full.index[-1], [100.0, 10.0])
+        delta['Stock Splits'] = [0.0, 10.0]
+        readjusted = daily_frame(full.index[0], [10.0] * 41)
+        readjusted['Stock Splits'] = [0.0] * 40 + [10.0]
+
+        with mock.patch('bar_store.yf.Ticker') as ticker_cls:
+            history = ticker_cls.return_value.history
+            history.side_effect = [full, delta, readjusted, daily_frame(split_day, [10.0])]
+            self.store.bars('AAPL', '1d', period='1mo')
+            after_split = self.store.bars('AAPL', '1d', period='1mo')
+            next_day = self.store.bars('AAPL', '1d', period='1mo')
+
+        self.assertEqual(history.call_args_list[2].kwargs['start'], required_start('1mo', pd.Timestamp.now(tz='UTC')))
+        self.assertEqual(set(after_split['Close']), {10.0})
+        # The split on the last stored bar is already reflected; no further refetch
+        self.assertEqual(len(history.call_args_list), 4)
+        self.assertEqual(len(next_day), len(after_split))
+
+    def test_empty_fetch_does_not_create_a_partition(self):
+        with mock.patch('bar_store.yf.Ticker') as ticker_cls:
+            ticker_cls.return_value.history.return_value = pd.DataFrame()
+            frame = self.store.bars('NOPE', '1d', period='1y')
+        self.assertTrue(frame.empty)
+        self.assertEqual(self.store.read('NOPE', '1d'), (None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
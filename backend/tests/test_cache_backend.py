@@ -0,0 +1,147 @@
+import asyncio
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import sys
+import os
+
+# Add the parent directory to the Python path to allow for module imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cache_backend
+from cache_backend import MISSING, SharedStore, SQLiteCache
+
+
+class SharedCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, 'cache.sqlite3')
+
+    def worker(self, namespace='history', maxsize=8, ttl=60):
+        """A cache as another worker process would see it: its own store and connections."""
+        return SQLiteCache(namespace, maxsize, ttl, store=SharedStore(self.path))
+
+
+class TestSQLiteCache(SharedCacheTestCase):
+
+    def test_workers_see_each_others_entries(self):
+        first, second = self.worker(), self.worker()
+        first.set(('AAPL', '1y', '1d', None, None), {'close': [1.0, 2.0]})
+        self.assertEqual(second.get(('AAPL', '1y', '1d', None, None)), {'close': [1.0, 2.0]})
+        self.assertIs(second.get(('MSFT', '1y', '1d', None, None)), MISSING)
+        self.assertEqual(second.stats(), {'size': 1, 'maxsize': 8, 'hits': 1, 'misses': 1})
+
+        first.invalidate()
+        with mock.patch.object(cache_backend, 'SHARED_CACHE_LOCAL_TTL', 0):
+            self.assertIs(self.worker().get(('AAPL', '1y', '1d', None, None)), MISSING)
+
+    def test_expired_entries_stay_available_as_stale(self):
+        first, second = self.worker(), self.worker()
+        first.set('AAPL', 1, ttl=-1)
+        self.assertIs(second.get('AAPL'), MISSING)
+        self.assertEqual(second.get_stale('AAPL'), 1)
+
+    def test_oldest_entries_are_pruned_beyond_maxsize(self):
+        cache = self.worker(maxsize=2)
+        with mock.patch.object(cache_backend, 'PRUNE_EVERY', 1):
+            for key in 'abc':
+                cache.set(key, key)
+        self.assertEqual(sorted(cache.values()), ['b', 'c'])
+
+    def test_async_reads_and_writes_touch_sqlite_off_the_loop(self):
+        first, second = self.worker(), self.worker()
+        offloaded = []
+
+        async def run_market_data(fn, *args):
+            offloaded.append(fn.__name__)
+            return await asyncio.to_thread(fn, *args)
+
+        async def use_cache():
+            await first.aset_many([('AAPL', 1), ('MSFT', 2)])
+            found = await second.aget_many(['AAPL', 'MSFT', 'TSLA'])
+            # Now in the local front: answered without leaving the loop
+            again = await second.aget('AAPL')
+            return found, again
+
+        with mock.patch.object(cache_backend, 'run_market_data', run_market_data):
+            found, again = asyncio.run(use_cache())
+        self.assertEqual(found, {'AAPL': 1, 'MSFT': 2})
+        self.assertEqual(again, 1)
+        self.assertEqual(offloaded, ['write', '_peek'])
+        self.assertEqual(second.stats()['hits'], 3)
+        self.assertEqual(second.stats()['misses'], 1)
+
+
+class TestCoordination(SharedCacheTestCase):
+
+    def test_only_the_lease_holder_fetches(self):
+        holder, waiter = self.worker(), self.worker()
+        fetch = mock.AsyncMock(return_value={'AAPL': 'fetched'})
+        waited = {}
+
+        async def download(keys):
+            # While this worker downloads, another one asks for the same key
+            other = threading.Thread(target=lambda: waited.update(asyncio.run(waiter.fill(['AAPL'], fetch))))
+            other.start()
+            await asyncio.sleep(0.1)
+            holder.set('AAPL', 'downloaded')
+            other.join(timeout=5)
+            return {'AAPL': 'downloaded'}
+
+        self.assertEqual(asyncio.run(holder.fill(['AAPL'], download)), {'AAPL': 'downloaded'})
+        self.assertEqual(waited, {'AAPL': 'downloaded'})
+        fetch.assert_not_awaited()
+
+    def test_waiters_fetch_themselves_when_the_holder_stalls(self):
+        SharedStore(self.path).acquire('history:stuck', 'crashed-worker', 60)
+        fetch = mock.AsyncMock(return_value='fetched')
+        with mock.patch.object(cache_backend, 'SHARED_CACHE_FILL_WAIT', 0.1):
+            value = asyncio.run(cache_backend.coordinate(
+                'history:stuck', lambda: MISSING, fetch, lambda fn, *args: asyncio.to_thread(fn, *args),
+                store=SharedStore(self.path),
+            ))
+        self.assertEqual(value, 'fetched')
+
+    def test_waiters_poll_without_holding_a_thread(self):
+        SharedStore(self.path).acquire('review:stuck', 'crashed-worker', 60)
+        attempts = []
+
+        async def run_inline(fn, *args):
+            attempts.append(fn)
+            return fn(*args)
+
+        async def wait_and_tick():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            task = asyncio.ensure_future(ticker())
+            value = await cache_backend.coordinate('review:stuck', lambda: MISSING, mock.AsyncMock(return_value='x'),
+                                                   run_inline, store=SharedStore(self.path), wait=0.3)
+            task.cancel()
+            return value, ticks
+
+        value, ticks = asyncio.run(wait_and_tick())
+        self.assertEqual(value, 'x')
+        # The loop kept running between lease attempts
+        self.assertGreater(ticks, 10)
+        self.assertGreater(len(attempts), 2)
+
+    def test_one_leader_until_its_lease_lapses(self):
+        first, second = SharedStore(self.path), SharedStore(self.path)
+        self.assertTrue(first.acquire('leader:prefetch', 'worker-1', 60))
+        self.assertTrue(first.acquire('leader:prefetch', 'worker-1', 60))
+        self.assertFalse(second.acquire('leader:prefetch', 'worker-2', 60))
+        first.acquire('leader:prefetch', 'worker-1', -1)
+        self.assertTrue(second.acquire('leader:prefetch', 'worker-2', 60))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+from unittest import mock
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+
+# Add the parent directory to the Python path to allow for module imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import event_study
+from earnings_analysis_route import build_earnings_study
+
+SESSIONS = pd.bdate_range('2024-01-01', periods=400, tz='America/New_York')
+
+
+def prices(returns):
+    return pd.DataFrame({'Close': 100 * np.cumprod(1 + np.asarray(returns))}, index=SESSIONS)
+
+
+def earnings(stamps, surprise):
+    index = pd.DatetimeIndex(stamps).tz_localize('America/New_York')
+    estimate = np.ones(len(stamps))
+    return pd.DataFrame({'EPS Estimate': estimate, 'Reported EPS': estimate * (1 + np.asarray(surprise) / 100),
+                         'Surprise(%)': surprise}, index=index)
+
+
+class TestEventStudy(unittest.TestCase):
+
+    def test_after_close_announcements_react_the_next_session(self):
+        calendar = event_study.session_dates(SESSIONS)
+        days = event_study.event_days(calendar, pd.DatetimeIndex(
+            ['2024-03-05 08:00', '2024-03-05 16:05', '2024-03-09 10:00']).tz_localize('America/New_York'))
+        self.assertEqual(calendar[days].strftime('%Y-%m-%d').tolist(), ['2024-03-05', '2024-03-06', '2024-03-11'])
+
+    def test_windows_are_aligned_and_benchmark_relative(self):
+        market = np.full(len(SESSIONS), 0.001)
+        stock = market.copy()
+        stock[300] += 0.05
+        closes = pd.DataFrame({'AAA': prices(stock)['Close'], 'SPY': prices(market)['Close']})
+        stamp = SESSIONS[300].tz_localize(None) + pd.Timedelta(hours=8)
+        study = event_study.event_study(closes, 'SPY', ['AAA'], pd.DatetimeIndex([stamp]), pre=2, post=3,
+                                        model='adjusted')
+        self.assertEqual(study['offsets'].tolist(), [-2, -1, 0, 1, 2, 3])
+        np.testing.assert_allclose(study['car'][0], [0, 0, 0.05, 0.05, 0.05, 0.05], atol=1e-12)
+        self.assertAlmostEqual(study['reaction'][0], 0.05)
+        self.assertAlmostEqual(study['drift'][0], 0.0)
+
+    def test_market_model_removes_beta(self):
+        rng = np.random.default_rng(7)
+        market = rng.normal(0, 0.01, len(SESSIONS))
+        closes = pd.DataFrame({'LEV': prices(2 * market)['Close'], 'SPY': prices(market)['Close']})
+        study = event_study.event_study(closes, 'SPY', ['LEV'], pd.DatetimeIndex([SESSIONS[350].tz_localize(None)]))
+        self.assertAlmostEqual(study['beta'][0], 2.0)
+        np.testing.assert_allclose(study['car'][0], 0, atol=1e-12)
+
+    def test_regression_needs_three_points(self):
+        self.assertIsNone(event_study.regression([1, 2], [1, 2])['slope'])
+        fit = event_study.regression([1, 2, 3, np.nan], [3, 5, 7, 100])
+        self.assertEqual((fit['n'], fit['slope'], fit['intercept'], fit['r2']), (3, 2.0, 1.0, 1.0))
+
+
+class TestEarningsStudy(unittest.IsolatedAsyncioTestCase):
+
+    async def test_symbols_and_peers_share_one_history_fetch(self):
+        market = np.zeros(len(SESSIONS))
+        reaction = {}
+        frames, dates = {'SPY': prices(market)}, {}
+        for symbol, scale in (('AAA', 0.01), ('BBB', 0.02)):
+            days = np.arange(280, 400, 30)
+            surprise = np.array([-5.0, 0.0, 5.0, 10.0])
+            stock = market.copy()
+            stock[days] = scale * surprise
+            reaction[symbol] = scale * surprise * 100
+            frames[symbol] = prices(stock)
+            dates[symbol] = earnings([SESSIONS[d].tz_localize(None) + pd.Timedelta(hours=7) for d in days], surprise)
+        history = mock.AsyncMock(return_value=frames)
+
+        with mock.patch.multiple(
+            'earnings_analysis_route.market_data',
+            get_earnings_dates=mock.AsyncMock(side_effect=lambda s, limit: dates.get(s, pd.DataFrame())),
+            get_history_batch=history,
+        ):
+            result = await build_earnings_study(['AAA', 'BBB', 'CCC'], post=5, model='adjusted')
+
+        history.assert_awaited_once()
+        self.assertEqual(result['errors'], {'CCC': 'No price data found for this symbol.'})
+        by_symbol = {entry['symbol']: entry for entry in result['symbols']}
+        self.assertEqual([e['reactionPct'] for e in by_symbol['BBB']['events']], reaction['BBB'].tolist())
+        self.assertAlmostEqual(by_symbol['AAA']['regression']['slope'], 1.0)
+        self.assertEqual(len(by_symbol['AAA']['carPct']), 4)
+        self.assertEqual(result['pooled']['regression']['n'], 8)
+        self.assertEqual(result['pooled']['drift']['events'][0], 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
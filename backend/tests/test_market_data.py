@@ -0,0 +1,140 @@
+import asyncio
+import tempfile
+import time
+import unittest
+from unittest import mock
+import sys
+import os
+
+# Add the parent directory to the Python path to allow for module imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pandas as pd
+
+import market_data
+from cache_backend import TTLCache, MISSING
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_expired_entries_are_misses(self):
+        cache = TTLCache(maxsize=4, ttl=10)
+        with mock.patch('cache_backend.time.monotonic', return_value=100.0):
+            cache.set('a', 1)
+        with mock.patch('cache_backend.time.monotonic', return_value=105.0):
+            self.assertEqual(cache.get('a'), 1)
+        with mock.patch('cache_backend.time.monotonic', return_value=111.0):
+            self.assertIs(cache.get('a'), MISSING)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIs(cache.get('b'), MISSING)
+        self.assertEqual(cache.get('c'), 3)
+
+
+class TestMarketDataInfo(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        market_data.quote_cache.invalidate()
+        market_data.fundamentals_cache.invalidate()
+
+    async def test_info_is_fetched_once_and_shared_with_fundamentals(self):
+        with mock.patch('market_data.yf.Ticker') as ticker_cls:
+            ticker_cls.return_value.info = {'shortName': 'Apple', 'longName': 'Apple Inc.'}
+            await market_data.get_info('aapl')
+            await market_data.get_info('AAPL')
+            fundamentals = await market_data.get_fundamentals('AAPL ')
+        self.assertEqual(ticker_cls.call_count, 1)
+        self.assertEqual(fundamentals['longName'], 'Apple Inc.')
+
+    async def test_fundamentals_outlive_quotes(self):
+        with mock.patch('market_data.yf.Ticker') as ticker_cls:
+            ticker_cls.return_value.info = {'longName': 'Apple Inc.'}
+            await market_data.get_info('AAPL')
+            market_data.quote_cache.invalidate()
+            await market_data.get_fundamentals('AAPL')
+        self.assertEqual(ticker_cls.call_count, 1)
+
+    async def test_concurrent_misses_share_one_fetch(self):
+        with mock.patch('market_data.yf.Ticker') as ticker_cls:
+            ticker_cls.return_value.info = {'shortName': 'Apple'}
+            results = await asyncio.gather(*(market_data.get_info('AAPL') for _ in range(20)))
+        self.assertEqual(ticker_cls.call_count, 1)
+        self.assertTrue(all(result == {'shortName': 'Apple'} for result in results))
+
+    async def test_refresh_refetches_the_full_quote(self):
+        with mock.patch('market_data.yf.Ticker') as ticker_cls:
+            ticker_cls.return_value.info = {'regularMarketPrice': 1, 'dayHigh': 1}
+            await market_data.get_info('AAPL')
+            ticker_cls.return_value.info = {'regularMarketPrice': 2, 'dayHigh': 2}
+            await market_data.get_info('AAPL', refresh=True, ttl=3600)
+        self.assertEqual(ticker_cls.call_count, 2)
+        with mock.patch('cache_backend.time.monotonic', return_value=time.monotonic() + 600):
+            self.assertEqual(market_data.quote_cache.get('AAPL'), {'regularMarketPrice': 2, 'dayHigh': 2})
+
+
+def bulk_frame(closes_by_symbol):
+    start = pd.Timestamp.now(tz='America/New_York').normalize() - pd.Timedelta(days=2)
+    index = pd.date_range(start, periods=3, freq='D', name='Date')
+    columns = pd.MultiIndex.from_product([list(closes_by_symbol), ['Close']])
+    values = list(zip(*closes_by_symbol.values()))
+    return pd.DataFrame(values, index=index, columns=columns)
+
+
+class TestMarketDataBatch(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        market_data.quote_cache.invalidate()
+        market_data.fundamentals_cache.invalidate()
+        market_data.history_cache.invalidate()
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        patcher = mock.patch.object(market_data.bar_store, 'root', tmpdir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_parse_symbols(self):
+        self.assertEqual(market_data.parse_symbols(' aapl, MSFT,,aapl '), ['AAPL', 'MSFT'])
+        with self.assertRaises(ValueError):
+            market_data.parse_symbols(' , ')
+        with self.assertRaises(ValueError):
+            market_data.parse_symbols(','.join(f'S{i}' for i in range(market_data.MAX_BATCH_SYMBOLS + 1)))
+
+    async def test_history_batch_downloads_only_cache_misses_once(self):
+        with mock.patch('market_data.yf.download', return_value=bulk_frame({'AAPL': [1, 2, 3], 'MSFT': [4, 5, 6]})) as download:
+            frames = await market_data.get_history_batch(['AAPL', 'msft'], period='1y')
+            again = await market_data.get_history_batch(['MSFT', 'AAPL'], period='1y')
+        self.assertEqual(download.call_count, 1)
+        self.assertEqual(list(frames), ['AAPL', 'MSFT'])
+        self.assertEqual(list(again), ['MSFT', 'AAPL'])
+        self.assertEqual(frames['MSFT']['Close'].tolist(), [4, 5, 6])
+
+    async def test_history_batch_marks_missing_symbols_empty(self):
+        with mock.patch('market_data.yf.download', return_value=bulk_frame({'AAPL': [1, 2, 3]})):
+            frames = await market_data.get_history_batch(['AAPL', 'NOPE'], period='1y')
+        self.assertTrue(frames['NOPE'].empty)
+
+    async def test_info_batch_refreshes_prices_of_known_symbols_in_bulk(self):
+        market_data.fundamentals_cache.set(('info', 'AAPL'), {'shortName': 'Apple', 'regularMarketPrice': 1})
+        with mock.patch('market_data.yf.download', return_value=bulk_frame({'AAPL': [1, 2, 3]})) as download, \
+                mock.patch('market_data.yf.Ticker') as ticker_cls:
+            ticker_cls.return_value.info = {'shortName': 'Microsoft'}
+            infos = await market_data.get_info_batch(['AAPL', 'MSFT'])
+        self.assertEqual(download.call_count, 1)
+        self.assertEqual(ticker_cls.call_count, 1)
+        self.assertEqual(infos['AAPL']['regularMarketPrice'], 3.0)
+        self.assertEqual(infos['AAPL']['regularMarketPreviousClose'], 2.0)
+        self.assertEqual(infos['MSFT'], {'shortName': 'Microsoft'})
+        # Only the price is fresh; get_info must not serve the rest as a quote
+        self.assertIs(market_data.quote_cache.get('AAPL'), market_data.MISSING)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import asyncio
+import unittest
+import sys
+import os
+
+from fastapi import FastAPI
+
+# Add the parent directory to the Python path to allow for module imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import metrics
+from metrics import Counter, Histogram, Registry, server_timing
+
+
+async def call(app, path, headers=()):
+    """Minimal ASGI GET; returns (status, headers dict, body)."""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+        'root_path': '', 'headers': list(headers), 'client': ('127.0.0.1', 1), 'server': ('test', 80),
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start = messages[0]
+    body = b''.join(m.get('body', b'') for m in messages[1:])
+    return start['status'], {k.decode(): v.decode() for k, v in start['headers']}, body
+
+
+class TestRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.original = metrics.registry
+        metrics.registry = Registry()
+        self.addCleanup(setattr, metrics, 'registry', self.original)
+
+    def test_histogram_renders_cumulative_buckets(self):
+        latency = Histogram('latency_seconds', 'Latency.', ('route',), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 5):
+            latency.observe(value, route='/a')
+        text = metrics.registry.render()
+        self.assertIn('latency_seconds_bucket{route="/a",le="0.1"} 1', text)
+        self.assertIn('latency_seconds_bucket{route="/a",le="1"} 2', text)
+        self.assertIn('latency_seconds_bucket{route="/a",le="+Inf"} 3', text)
+        self.assertIn('latency_seconds_count{route="/a"} 3', text)
+
+    def test_collectors_and_label_escaping(self):
+        Counter('hits_total', 'Hits.', ('name',)).inc(2, name='a"b')
+        metrics.registry.add_collector(lambda: [('size', 'gauge', 'Size.', [({'cache': 'quote'}, 3)])])
+        text = metrics.registry.render()
+        self.assertIn('hits_total{name="a\\"b"} 2', text)
+        self.assertIn('# TYPE size gauge\nsize{cache="quote"} 3', text)
+
+
+class TestServerTiming(unittest.TestCase):
+
+    def setUp(self):
+        app = FastAPI()
+
+        @app.get('/work')
+        def work():
+            with metrics.stage('yahoo.info'):
+                pass
+            with metrics.stage('transform'):
+                pass
+            return {'ok': True}
+
+        app.add_middleware(metrics.MetricsMiddleware)
+        self.app = app
+
+    def test_header_only_when_asked_for(self):
+        _, headers, _ = asyncio.run(call(self.app, '/work'))
+        self.assertNotIn('server-timing', headers)
+
+        _, headers, _ = asyncio.run(call(self.app, '/work', [(b'x-server-timing', b'1')]))
+        names = [entry.split(';')[0] for entry in headers['server-timing'].split(', ')]
+        self.assertEqual(names, ['yahoo-info', 'transform', 'handler'])
+
+    def test_requests_are_recorded_per_route(self):
+        before = metrics.REQUEST_SECONDS.count(method='GET', route='/work', status=200)
+        asyncio.run(call(self.app, '/work'))
+        self.assertEqual(metrics.REQUEST_SECONDS.count(method='GET', route='/work', status=200), before + 1)
+
+    def test_repeated_stages_are_summed(self):
+        self.assertEqual(server_timing([('a', 0.001), ('a', 0.002)]), 'a;dur=3.0')
+
+
+if __name__ == '__main__':
+    unittest.main()
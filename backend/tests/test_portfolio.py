@@ -0,0 +1,113 @@
+import unittest
+from unittest import mock
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+
+# Add the parent directory to the Python path to allow for module imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import portfolio
+from portfolio_route import build_portfolio, parse_holdings
+
+SESSIONS = pd.bdate_range('2024-01-01', periods=300, tz='America/New_York')
+
+
+def prices(returns, index=SESSIONS):
+    return pd.DataFrame({'Close': 100 * np.cumprod(1 + np.asarray(returns))}, index=index)
+
+
+class TestPortfolioMath(unittest.TestCase):
+
+    def test_closes_align_on_the_calendar_and_carry_over_gaps(self):
+        days = pd.DatetimeIndex(['2024-01-02', '2024-01-03', '2024-01-04', '2024-01-05'], tz='America/New_York')
+        # Midnight in Tokyo is still the previous day in New York
+        other = pd.DatetimeIndex(['2024-01-03', '2024-01-05', '2024-01-06'], tz='Asia/Tokyo')
+        calendar = portfolio.bar_keys([days], daily=True)
+        closes = portfolio.aligned_closes(calendar, [days, other], [np.array([1.0, 2, 3, 4]), np.array([10.0, 11, 12])],
+                                          daily=True)
+        np.testing.assert_array_equal(closes[:, 0], [1, 2, 3, 4])
+        np.testing.assert_array_equal(closes[:, 1], [np.nan, 10, 10, 11])
+
+    def test_pairwise_correlation_and_beta_skip_missing_bars(self):
+        rng = np.random.default_rng(3)
+        market = rng.normal(0, 0.01, 500)
+        returns = np.column_stack([2 * market, -market, market + rng.normal(0, 0.01, 500)])
+        returns[:200, 1] = np.nan
+        corr = portfolio.correlation(returns)
+        self.assertAlmostEqual(corr[0, 1], -1.0)
+        np.testing.assert_allclose(np.diag(corr), 1.0)
+        np.testing.assert_allclose(corr, corr.T)
+        np.testing.assert_allclose(portfolio.betas(returns, market)[:2], [2.0, -1.0])
+
+    def test_drawdown_var_and_risk_contributions(self):
+        returns = np.array([0.1, -0.5, 0.2, 0.1, -0.1])
+        metrics = portfolio.risk_metrics(returns, 252, confidence=0.8)
+        self.assertAlmostEqual(metrics['maxDrawdown'], 0.5)
+        self.assertEqual((metrics['peak'], metrics['trough']), (1, 2))
+        self.assertAlmostEqual(metrics['var'], 0.18)
+        self.assertAlmostEqual(metrics['expectedShortfall'], 0.5)
+
+        rng = np.random.default_rng(5)
+        holdings = rng.normal(0, 0.01, (250, 4))
+        contributions = portfolio.risk_contributions(holdings, np.full(4, 0.25))
+        self.assertAlmostEqual(contributions.sum(), 1.0)
+
+
+class TestParseHoldings(unittest.TestCase):
+
+    def test_weights(self):
+        self.assertEqual(parse_holdings('aapl:2, msft:1,AAPL:1'), {'AAPL': 3.0, 'MSFT': 1.0})
+        self.assertEqual(parse_holdings('AAPL,MSFT'), {'AAPL': 1.0, 'MSFT': 1.0})
+        for raw in ('AAPL:1,MSFT', 'AAPL:x', 'AAPL:-1', 'AAPL:2,MSFT:-1', ':1'):
+            with self.assertRaises(ValueError):
+                parse_holdings(raw)
+
+
+class TestBuildPortfolio(unittest.IsolatedAsyncioTestCase):
+
+    async def test_one_history_fetch_for_all_holdings(self):
+        rng = np.random.default_rng(11)
+        market = rng.normal(0.0005, 0.01, len(SESSIONS))
+        frames = {
+            'SPY': prices(market),
+            'LEV': prices(2 * market),
+            'CASHLIKE': prices(np.zeros(len(SESSIONS))),
+            # Listed halfway through and missing a few sessions
+            'NEW': prices(market[150:], SESSIONS[150:]).drop(SESSIONS[[160, 170]]),
+            'GONE': pd.DataFrame(),
+        }
+        history = mock.AsyncMock(return_value=frames)
+        with mock.patch('portfolio_route.market_data.get_history_batch', history):
+            result = await build_portfolio({'LEV': 1, 'CASHLIKE': 1, 'NEW': 2, 'GONE': 1}, points=50)
+
+        history.assert_awaited_once()
+        self.assertEqual(history.await_args.args[1:], ('5y', '1d'))
+        self.assertEqual(result['errors'], {'GONE': 'No price data found for this symbol.'})
+        by_symbol = {h['symbol']: h for h in result['holdings']}
+        self.assertEqual(by_symbol['NEW']['weight'], 0.5)
+        self.assertEqual(by_symbol['NEW']['observations'], len(SESSIONS) - 151)
+        self.assertAlmostEqual(by_symbol['LEV']['beta'], 2.0)
+        self.assertEqual(by_symbol['CASHLIKE']['beta'], 0.0)
+        self.assertAlmostEqual(sum(h['riskContributionPct'] for h in result['holdings']), 100, places=1)
+        self.assertEqual(result['correlation']['symbols'], ['LEV', 'CASHLIKE', 'NEW'])
+        self.assertGreater(result['correlation']['matrix'][0][2], 0.99)
+        self.assertIsNone(result['correlation']['matrix'][0][1])
+        self.assertEqual(len(result['series']['valuePct']), 50)
+        self.assertEqual(result['observations'], len(SESSIONS) - 1)
+        # LEV and NEW move with the market, CASHLIKE does not
+        self.assertGreater(result['portfolio']['beta'], 0.25)
+        self.assertLess(result['portfolio']['beta'], 2.0)
+
+    async def test_only_zero_weight_holdings_priced_is_a_weight_error(self):
+        frames = {'SPY': prices(np.zeros(len(SESSIONS))), 'CASHLIKE': prices(np.zeros(len(SESSIONS))),
+                  'GONE': pd.DataFrame()}
+        with mock.patch('portfolio_route.market_data.get_history_batch', mock.AsyncMock(return_value=frames)):
+            with self.assertRaisesRegex(ValueError, 'weights'):
+                await build_portfolio({'CASHLIKE': 0, 'GONE': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
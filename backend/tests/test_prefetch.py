@@ -0,0 +1,104 @@
+import unittest
+from unittest import mock
+import tempfile
+import sys
+import os
+
+import pandas as pd
+
+# Add the parent directory to the Python path to allow for module imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import prefetch
+import review_store
+from prefetch import PrefetchScheduler, last_closed_session, market_is_open, next_open
+
+TZ = 'America/New_York'
+# 2026-01-05 is a Monday
+MONDAY_MIDDAY = pd.Timestamp('2026-01-05 12:00', tz=TZ)
+MONDAY_EVENING = pd.Timestamp('2026-01-05 18:00', tz=TZ)
+TUESDAY_NIGHT = pd.Timestamp('2026-01-06 02:00', tz=TZ)
+
+
+class TestMarketClock(unittest.TestCase):
+
+    def test_market_hours(self):
+        self.assertTrue(market_is_open(MONDAY_MIDDAY))
+        self.assertFalse(market_is_open(MONDAY_EVENING))
+        self.assertFalse(market_is_open(pd.Timestamp('2026-01-03 12:00', tz=TZ)))  # Saturday
+
+    def test_next_open_skips_the_weekend(self):
+        friday_evening = pd.Timestamp('2026-01-09 17:00', tz=TZ)
+        self.assertEqual(next_open(friday_evening), pd.Timestamp('2026-01-12 09:30', tz=TZ))
+        self.assertEqual(next_open(TUESDAY_NIGHT), pd.Timestamp('2026-01-06 09:30', tz=TZ))
+
+    def test_last_closed_session(self):
+        self.assertEqual(str(last_closed_session(MONDAY_MIDDAY)), '2026-01-02')  # previous Friday
+        self.assertEqual(str(last_closed_session(MONDAY_EVENING)), '2026-01-05')
+
+
+class TestPrefetchScheduler(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.market_data = mock.patch.multiple(
+            'prefetch.market_data',
+            get_info=mock.AsyncMock(return_value={}),
+            get_history_batch=mock.AsyncMock(return_value={}),
+            get_history=mock.AsyncMock(return_value=pd.DataFrame()),
+            get_earnings_dates=mock.AsyncMock(return_value=pd.DataFrame()),
+            get_fundamentals=mock.AsyncMock(return_value={'longName': 'TestCo'}),
+        )
+        self.market_data.start()
+        self.addCleanup(self.market_data.stop)
+        self.scheduler = PrefetchScheduler(watchlist='AAPL,MSFT', popular=1)
+
+    def test_popular_symbols_join_the_watchlist(self):
+        self.scheduler.note(['TSLA', 'TSLA', 'NVDA'])
+        self.assertEqual(self.scheduler.symbols(), ['AAPL', 'MSFT', 'TSLA'])
+
+    async def test_quotes_refresh_during_market_hours_and_bars_once_per_session(self):
+        await self.scheduler.tick(MONDAY_MIDDAY)
+        prefetch.market_data.get_info.assert_any_await('AAPL', refresh=True, ttl=None)
+        prefetch.market_data.get_info.assert_any_await('MSFT', refresh=True, ttl=None)
+        self.assertEqual(prefetch.market_data.get_history_batch.await_count, len(prefetch.DAILY_PERIODS))
+
+        prefetch.market_data.get_history_batch.reset_mock()
+        await self.scheduler.tick(MONDAY_MIDDAY)
+        prefetch.market_data.get_history_batch.assert_not_awaited()
+
+        # After the close the bars are refreshed and kept until the next open
+        self.scheduler.last_run.clear()
+        await self.scheduler.tick(MONDAY_EVENING)
+        ttl = prefetch.market_data.get_history_batch.await_args.kwargs['ttl']
+        self.assertEqual(ttl, (pd.Timestamp('2026-01-06 09:30', tz=TZ) - MONDAY_EVENING).total_seconds())
+        # Quotes are full ticker.info fetches, kept until the next open too
+        self.assertEqual(prefetch.market_data.get_info.await_args.kwargs, {'refresh': True, 'ttl': ttl})
+
+    async def test_earnings_window_is_fetched_when_a_new_date_appears(self):
+        dates = pd.DataFrame({'EPS Estimate': [1.0]}, index=pd.DatetimeIndex([pd.Timestamp('2025-12-01', tz=TZ)]))
+        prefetch.market_data.get_earnings_dates.return_value = dates
+        await self.scheduler.refresh_earnings(['AAPL'], MONDAY_MIDDAY)
+        await self.scheduler.refresh_earnings(['AAPL'], MONDAY_MIDDAY)
+        prefetch.market_data.get_history.assert_awaited_once_with('AAPL', start='2025-11-16', end='2025-12-16')
+
+    async def test_reviews_are_regenerated_within_the_budget(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        store = review_store.ReviewStore(os.path.join(tmpdir.name, 'reviews.sqlite3'))
+        self.scheduler.review_budget = 3
+        generate = mock.AsyncMock()
+        reviews = tuple((kind, route, generate) for kind, route, _ in prefetch.REVIEWS)
+        with mock.patch.object(review_store, 'store', store), \
+                mock.patch.object(prefetch, 'PREFETCH_REVIEW_SPACING', 0), \
+                mock.patch.object(prefetch, 'REVIEWS', reviews), \
+                mock.patch.object(prefetch.buffett_review_route, 'GEMINI_API_KEY', 'key'), \
+                mock.patch.object(prefetch.munger_review_route, 'GEMINI_API_KEY', 'key'):
+            await self.scheduler.regenerate_reviews(['AAPL', 'MSFT'], TUESDAY_NIGHT)
+            self.assertEqual(generate.await_count, 3)
+            # The budget is per night
+            await self.scheduler.regenerate_reviews(['AAPL', 'MSFT'], TUESDAY_NIGHT)
+            self.assertEqual(generate.await_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
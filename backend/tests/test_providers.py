@@ -0,0 +1,71 @@
+import asyncio
+import threading
+import types
+import unittest
+from unittest import mock
+import sys
+import os
+
+# Add the parent directory to the Python path to allow for module imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import main
+import providers
+from providers import LazyModule
+
+
+class TestLazyModule(unittest.TestCase):
+
+    def setUp(self):
+        self.module = types.ModuleType('fake_provider')
+        self.module.Client = 'real client'
+        patcher = mock.patch.dict(sys.modules, {'fake_provider': self.module})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_imported_and_set_up_once_on_first_use(self):
+        setup = mock.Mock()
+        lazy = LazyModule('fake_provider', setup=setup)
+        self.assertFalse(lazy.status()['loaded'])
+
+        threads = [threading.Thread(target=lambda: lazy.Client) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        setup.assert_called_once_with(self.module)
+        self.assertTrue(lazy.status()['loaded'])
+
+    def test_patches_reach_the_real_module(self):
+        lazy = LazyModule('fake_provider')
+        with mock.patch.object(lazy, 'Client', 'fake client'):
+            self.assertEqual(self.module.Client, 'fake client')
+            self.assertEqual(lazy.Client, 'fake client')
+        self.assertEqual(self.module.Client, 'real client')
+        self.assertEqual(lazy.Client, 'real client')
+
+
+class TestReadiness(unittest.IsolatedAsyncioTestCase):
+
+    async def test_ready_once_the_warm_up_has_loaded_the_providers(self):
+        release = asyncio.Event()
+        warmup = providers.WarmUp()
+
+        async def slow_import(load):
+            await release.wait()
+
+        with mock.patch.object(providers, 'warmup', warmup), \
+                mock.patch.object(providers, 'PROVIDER_WARMUP', True), \
+                mock.patch.object(providers, 'run_market_data', slow_import), \
+                mock.patch.object(providers, 'run_llm', mock.AsyncMock()):
+            warmup.start()
+            await asyncio.sleep(0)
+            self.assertEqual(main.ready().status_code, 503)
+            release.set()
+            await warmup.task
+            self.assertTrue(main.ready()['ready'])
+
+
+if __name__ == '__main__':
+    unittest.main()
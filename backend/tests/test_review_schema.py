@@ -0,0 +1,113 @@
+import json
+import unittest
+from unittest import mock
+import tempfile
+import sys
+import os
+
+# Add the parent directory to the Python path to allow for module imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import munger_review_route
+import review_schema
+import review_store
+from pydantic import ValidationError
+from review_schema import BuffettReview, MungerReview
+
+MUNGER_JSON = json.dumps({
+    'ratings': [{'criterion': 'Integrity', 'explanation': 'Candid letters.', 'rating': 4}],
+    'overallScore': 'Good',
+    'summary': 'A solid team.',
+    'verdict': 'watch',
+})
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class TestValidation(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('review_schema.genai.GenerativeModel')
+        self.model_cls = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_valid_answers_take_the_fast_path(self):
+        review, text = review_schema.validate(MungerReview, MUNGER_JSON, 'models/test')
+        self.assertEqual(review.payload()['verdict'], 'WATCH')
+        self.assertEqual(review.payload()['ratings'][0]['rating'], 4)
+        self.model_cls.assert_not_called()
+
+    def test_buffett_payload_matches_the_markdown_parser_shape(self):
+        review, _ = review_schema.validate(BuffettReview, json.dumps({
+            'recommendation': 'BUY',
+            'sections': [{'title': '### Valuation', 'content': 'Cheap. '}, {'title': 'Moat', 'content': 'Wide.'}],
+        }), 'models/test')
+        self.assertEqual(review.payload(), {'recommendation': 'BUY', 'Valuation': 'Cheap.', 'Moat': 'Wide.'})
+
+    def test_formatting_slips_are_cleaned_up_locally(self):
+        text = 'Here you go:\n```json\n' + MUNGER_JSON[:-1] + ',}\n```'
+        review, cleaned = review_schema.validate(MungerReview, text, 'models/test')
+        self.assertEqual(review.overallScore, 'Good')
+        self.model_cls.assert_not_called()
+
+    def test_invalid_answers_are_left_to_the_repair_step(self):
+        broken = MUNGER_JSON.replace('"rating": 4', '"rating": 9')
+        with self.assertRaises(ValidationError):
+            review_schema.validate(MungerReview, broken, 'models/test')
+        self.model_cls.assert_not_called()
+
+
+class TestRepair(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        patcher = mock.patch('review_schema.genai.GenerativeModel')
+        self.model_cls = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_invalid_answers_get_one_separate_repair_call(self):
+        broken = MUNGER_JSON.replace('"rating": 4', '"rating": 9')
+        generate_content = self.model_cls.return_value.generate_content
+        generate_content.side_effect = [FakeResponse(broken), FakeResponse(MUNGER_JSON)]
+        call = mock.AsyncMock(side_effect=lambda fn, *args: fn(*args))
+        with mock.patch.object(review_schema.upstream.gemini, 'call', call):
+            review, _ = await review_schema.generate('models/test', 'prompt', MungerReview)
+
+        self.assertEqual(review.ratings[0].rating, 4)
+        # Generation and repair are admitted (and retried) as two calls
+        self.assertEqual([c.args[0] for c in call.await_args_list], [review_schema._generate_json, review_schema.repair])
+        self.assertIn('ratings.0.rating', generate_content.call_args.args[0])
+        self.assertEqual(self.model_cls.call_args.args, (review_schema.REPAIR_MODEL_NAME,))
+
+        generate_content.side_effect = [FakeResponse(broken), FakeResponse(broken)]
+        with mock.patch.object(review_schema.upstream.gemini, 'call', call), self.assertRaises(ValueError):
+            await review_schema.generate('models/test', 'prompt', MungerReview)
+        self.assertEqual(generate_content.call_count, 4)
+
+
+class TestStructuredGeneration(unittest.IsolatedAsyncioTestCase):
+
+    async def test_review_is_generated_as_json_and_stored_under_its_version(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        store = review_store.ReviewStore(os.path.join(tmpdir.name, 'reviews.sqlite3'))
+        prompt = munger_review_route.review_prompt('TestCo')
+        with mock.patch.object(review_store, 'store', store), \
+                mock.patch.object(review_schema, 'STRUCTURED_OUTPUT', True), \
+                mock.patch('review_schema.genai.GenerativeModel') as model_cls:
+            model_cls.return_value.generate_content.return_value = FakeResponse(MUNGER_JSON)
+            parsed = await munger_review_route.generate_munger_review('TEST', prompt)
+            config = model_cls.return_value.generate_content.call_args.kwargs['generation_config']
+
+        self.assertEqual(config.response_mime_type, 'application/json')
+        self.assertIs(config.response_schema, MungerReview)
+        self.assertEqual(parsed['verdict'], 'WATCH')
+        cached = store.get(munger_review_route.MODEL_NAME, prompt, version=munger_review_route.PROMPT_VERSION)
+        self.assertEqual(cached['parsed'], parsed)
+        self.assertIsNone(store.get(munger_review_route.MODEL_NAME, prompt, version='old'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+from unittest import mock
+import sqlite3
+import tempfile
+import sys
+import os
+
+# Add the parent directory to the Python path to allow for module imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi import HTTPException
+
+import admin
+import munger_review_route
+from review_store import ReviewStore, date_bucket
+
+
+class TestReviewStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'reviews.sqlite3')
+        self.store = ReviewStore(self.path, bucket_days=7, max_age_hours=24)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_round_trip_survives_a_new_store_instance(self):
+        parsed = {'verdict': 'BUY', 'ratings': []}
+        self.store.put('munger', 'aapl', 'models/test', 'prompt text', 'raw text', parsed)
+
+        reopened = ReviewStore(self.path, bucket_days=7, max_age_hours=24)
+        cached = reopened.get('models/test', 'prompt text')
+
+        self.assertEqual(cached['parsed'], parsed)
+        self.assertEqual(cached['raw_text'], 'raw text')
+        self.assertIsNone(reopened.get('models/other', 'prompt text'))
+        self.assertIsNone(reopened.get('models/test', 'another prompt'))
+
+    def test_stale_entries_are_ignored(self):
+        with mock.patch('review_store.time.time', return_value=1_700_000_000):
+            self.store.put('buffett', 'MSFT', 'models/test', 'p', 'raw', {'a': 'b'})
+        with mock.patch('review_store.time.time', return_value=1_700_000_000 + 25 * 3600):
+            self.assertIsNone(self.store.get('models/test', 'p'))
+            self.assertIsNotNone(self.store.get('models/test', 'p', max_age_hours=48))
+
+    def test_invalidate_by_symbol_and_kind(self):
+        self.store.put('buffett', 'MSFT', 'models/test', 'p1', 'raw', {})
+        self.store.put('munger', 'MSFT', 'models/test', 'p2', 'raw', {})
+        self.store.put('munger', 'AAPL', 'models/test', 'p3', 'raw', {})
+
+        self.assertEqual(self.store.invalidate(symbol='msft', kind='munger'), 1)
+        self.assertIsNotNone(self.store.get('models/test', 'p1'))
+        self.assertIsNone(self.store.get('models/test', 'p2'))
+        self.assertEqual(self.store.invalidate(), 2)
+
+    def test_invalidate_reaches_reviews_stored_under_another_ticker(self):
+        # GOOG stored the review GOOGL is served too; the row only records GOOG
+        self.store.put('munger', 'GOOG', 'models/test', 'Alphabet Inc.', 'raw', {})
+        self.assertEqual(self.store.invalidate(symbol='GOOGL', kind='munger'), 0)
+        self.assertEqual(self.store.invalidate(symbol='GOOGL', kind='munger', prompts=['Alphabet Inc.']), 1)
+        self.assertIsNone(self.store.get('models/test', 'Alphabet Inc.'))
+
+    def test_other_prompt_versions_are_dropped(self):
+        self.store.put('munger', 'MSFT', 'models/test', 'p1', 'raw', {}, version='1')
+        self.store.put('munger', 'MSFT', 'models/test', 'p1', 'raw', {}, version='2')
+        self.store.put('buffett', 'MSFT', 'models/test', 'p2', 'raw', {}, version='1')
+
+        self.assertIsNone(self.store.get('models/test', 'p1'))
+        self.assertEqual(self.store.drop_other_versions('munger', '2'), 1)
+        self.assertIsNone(self.store.get('models/test', 'p1', version='1'))
+        self.assertIsNotNone(self.store.get('models/test', 'p1', version='2'))
+        self.assertIsNotNone(self.store.get('models/test', 'p2', version='1'))
+
+    def test_stores_from_before_versioning_are_migrated(self):
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("CREATE TABLE reviews (key TEXT PRIMARY KEY, kind TEXT NOT NULL, symbol TEXT NOT NULL, "
+                         "model TEXT NOT NULL, prompt_hash TEXT NOT NULL, bucket TEXT NOT NULL, "
+                         "raw_text TEXT NOT NULL, parsed TEXT NOT NULL, created_at REAL NOT NULL)")
+        self.store.put('munger', 'MSFT', 'models/test', 'p', 'raw', {'a': 1}, version='2')
+        self.assertEqual(self.store.get('models/test', 'p', version='2')['parsed'], {'a': 1})
+
+    def test_date_bucket_rolls_over(self):
+        day = 86400
+        self.assertEqual(date_bucket(0, bucket_days=7), date_bucket(6 * day, bucket_days=7))
+        self.assertNotEqual(date_bucket(0, bucket_days=7), date_bucket(7 * day, bucket_days=7))
+
+
+class TestAdminGuard(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(admin, 'ADMIN_TOKEN', 'secret')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_refresh_and_clearing_need_the_admin_token(self):
+        generate = mock.AsyncMock()
+        with mock.patch.object(munger_review_route, 'GEMINI_API_KEY', 'key'), \
+                mock.patch.object(munger_review_route, 'munger_review', generate):
+            response = await munger_review_route.get_munger_review('AAPL', refresh=True, x_admin_token='guess')
+            self.assertEqual(response.status_code, 403)
+            generate.assert_not_awaited()
+            await munger_review_route.get_munger_review('AAPL', refresh=True, x_admin_token='secret')
+            generate.assert_awaited_once_with('AAPL', True)
+
+        with self.assertRaises(HTTPException) as raised:
+            admin.require_admin(None)
+        self.assertEqual(raised.exception.status_code, 403)
+        admin.require_admin('secret')
+        with mock.patch.object(admin, 'ADMIN_TOKEN', ''):
+            # No token configured: the admin endpoints are off
+            with self.assertRaises(HTTPException):
+                admin.require_admin('')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,203 @@
+import asyncio
+import json
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import sys
+import os
+
+# Add the parent directory to the Python path to allow for module imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import buffett_review_route
+import munger_review_route
+import review_store
+import streaming
+from buffett_review_route import SectionStream, parse_llm_response
+from munger_review_route import RatingStream, parse_munger_response
+
+BUFFETT_TEXT = """**Recommendation:** BUY
+
+### Business Model
+Sells phones and services.
+
+### Economic Moat
+Strong brand and ecosystem lock-in.
+
+### Management
+Disciplined capital allocation.
+"""
+
+MUNGER_TEXT = """### Charlie Munger Management Review – TestCo
+
+| Factor | Explanation | Rating |
+| ------ | ----------- | :----: |
+| Integrity | Clear communication. | ★★★★☆ |
+| Capital allocation | Excellent deployment. | ★★★★★ |
+
+**Overall Munger Management Score:** 4.5 ★ – Exceptional
+
+> **Summary:** A great team. **Recommendation:** BUY
+"""
+
+
+def chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class FakeChunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeStreamingModel:
+    """Stands in for genai.GenerativeModel; pauses mid-stream until released."""
+
+    def __init__(self, parts, pause_after):
+        self.parts = parts
+        self.pause_after = pause_after
+        self.release = threading.Event()
+        self.released_in_time = None
+
+    def generate_content(self, prompt, stream=False):
+        assert stream
+        for i, part in enumerate(self.parts):
+            if i == self.pause_after:
+                self.released_in_time = self.release.wait(5)
+            yield FakeChunk(part)
+
+
+def parse_events(raw_events):
+    events = []
+    for raw in raw_events:
+        event_line, data_line = raw.strip().split('\n')
+        events.append((event_line[len('event: '):], json.loads(data_line[len('data: '):])))
+    return events
+
+
+class TestIncrementalParsers(unittest.TestCase):
+
+    def test_section_stream_matches_full_parse(self):
+        for size in (1, 7, 64, len(BUFFETT_TEXT)):
+            parser = SectionStream()
+            sections = []
+            for chunk in chunks(BUFFETT_TEXT, size):
+                sections.extend(parser.feed(chunk))
+            sections.extend(parser.close())
+            self.assertEqual(dict(sections), parse_llm_response(BUFFETT_TEXT))
+
+    def test_section_is_emitted_once_the_next_header_arrives(self):
+        parser = SectionStream()
+        self.assertEqual(parser.feed("**Recommendation:** BUY\n\n### Business Model\nSells"), [('recommendation', 'BUY')])
+        self.assertEqual(parser.feed(" phones.\n\n### Econ"), [])
+        self.assertEqual(parser.feed("omic Moat\n"), [('Business Model', 'Sells phones.')])
+
+    def test_rating_stream_matches_full_parse(self):
+        for size in (1, 5, 50, len(MUNGER_TEXT)):
+            parser = RatingStream()
+            ratings = []
+            for chunk in chunks(MUNGER_TEXT, size):
+                ratings.extend(parser.feed(chunk))
+            self.assertEqual(ratings, parse_munger_response(MUNGER_TEXT)['ratings'])
+
+
+class TestIterateInExecutor(unittest.IsolatedAsyncioTestCase):
+
+    async def test_worker_stops_and_closes_the_stream_after_the_consumer_leaves(self):
+        consumer_left = threading.Event()
+        closed = threading.Event()
+        produced = []
+
+        def stream():
+            try:
+                for i in range(1000):
+                    produced.append(i)
+                    if i == 1:
+                        consumer_left.wait(5)
+                    yield i
+            finally:
+                closed.set()
+
+        items = streaming.iterate_in_executor(stream)
+        self.assertEqual(await items.__anext__(), 0)
+        await items.aclose()
+        consumer_left.set()
+        self.assertTrue(await asyncio.to_thread(closed.wait, 5))
+        self.assertLess(len(produced), 1000)
+
+
+class TestStreamingRoutes(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        store = review_store.ReviewStore(os.path.join(tmpdir.name, 'reviews.sqlite3'))
+        for patcher in (
+            mock.patch.object(review_store, 'store', store),
+            mock.patch('market_data.get_fundamentals', mock.AsyncMock(return_value={'longName': 'TestCo'})),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def collect(self, events, model):
+        collected = []
+        async for raw in events:
+            collected.append(raw)
+            # The first section reached us while the model is still generating
+            model.release.set()
+        return parse_events(collected)
+
+    async def test_buffett_sections_stream_before_generation_finishes(self):
+        parts = chunks(BUFFETT_TEXT, 30)
+        model = FakeStreamingModel(parts, pause_after=len(parts) - 1)
+        with mock.patch('buffett_review_route.genai.GenerativeModel', return_value=model):
+            events = await self.collect(buffett_review_route.buffett_review_events('TEST'), model)
+
+        self.assertTrue(model.released_in_time)
+        self.assertEqual(events[0], ('section', {'title': 'recommendation', 'content': 'BUY'}))
+        self.assertEqual(events[-1], ('done', {'sections': parse_llm_response(BUFFETT_TEXT)}))
+
+        # A second request is answered from the review store without the model
+        with mock.patch('buffett_review_route.genai.GenerativeModel') as model_cls:
+            cached = [e async for e in buffett_review_route.buffett_review_events('TEST')]
+        model_cls.assert_not_called()
+        self.assertEqual(parse_events(cached)[-1], events[-1])
+
+    async def test_munger_rows_stream_before_generation_finishes(self):
+        parts = chunks(MUNGER_TEXT, 40)
+        model = FakeStreamingModel(parts, pause_after=len(parts) - 1)
+        with mock.patch('munger_review_route.genai.GenerativeModel', return_value=model):
+            events = await self.collect(munger_review_route.munger_review_events('TEST'), model)
+
+        self.assertTrue(model.released_in_time)
+        self.assertEqual([name for name, _ in events], ['rating', 'rating', 'done'])
+        self.assertEqual(events[-1][1], parse_munger_response(MUNGER_TEXT))
+
+    async def test_stored_reviews_are_read_off_the_event_loop(self):
+        prompt = buffett_review_route.review_prompt('TestCo')
+        review_store.store.put('buffett', 'TEST', buffett_review_route.MODEL_NAME, prompt, 'raw',
+                               {'recommendation': 'BUY'}, version=buffett_review_route.PROMPT_VERSION)
+        get, threads = review_store.store.get, []
+
+        def recording_get(*args, **kwargs):
+            threads.append(threading.current_thread())
+            return get(*args, **kwargs)
+
+        with mock.patch.object(review_store.store, 'get', recording_get):
+            sections = await buffett_review_route.buffett_review('TEST')
+        self.assertEqual(sections, {'recommendation': 'BUY'})
+        self.assertTrue(threads)
+        self.assertNotIn(threading.current_thread(), threads)
+
+    async def test_upstream_error_becomes_an_error_event(self):
+        model = mock.Mock()
+        model.generate_content.side_effect = RuntimeError('quota exceeded')
+        with mock.patch('munger_review_route.genai.GenerativeModel', return_value=model):
+            events = parse_events([e async for e in munger_review_route.munger_review_events('TEST', refresh=True)])
+        self.assertEqual(events[-1][0], 'error')
+        self.assertEqual(events[-1][1]['details'], 'quota exceeded')
+
+
+if __name__ == '__main__':
+    unittest.main()
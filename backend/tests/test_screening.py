@@ -0,0 +1,147 @@
+import asyncio
+import unittest
+from unittest import mock
+import tempfile
+import sys
+import os
+
+# Add the parent directory to the Python path to allow for module imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import review_store
+import screening_route
+from screening_route import ScreenJob, split_batch_response
+
+
+def munger_answer(symbol, verdict='BUY'):
+    return (
+        f"=== {symbol} ===\n"
+        f"### Charlie Munger Management Review – {symbol} Inc.\n\n"
+        "| Factor | Explanation | Rating |\n"
+        "| ------ | ----------- | :----: |\n"
+        "| Integrity | Candid letters. | ★★★★☆ |\n"
+        "| Capital allocation | Sensible buybacks. | ★★★☆☆ |\n\n"
+        "**Overall Munger Management Score:** 3.5 ★ – Good\n\n"
+        f"> **Summary:** Solid team. **Recommendation:** {verdict}\n"
+    )
+
+
+class TestSplitBatchResponse(unittest.TestCase):
+
+    def test_each_company_block_parses_like_a_single_review(self):
+        answers = split_batch_response(munger_answer('AAPL') + "\n" + munger_answer('brk.b', 'WATCH'))
+        self.assertEqual(sorted(answers), ['AAPL', 'BRK.B'])
+        parsed = screening_route.KINDS['munger'].parse(answers['BRK.B'])
+        self.assertEqual(len(parsed['ratings']), 2)
+        self.assertEqual(parsed['overallScore'], 'Good')
+        self.assertEqual(parsed['verdict'], 'WATCH')
+
+
+class TestScreenJob(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        patches = [
+            mock.patch.object(review_store, 'store', review_store.ReviewStore(os.path.join(tmpdir.name, 'r.sqlite3'))),
+            mock.patch.object(screening_route, 'SCREEN_BATCH_SIZE', 3),
+            mock.patch.object(screening_route.market_data, 'get_fundamentals',
+                              mock.AsyncMock(side_effect=lambda symbol: {'longName': f'{symbol} Inc.'})),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_companies_left_out_of_a_batch_are_retried_alone(self):
+        def answer(generate, model, prompt):
+            listed = [line[2:].split(':')[0] for line in prompt.splitlines() if line.startswith('- ') and ':' in line]
+            # The batch answer drops MSFT; asked on its own, it comes back
+            return ''.join(munger_answer(s) for s in listed if s != 'MSFT' or len(listed) == 1)
+
+        with mock.patch.object(screening_route.upstream.gemini, 'call', mock.AsyncMock(side_effect=answer)) as call:
+            job = ScreenJob('munger', ['AAPL', 'MSFT', 'NVDA', 'TSLA'])
+            await job.run()
+
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(call.await_count, 3)  # [AAPL, MSFT, NVDA], [TSLA], then MSFT alone
+        sources = {r['symbol']: r['source'] for r in job.results.values()}
+        self.assertEqual(sources, {'AAPL': 'batch', 'MSFT': 'single', 'NVDA': 'batch', 'TSLA': 'single'})
+        self.assertEqual(job.describe()['progress']['completed'], 4)
+
+        # A second screen is answered from the review store
+        with mock.patch.object(screening_route.upstream.gemini, 'call', mock.AsyncMock()) as call:
+            again = ScreenJob('munger', ['AAPL', 'MSFT', 'NVDA', 'TSLA'])
+            await again.run()
+        call.assert_not_awaited()
+        self.assertEqual(again.progress()['cached'], 4)
+
+    async def test_a_failed_call_only_fails_its_own_companies(self):
+        def answer(generate, model, prompt):
+            if 'TSLA' in prompt:
+                raise screening_route.upstream.UpstreamError('gemini', 'quota exhausted')
+            return munger_answer('AAPL')
+
+        with mock.patch.object(screening_route.upstream.gemini, 'call', mock.AsyncMock(side_effect=answer)), \
+                mock.patch.object(screening_route, 'SCREEN_BATCH_SIZE', 1):
+            job = ScreenJob('munger', ['AAPL', 'TSLA'])
+            await job.run()
+
+        self.assertEqual(job.results['AAPL']['verdict'], 'BUY')
+        self.assertEqual(job.results['TSLA']['status'], 'error')
+        self.assertIn('quota exhausted', job.results['TSLA']['error'])
+        self.assertEqual(job.progress()['failed'], 1)
+
+    async def test_cancel_stops_a_running_job(self):
+        release = asyncio.Event()
+
+        async def slow_fundamentals(symbol):
+            await release.wait()
+            return {'longName': f'{symbol} Inc.'}
+
+        with mock.patch.object(screening_route, 'jobs', screening_route.ScreenJobs()), \
+                mock.patch.object(screening_route.market_data, 'get_fundamentals', slow_fundamentals):
+            job = screening_route.jobs.start(ScreenJob('munger', ['AAPL']))
+            await asyncio.sleep(0)
+            self.assertEqual((await screening_route.cancel_screen(job.id))['status'], 'cancelled')
+            await asyncio.gather(job.task, return_exceptions=True)
+            self.assertTrue(job.task.cancelled())
+            self.assertEqual((await screening_route.list_screens())['jobs'][0]['status'], 'cancelled')
+
+    async def test_a_cancel_seen_by_one_batch_stops_the_others(self):
+        cancel_requested, release = False, asyncio.Event()
+        prompts, interrupted = [], []
+
+        async def answer(generate, model, prompt):
+            nonlocal cancel_requested
+            prompts.append(prompt)
+            if 'MSFT' in prompt:
+                try:
+                    # Still generating (or retrying) when the cancel comes in
+                    await release.wait()
+                except asyncio.CancelledError:
+                    interrupted.append('MSFT')
+                    raise
+                return ''
+            cancel_requested = True
+            return munger_answer('AAPL')
+
+        board = mock.Mock(publish=mock.AsyncMock(),
+                          cancel_requested=mock.AsyncMock(side_effect=lambda job_id: cancel_requested))
+        with mock.patch.object(screening_route.upstream.gemini, 'call', mock.AsyncMock(side_effect=answer)), \
+                mock.patch.object(screening_route, 'SCREEN_BATCH_SIZE', 1), \
+                mock.patch.object(screening_route, 'SCREEN_CONCURRENCY', 2):
+            job = ScreenJob('munger', ['MSFT', 'AAPL', 'NVDA', 'TSLA'])
+            job.board = board
+            with self.assertRaises(asyncio.CancelledError):
+                await job.run()
+            release.set()
+            await asyncio.sleep(0.01)
+
+        self.assertEqual(job.status, 'cancelled')
+        self.assertEqual(interrupted, ['MSFT'])
+        # NVDA and TSLA were never asked for
+        self.assertEqual(len(prompts), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
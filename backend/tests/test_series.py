@@ -0,0 +1,116 @@
+import unittest
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+
+# Add the parent directory to the Python path to allow for module imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import series
+from earnings_analysis_route import earnings_window_prices
+from price_history_route import build_chart, pack_chart
+
+
+def make_hist(closes, start='2024-01-01'):
+    index = pd.date_range(start, periods=len(closes), freq='D', tz='America/New_York', name='Date')
+    return pd.DataFrame({'Close': closes}, index=index)
+
+
+class TestSeriesTransforms(unittest.TestCase):
+
+    def test_percent_mode_skips_leading_gaps(self):
+        values = np.array([np.nan, 100.0, 110.0, np.nan, 90.0])
+        self.assertEqual(
+            series.json_values(series.percent_from_first(values)),
+            [None, 0.0, 10.000000000000009, None, -9.999999999999998],
+        )
+
+    def test_drawdown_and_log_returns(self):
+        values = np.array([100.0, 120.0, 90.0, 130.0])
+        np.testing.assert_allclose(series.drawdown(values), [0, 0, -25, 0])
+        np.testing.assert_allclose(series.log_returns(values)[1:], np.log([1.2, 0.75, 130 / 90]))
+        self.assertTrue(np.isnan(series.log_returns(values)[0]))
+
+    def test_rolling_indicators(self):
+        values = np.arange(1.0, 11.0)
+        sma = series.moving_average(values, 3)
+        self.assertTrue(np.isnan(sma[:2]).all())
+        np.testing.assert_allclose(sma[2:], np.arange(2.0, 10.0))
+        vol = series.rolling_volatility(values, 5, periods_per_year=252)
+        self.assertTrue(np.isnan(vol[:5]).all())
+        self.assertTrue((vol[5:] > 0).all())
+
+    def test_lttb_keeps_endpoints_and_extremes(self):
+        x = np.arange(1000, dtype=float)
+        y = np.sin(x / 50)
+        y[500] = 10.0
+        keep = series.lttb_indices(x, y, 100)
+        self.assertEqual(len(keep), 100)
+        self.assertEqual((keep[0], keep[-1]), (0, 999))
+        self.assertIn(500, keep)
+        self.assertTrue((np.diff(keep) > 0).all())
+
+    def test_lttb_skips_gaps_and_small_inputs(self):
+        y = np.array([1.0, np.nan, 3.0, 4.0])
+        self.assertEqual(series.lttb_indices(np.arange(4), y, 10).tolist(), [0, 2, 3])
+
+    def test_parse_indicators(self):
+        self.assertEqual(series.parse_indicators('SMA50, vol20,sma50'), ['sma50', 'vol20'])
+        self.assertEqual(series.parse_indicators(None), [])
+        for bad in ('rsi14', 'sma1', 'sma5000'):
+            with self.assertRaises(ValueError):
+                series.parse_indicators(bad)
+
+
+class TestRouteTransforms(unittest.TestCase):
+
+    def test_build_chart_matches_record_format(self):
+        hist = make_hist([10.0, np.nan, 12.5])
+        chart = build_chart(hist, 'percent', ['sma2'])
+        self.assertEqual(chart['series'], [
+            {'timestamp': '2024-01-01 00:00:00-05:00', 'value': 0.0},
+            {'timestamp': '2024-01-02 00:00:00-05:00', 'value': None},
+            {'timestamp': '2024-01-03 00:00:00-05:00', 'value': 25.0},
+        ])
+        self.assertEqual(len(chart['indicators']['sma2']), 3)
+
+    def test_columnar_chart_with_downsampling(self):
+        hist = make_hist(np.linspace(1.0, 2.0, 50))
+        chart = build_chart(hist, 'price', ['sma5'], format='columnar', points=10)
+        self.assertEqual(chart['format'], 'columnar')
+        self.assertEqual(len(chart['timestamps']), 10)
+        self.assertEqual(len(chart['values']), 10)
+        self.assertEqual(len(chart['indicators']['sma5']), 10)
+        self.assertEqual(chart['timestamps'][0], int(hist.index[0].timestamp() * 1000))
+        self.assertEqual(chart['values'][-1], 2.0)
+
+    def test_binary_chart_layout(self):
+        hist = make_hist([1.0, 2.0, np.nan])
+        response = pack_chart(hist, 'price', ['drawdown'])
+        self.assertEqual(response.headers['x-series-columns'], 'timestamps,values,drawdown')
+        body = np.frombuffer(response.body, dtype='<f8')
+        self.assertEqual(len(body), 9)
+        timestamps = np.frombuffer(response.body[:24], dtype='<i8')
+        self.assertEqual(timestamps.tolist(), series.epoch_ms(hist.index).tolist())
+        self.assertEqual(body[3:5].tolist(), [1.0, 2.0])
+        self.assertTrue(np.isnan(body[5]))
+
+    def test_earnings_window_matches_running_sum_of_daily_changes(self):
+        closes = [100.0, 102.0, 99.0, 105.0]
+        prices = earnings_window_prices(make_hist(closes))
+
+        # Reference: the original row-by-row computation
+        expected, cum = [], 0
+        for i, close in enumerate(closes):
+            pct = (close - closes[0]) / closes[0] * 100
+            cum = pct if i == 0 else cum + (close - closes[i - 1]) / closes[i - 1] * 100
+            expected.append((round(close, 2), round(pct, 2), round(cum, 2)))
+
+        self.assertEqual([(p['close'], p['pctChange'], p['cumPctChange']) for p in prices], expected)
+        self.assertEqual(prices[0]['date'], '2024-01-01')
+
+
+if __name__ == '__main__':
+    unittest.main()
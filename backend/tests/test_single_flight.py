@@ -0,0 +1,74 @@
+import asyncio
+import unittest
+import sys
+import os
+
+# Add the parent directory to the Python path to allow for module imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from single_flight import SingleFlight
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+
+    async def test_concurrent_callers_share_one_execution(self):
+        flight = SingleFlight('test')
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {'price': 1.0}
+
+        results = await asyncio.gather(*(flight.do('AAPL', fetch) for _ in range(10)))
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'price': 1.0}] * 10)
+        stats = flight.stats()
+        self.assertEqual(stats['executions'], 1)
+        self.assertEqual(stats['coalesced'], 9)
+        self.assertEqual(stats['maxWaiters'], 9)
+        self.assertEqual(stats['inFlight'], 0)
+        self.assertEqual(stats['waiting'], 0)
+
+    async def test_waiters_share_the_leader_error(self):
+        flight = SingleFlight('test')
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            raise ValueError('throttled')
+
+        results = await asyncio.gather(*(flight.do('AAPL', fetch) for _ in range(4)), return_exceptions=True)
+
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(isinstance(r, ValueError) and str(r) == 'throttled' for r in results))
+
+    async def test_cancelled_leader_does_not_cancel_waiters(self):
+        flight = SingleFlight('test')
+
+        async def fetch():
+            await asyncio.sleep(0.01)
+            return 42
+
+        leader = asyncio.ensure_future(flight.do('k', fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flight.do('k', fetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        self.assertEqual(await waiter, 42)
+
+    async def test_next_call_after_completion_runs_again(self):
+        flight = SingleFlight('test')
+
+        async def value(v):
+            return v
+
+        self.assertEqual(await flight.do('k', lambda: value(1)), 1)
+        await asyncio.sleep(0)
+        self.assertEqual(await flight.do('k', lambda: value(2)), 2)
+        self.assertEqual(flight.stats()['executions'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import unittest
+from unittest import mock
+import sys
+import os
+
+import pandas as pd
+
+# Add the parent directory to the Python path to allow for module imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import earnings_analysis_route
+import main
+import market_data
+import upstream
+
+INFO = {'shortName': 'Apple Inc.', 'longName': 'Apple Inc.', 'regularMarketPrice': 110.0,
+        'regularMarketPreviousClose': 100.0, 'marketCap': 3e12, 'sector': 'Technology'}
+HISTORY = pd.DataFrame({'Close': [100.0, 105.0, 110.0]},
+                       index=pd.date_range('2026-01-05', periods=3, tz='America/New_York'))
+
+
+def reject_constant(name):
+    raise ValueError(f'{name} is not valid JSON')
+
+
+def parse_event(raw):
+    """Parse like the browser's JSON.parse, which rejects NaN and Infinity."""
+    event, data = raw.strip().split('\n')
+    return event[len('event: '):], json.loads(data[len('data: '):], parse_constant=reject_constant)
+
+
+class TestSnapshot(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.review_started = asyncio.Event()
+        self.finish_review = asyncio.Event()
+
+        async def slow_review(symbol, refresh=False, info=None):
+            self.review_started.set()
+            await self.finish_review.wait()
+            return {'Moat': 'Wide'}
+
+        patches = [
+            mock.patch.multiple(
+                'main.market_data',
+                get_info=mock.AsyncMock(return_value=INFO),
+                get_history=mock.AsyncMock(return_value=HISTORY),
+            ),
+            mock.patch('main.build_earnings_analysis',
+                       mock.AsyncMock(side_effect=market_data.NoData('No earnings data found for this symbol.'))),
+            mock.patch.object(main.buffett_review_route, 'GEMINI_API_KEY', 'key'),
+            mock.patch.object(main.buffett_review_route, 'buffett_review', slow_review),
+            mock.patch.object(main.munger_review_route, 'GEMINI_API_KEY', 'key'),
+            mock.patch.object(main.munger_review_route, 'munger_review', mock.AsyncMock(
+                side_effect=upstream.UpstreamUnavailable('gemini', 'circuit open', retry_after=12.5))),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_fast_panels_arrive_before_the_reviews(self):
+        events = main.snapshot_events('AAPL', list(main.SNAPSHOT_PANELS), format='columnar')
+        received = {}
+        while len(received) < 4:
+            name, payload = parse_event(await events.__anext__())
+            received[name] = payload
+        self.assertTrue(self.review_started.is_set())
+        self.assertNotIn('buffett', received)
+
+        self.finish_review.set()
+        name, payload = parse_event(await events.__anext__())
+        self.assertEqual((name, payload), ('buffett', {'status': 200, 'data': {'sections': {'Moat': 'Wide'}}}))
+        name, payload = parse_event(await events.__anext__())
+        self.assertEqual(name, 'done')
+
+        self.assertEqual(received['summary']['data']['marketCap'], '$3.0 T')
+        self.assertEqual(received['chart']['data']['header']['change'], 10.0)
+        self.assertEqual(received['chart']['data']['chart']['values'], [100.0, 105.0, 110.0])
+        self.assertEqual(received['earnings'], {'status': 404, 'error': 'No earnings data found for this symbol.'})
+        self.assertEqual(received['munger']['status'], 503)
+        self.assertEqual(received['munger']['retryAfter'], 13)
+        # One quote lookup shared by every panel
+        main.market_data.get_info.assert_awaited_once_with('AAPL')
+
+    async def test_only_the_requested_panels_run(self):
+        events = [parse_event(e) async for e in main.snapshot_events('AAPL', ['summary'])]
+        self.assertEqual([name for name, _ in events], ['summary', 'done'])
+        self.assertFalse(self.review_started.is_set())
+        main.market_data.get_history.assert_not_awaited()
+
+    async def test_upcoming_earnings_without_eps_stream_as_null(self):
+        dates = pd.DataFrame({'EPS Estimate': [1.5], 'EPS Actual': [float('nan')]},
+                             index=pd.DatetimeIndex([HISTORY.index[1]]))
+        with mock.patch('main.build_earnings_analysis', earnings_analysis_route.build_earnings_analysis), \
+                mock.patch.object(main.market_data, 'get_earnings_dates', mock.AsyncMock(return_value=dates)):
+            events = dict([parse_event(e) async for e in main.snapshot_events('AAPL', ['earnings'])])
+        earnings = events['earnings']['data']
+        self.assertEqual(events['earnings']['status'], 200)
+        self.assertEqual(earnings['expectedEPS'], 1.5)
+        self.assertIsNone(earnings['actualEPS'])
+        self.assertIsNone(earnings['surprise'])
+
+
+if __name__ == '__main__':
+    unittest.main()
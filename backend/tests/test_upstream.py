@@ -0,0 +1,143 @@
+import asyncio
+import unittest
+from unittest import mock
+import sys
+import os
+
+# Add the parent directory to the Python path to allow for module imports
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import market_data
+import upstream
+from upstream import CircuitBreaker, Provider, RetryBudget, TokenBucket, UpstreamError, UpstreamUnavailable
+
+
+class YFRateLimitError(Exception):
+    """Same name as yfinance's rate limit error, which is all is_transient looks at."""
+
+
+async def run_inline(fn, *args, **kwargs):
+    return fn(*args, **kwargs)
+
+
+def make_provider(**overrides):
+    settings = dict(rate=1000, burst=1000, max_wait=1, failure_threshold=3, reset_timeout=60,
+                    max_retries=2, budget=RetryBudget(ratio=0.1, minimum=10))
+    settings.update(overrides)
+    return Provider('test', run_inline, **settings)
+
+
+class TestLimits(unittest.TestCase):
+
+    def test_token_bucket_queues_then_refuses(self):
+        bucket = TokenBucket(rate=10, burst=2)
+        self.assertEqual(bucket.reserve(max_wait=1), 0)
+        self.assertEqual(bucket.reserve(max_wait=1), 0)
+        self.assertAlmostEqual(bucket.reserve(max_wait=1), 0.1, places=2)
+        self.assertIsNone(bucket.reserve(max_wait=0.05))
+
+    def test_retry_budget_is_a_fraction_of_recent_calls(self):
+        budget = RetryBudget(ratio=0.5, minimum=1)
+        for _ in range(4):
+            budget.record_call()
+        self.assertEqual([budget.try_spend() for _ in range(4)], [True, True, True, False])
+
+    def test_transient_errors_are_recognised_by_name(self):
+        self.assertTrue(upstream.is_transient(YFRateLimitError()))
+        self.assertTrue(upstream.is_transient(TimeoutError()))
+        self.assertFalse(upstream.is_transient(KeyError('shortName')))
+
+
+class TestProvider(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(upstream, 'UPSTREAM_RETRY_BASE', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_transient_errors_are_retried(self):
+        provider = make_provider()
+        fn = mock.Mock(side_effect=[YFRateLimitError('slow down'), 'ok'])
+        self.assertEqual(await provider.call(fn), 'ok')
+        self.assertEqual(provider.retries, 1)
+        self.assertEqual(provider.breaker.state, CircuitBreaker.CLOSED)
+
+    async def test_other_errors_are_raised_unchanged(self):
+        provider = make_provider()
+        with self.assertRaises(KeyError):
+            await provider.call(mock.Mock(side_effect=KeyError('shortName')))
+        self.assertEqual(provider.retries, 0)
+
+    async def test_breaker_opens_and_fails_fast_then_probes(self):
+        provider = make_provider(max_retries=0, failure_threshold=2)
+        failing = mock.Mock(side_effect=YFRateLimitError('slow down'))
+        for _ in range(2):
+            with self.assertRaises(UpstreamError):
+                await provider.call(failing)
+        with self.assertRaises(UpstreamUnavailable):
+            await provider.call(failing)
+        self.assertEqual(failing.call_count, 2)
+
+        provider.breaker.opened_at -= provider.breaker.reset_timeout
+        self.assertEqual(await provider.call(mock.Mock(return_value='ok')), 'ok')
+        self.assertEqual(provider.breaker.state, CircuitBreaker.CLOSED)
+
+    async def test_half_open_lets_one_probe_through(self):
+        provider = make_provider(max_retries=0, failure_threshold=1)
+        with self.assertRaises(UpstreamError):
+            await provider.call(mock.Mock(side_effect=YFRateLimitError()))
+        provider.breaker.opened_at -= provider.breaker.reset_timeout
+        release = asyncio.Event()
+
+        async def slow_run(fn):
+            await release.wait()
+            return fn()
+
+        provider.run = slow_run
+        probe = asyncio.ensure_future(provider.call(lambda: 'ok'))
+        await asyncio.sleep(0)
+        with self.assertRaises(UpstreamUnavailable):
+            await provider.call(lambda: 'ok')
+        release.set()
+        self.assertEqual(await probe, 'ok')
+
+    async def test_fan_out_queues_for_tokens_instead_of_refusing(self):
+        provider = make_provider(rate=200, burst=1, max_wait=0.001)
+        calls = [lambda: provider.call(lambda: 'ok') for _ in range(8)]
+        refused = await asyncio.gather(*(call() for call in calls), return_exceptions=True)
+        self.assertTrue(any(isinstance(r, UpstreamUnavailable) for r in refused))
+
+        provider = make_provider(rate=200, burst=1, max_wait=0.001)
+        self.assertEqual(await upstream.fan_out(provider, calls), ['ok'] * 8)
+        # Interactive calls outside the fan-out keep their own max_wait
+        self.assertFalse(upstream._queue_for_token.get())
+
+
+class TestStaleFallback(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        market_data.quote_cache.invalidate()
+        market_data.fundamentals_cache.invalidate()
+
+    async def test_stale_quote_is_served_and_flagged_when_upstream_is_down(self):
+        market_data.quote_cache.set('AAPL', {'shortName': 'Apple'}, ttl=-1)
+        sources = set()
+        token = upstream._stale_sources.set(sources)
+        try:
+            with mock.patch.object(upstream.yahoo, 'call',
+                                   mock.AsyncMock(side_effect=UpstreamUnavailable('yahoo', 'circuit open'))):
+                info = await market_data.get_info('AAPL')
+        finally:
+            upstream._stale_sources.reset(token)
+        self.assertEqual(info, {'shortName': 'Apple'})
+        self.assertEqual(sources, {'quote'})
+
+    async def test_failure_without_cached_data_is_raised(self):
+        with mock.patch.object(upstream.yahoo, 'call',
+                               mock.AsyncMock(side_effect=UpstreamUnavailable('yahoo', 'circuit open'))):
+            with self.assertRaises(UpstreamUnavailable):
+                await market_data.get_info('MSFT')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,414 @@
+"""Guarded access to the upstream providers (Yahoo Finance and Gemini).
+
+Every blocking upstream call goes through a ``Provider``, which combines:
+
+* a token bucket, so bursts are smoothed out instead of getting throttled;
+  callers that would have to queue longer than ``max_wait`` are refused,
+  except the calls of a ``fan_out`` (batch and background work), which run
+  a bounded number at a time and queue instead;
+* jittered exponential retries for transient errors, limited per call and
+  by a retry budget shared by all providers, so retries can never multiply
+  the load on a struggling upstream;
+* a circuit breaker that opens after ``failure_threshold`` consecutive
+  transient failures and fails fast until ``reset_timeout`` has passed, then
+  lets a single probe call through.
+
+Refused and failed calls raise ``UpstreamError``; ``market_data`` answers
+those from stale cache entries where it can and records that in the
+``X-Stale-Data`` response header via ``StalenessMiddleware``.
+"""
+import asyncio
+import contextvars
+import math
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+from fastapi.responses import JSONResponse
+
+import metrics
+from executors import run_llm, run_market_data
+from settings import env_number
+
+# Exception class names (anywhere in the MRO) that mean "try again later".
+# Matched by name so yfinance, requests/curl_cffi and google-api-core errors
+# are recognised without importing each library here.
+TRANSIENT_ERRORS = {
+    "YFRateLimitError",
+    "ConnectionError",
+    "Timeout",
+    "TimeoutError",
+    "ReadTimeout",
+    "TooManyRequests",
+    "ResourceExhausted",
+    "ServiceUnavailable",
+    "DeadlineExceeded",
+    "InternalServerError",
+}
+
+
+def is_transient(error):
+    return any(cls.__name__ in TRANSIENT_ERRORS for cls in type(error).__mro__)
+
+
+class UpstreamError(Exception):
+    """An upstream call failed after retries, or was refused locally."""
+
+    def __init__(self, provider, message, retry_after=None):
+        super().__init__(f"{provider}: {message}")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class UpstreamUnavailable(UpstreamError):
+    """Refused without calling the upstream (circuit open or rate limit queue full)."""
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait):
+        """Take a token, returning how long to wait before using it.
+
+        Returns None (and takes nothing) if the wait would exceed ``max_wait``.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+
+class RetryBudget:
+    """Allow retries only up to ``ratio`` of the calls made in the last ``window`` seconds."""
+
+    def __init__(self, ratio, minimum, window=10.0):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.window = window
+        self.exhausted = 0
+        self._calls = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        for events in (self._calls, self._retries):
+            while events and events[0] <= now - self.window:
+                events.popleft()
+
+    def record_call(self):
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            self._calls.append(now)
+
+    def try_spend(self):
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            if len(self._retries) >= self.minimum + self.ratio * len(self._calls):
+                self.exhausted += 1
+                return False
+            self._retries.append(now)
+            return True
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go out now; in half-open state only one probe may."""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def retry_after(self):
+        return max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+    def release_probe(self):
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.state, self.failures, self._probing = self.CLOSED, 0, False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                self.state, self.opened_at = self.OPEN, time.monotonic()
+
+
+UPSTREAM_MAX_RETRIES = int(env_number("UPSTREAM_MAX_RETRIES", 2))
+UPSTREAM_RETRY_BASE = env_number("UPSTREAM_RETRY_BASE", 0.25)
+UPSTREAM_RETRY_CAP = env_number("UPSTREAM_RETRY_CAP", 4)
+UPSTREAM_RETRY_BUDGET_RATIO = env_number("UPSTREAM_RETRY_BUDGET_RATIO", 0.1)
+UPSTREAM_RETRY_BUDGET_MIN = env_number("UPSTREAM_RETRY_BUDGET_MIN", 3)
+
+retry_budget = RetryBudget(UPSTREAM_RETRY_BUDGET_RATIO, UPSTREAM_RETRY_BUDGET_MIN)
+
+
+# Set inside fan_out: admission queues for a token rather than refusing.
+_queue_for_token = contextvars.ContextVar("queue_for_token", default=False)
+
+
+class Provider:
+    def __init__(self, name, run, rate, burst, max_wait, failure_threshold, reset_timeout,
+                 max_retries=UPSTREAM_MAX_RETRIES, budget=retry_budget):
+        self.name = name
+        self.run = run
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.budget = budget
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.rejected = 0
+
+    async def _admit(self):
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise UpstreamUnavailable(self.name, "circuit open", self.breaker.retry_after())
+        wait = self.bucket.reserve(math.inf if _queue_for_token.get() else self.max_wait)
+        if wait is None:
+            self.rejected += 1
+            self.breaker.release_probe()
+            raise UpstreamUnavailable(self.name, "rate limit queue full", self.max_wait)
+        if wait:
+            try:
+                await asyncio.sleep(wait)
+            except BaseException:
+                self.breaker.release_probe()
+                raise
+        self.calls += 1
+        self.budget.record_call()
+
+    @property
+    def fan_out_limit(self):
+        """Concurrent fan-out calls that still leave interactive callers at
+        most half of ``max_wait`` in the queue."""
+        return max(1, int(self.bucket.burst + self.bucket.rate * self.max_wait / 2))
+
+    def _backoff(self, attempt):
+        # Full jitter: spreads out the retries of callers that failed together.
+        return random.uniform(0, min(UPSTREAM_RETRY_CAP, UPSTREAM_RETRY_BASE * 2 ** attempt))
+
+    def _failed(self, error):
+        if is_transient(error):
+            self.failures += 1
+            self.breaker.record_failure()
+        else:
+            # The upstream answered; the request itself was bad.
+            self.breaker.record_success()
+
+    async def call(self, fn, *args, **kwargs):
+        """Run blocking ``fn`` on this provider's executor under the limits above."""
+        attempt = 0
+        while True:
+            await self._admit()
+            try:
+                with metrics.UPSTREAM_IN_FLIGHT.track(provider=self.name):
+                    result = await self.run(fn, *args, **kwargs)
+            except Exception as e:
+                self._failed(e)
+                if not is_transient(e):
+                    raise
+                if attempt >= self.max_retries or not self.budget.try_spend():
+                    raise UpstreamError(self.name, str(e)) from e
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            except BaseException:
+                # Cancelled mid-call: the outcome is unknown, so free the probe slot.
+                self.breaker.release_probe()
+                raise
+            self.breaker.record_success()
+            return result
+
+    @asynccontextmanager
+    async def guard(self):
+        """Admission and health tracking for calls that can't be retried, like streams."""
+        await self._admit()
+        try:
+            with metrics.UPSTREAM_IN_FLIGHT.track(provider=self.name):
+                yield
+        except Exception as e:
+            self._failed(e)
+            if is_transient(e):
+                raise UpstreamError(self.name, str(e)) from e
+            raise
+        except BaseException:
+            self.breaker.release_probe()
+            raise
+        self.breaker.record_success()
+
+    def stats(self):
+        return {
+            "circuit": self.breaker.state,
+            "trips": self.breaker.trips,
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "rejected": self.rejected,
+        }
+
+
+async def fan_out(provider, calls, limit=None):
+    """Await ``calls`` (zero-argument coroutine functions) that each hit
+    ``provider``, at most ``limit`` at a time.
+
+    The calls queue on the rate limiter instead of being refused, so a cold
+    batch is spread out rather than failing once the queue is full. Results
+    come back in order with exceptions in place, like
+    ``gather(..., return_exceptions=True)``.
+    """
+    semaphore = asyncio.Semaphore(limit or provider.fan_out_limit)
+
+    async def run(call):
+        async with semaphore:
+            # Each gather task has its own context copy, so this stays local to it
+            _queue_for_token.set(True)
+            return await call()
+
+    return await asyncio.gather(*(run(call) for call in calls), return_exceptions=True)
+
+
+# Rate limits are per host. Every worker process gets an equal share
+# (WEB_CONCURRENCY is the worker count uvicorn and serve.py use).
+UPSTREAM_WORKERS = max(1, int(env_number("WEB_CONCURRENCY", 1)))
+
+
+def _share(value):
+    return value / UPSTREAM_WORKERS
+
+
+yahoo = Provider(
+    "yahoo", run_market_data,
+    rate=_share(env_number("YAHOO_RATE_LIMIT", 8)),
+    burst=max(1, _share(env_number("YAHOO_BURST", 16))),
+    max_wait=env_number("YAHOO_MAX_WAIT", 5),
+    failure_threshold=int(env_number("YAHOO_BREAKER_FAILURES", 5)),
+    reset_timeout=env_number("YAHOO_BREAKER_RESET", 30),
+)
+gemini = Provider(
+    "gemini", run_llm,
+    rate=_share(env_number("GEMINI_RATE_LIMIT", 0.5)),
+    burst=max(1, _share(env_number("GEMINI_BURST", 4))),
+    max_wait=env_number("GEMINI_MAX_WAIT", 30),
+    failure_threshold=int(env_number("GEMINI_BREAKER_FAILURES", 3)),
+    reset_timeout=env_number("GEMINI_BREAKER_RESET", 60),
+)
+
+
+def stats():
+    return {
+        "yahoo": yahoo.stats(),
+        "gemini": gemini.stats(),
+        "retryBudgetExhausted": retry_budget.exhausted,
+    }
+
+
+def _collect_metrics():
+    providers = (yahoo, gemini)
+    for field in ("calls", "retries", "failures", "rejected"):
+        yield (f"trady_upstream_{field}_total", "counter", f"Upstream {field} per provider.",
+               [({"provider": p.name}, getattr(p, field)) for p in providers])
+    yield ("trady_upstream_circuit_open", "gauge", "1 while the provider's circuit breaker is not closed.",
+           [({"provider": p.name}, int(p.breaker.state != CircuitBreaker.CLOSED)) for p in providers])
+    yield ("trady_upstream_retry_budget_exhausted_total", "counter", "Retries refused by the retry budget.",
+           [({}, retry_budget.exhausted)])
+
+
+metrics.registry.add_collector(_collect_metrics)
+
+_stale_sources = contextvars.ContextVar("stale_sources", default=None)
+
+
+def mark_stale(source):
+    """Record that this request was answered with stale ``source`` data."""
+    sources = _stale_sources.get()
+    if sources is not None:
+        sources.add(source)
+
+
+@contextmanager
+def collect_stale():
+    """Collect the stale sources used inside the block into the yielded set.
+
+    For streamed responses, whose headers go out before the data is fetched.
+    """
+    sources = set()
+    token = _stale_sources.set(sources)
+    try:
+        yield sources
+    finally:
+        _stale_sources.reset(token)
+
+
+def unavailable_response(error):
+    headers = {"Retry-After": str(max(1, math.ceil(error.retry_after or 1)))}
+    return JSONResponse(
+        status_code=503,
+        content={"error": "Upstream data provider is unavailable, try again later.", "details": str(error)},
+        headers=headers,
+    )
+
+
+class StalenessMiddleware:
+    """ASGI middleware adding ``X-Stale-Data: <sources>`` when stale data was served."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        # A mutable set, so tasks spawned by the handler (gather) share it.
+        sources = set()
+        token = _stale_sources.set(sources)
+
+        async def send_with_flag(message):
+            if message["type"] == "http.response.start" and sources:
+                headers = list(message.get("headers", []))
+                headers.append((b"x-stale-data", ",".join(sorted(sources)).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_flag)
+        finally:
+            _stale_sources.reset(token)
@@ -1,4 +1,5 @@
-import React, { useState, useEffect } from 'react';
+import React from 'react';
+import type { PanelState } from '../hooks/useSnapshot';
 
 interface BuffettReviewData {
   sections: Record<string, string>;
@@ -29,34 +30,8 @@ const SectionContent: React.FC<{ content: string }> = ({ content }) => {
 };
 
 
-const BuffettReview: React.FC<{ symbol: string }> = ({ symbol }) => {
-  const [data, setData] = useState<BuffettReviewData | null>(null);
-  const [loading, setLoading] = useState<boolean>(true);
-  const [error, setError] = useState<string | null>(null);
-
-  useEffect(() => {
-    if (!symbol) return;
-
-    const fetchReview = async () => {
-      setLoading(true);
-      setError(null);
-      try {
-        const response = await fetch(`http://localhost:8000/api/buffett-review?symbol=${symbol}`);
-        if (!response.ok) {
-          const errData = await response.json();
-          throw new Error(errData.detail || 'Failed to fetch review');
-        }
-        const result = await response.json();
-        setData(result);
-      } catch (err) {
-        setError(err instanceof Error ? err.message : 'An unknown error occurred');
-      } finally {
-        setLoading(false);
-      }
-    };
-
-    fetchReview();
-  }, [symbol]);
+const BuffettReview: React.FC<{ panel: PanelState<BuffettReviewData> }> = ({ panel }) => {
+  const { data, loading, error } = panel;
 
   if (loading) {
     return (
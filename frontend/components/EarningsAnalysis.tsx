@@ -13,6 +13,7 @@ import {
   ReferenceLine
 } from 'recharts';
 import { format, parseISO } from 'date-fns';
+import type { PanelState } from '../hooks/useSnapshot';
 
 // Define interfaces for our data structures
 interface PriceData {
@@ -31,10 +32,8 @@ interface EarningsAnalysisData {
   insight?: string; // Optional insight from Gemini
 }
 
-const EarningsAnalysis: React.FC<{ symbol: string }> = ({ symbol }) => {
-  const [data, setData] = useState<EarningsAnalysisData | null>(null);
-  const [loading, setLoading] = useState<boolean>(true);
-  const [error, setError] = useState<string | null>(null);
+const EarningsAnalysis: React.FC<{ panel: PanelState<EarningsAnalysisData> }> = ({ panel }) => {
+  const { data, loading, error } = panel;
   const [theme, setTheme] = useState('light');
 
   // Client-side effect to determine and watch for theme changes
@@ -53,35 +52,6 @@ const EarningsAnalysis: React.FC<{ symbol: string }> = ({ symbol }) => {
     return () => observer.disconnect();
   }, []);
 
-  useEffect(() => {
-    if (!symbol) return;
-
-    const fetchData = async () => {
-      setLoading(true);
-      setError(null);
-      try {
-        const response = await fetch(
-          `http://localhost:8000/api/earnings-analysis?symbol=${symbol}`
-        );
-        if (!response.ok) {
-          const errData = await response.json();
-          throw new Error(errData.error || 'Failed to fetch earnings data');
-        }
-        const result = await response.json();
-        if (result.error) {
-          throw new Error(result.error);
-        }
-        setData(result);
-      } catch (err) {
-        setError(err instanceof Error ? err.message : 'An unknown error occurred');
-      } finally {
-        setLoading(false);
-      }
-    };
-
-    fetchData();
-  }, [symbol]);
-
   // Loading state with skeleton UI
   if (loading) {
     return (
@@ -1,4 +1,5 @@
-import React, { useState, useEffect } from 'react';
+import React from 'react';
+import type { PanelState } from '../hooks/useSnapshot';
 
 interface Rating {
   criterion: string;
@@ -34,34 +35,8 @@ const getVerdictBadgeColor = (verdict: 'BUY' | 'WATCH' | 'AVOID') => {
   }
 };
 
-const MungerReview: React.FC<{ symbol: string }> = ({ symbol }) => {
-  const [data, setData] = useState<MungerReviewData | null>(null);
-  const [loading, setLoading] = useState<boolean>(true);
-  const [error, setError] = useState<string | null>(null);
-
-  useEffect(() => {
-    if (!symbol) return;
-
-    const fetchReview = async () => {
-      setLoading(true);
-      setError(null);
-      try {
-        const response = await fetch(`http://localhost:8000/api/munger-review?symbol=${symbol}`);
-        if (!response.ok) {
-          const errData = await response.json();
-          throw new Error(errData.detail || 'Failed to fetch Munger review');
-        }
-        const result = await response.json();
-        setData(result);
-      } catch (err) {
-        setError(err instanceof Error ? err.message : 'An unknown error occurred');
-      } finally {
-        setLoading(false);
-      }
-    };
-
-    fetchReview();
-  }, [symbol]);
+const MungerReview: React.FC<{ panel: PanelState<MungerReviewData> }> = ({ panel }) => {
+  const { data, loading, error } = panel;
 
   if (loading) {
     return (
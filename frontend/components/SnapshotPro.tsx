@@ -3,22 +3,35 @@ import { AreaChart, Area, ResponsiveContainer, Tooltip, XAxis, YAxis, CartesianG
 import { format } from 'date-fns';
 import { cn } from '../lib/utils';
 import { useStockData } from '../hooks/useStockData';
-import type { SnapshotData } from '../lib/types';
+import type { PanelState } from '../hooks/useSnapshot';
+import type { SnapshotChart, SnapshotColumnarData } from '../lib/types';
 import { Skeleton } from './ui/skeleton';
 import FinancialProfile from './FinancialProfile';
 
-const SnapshotPro: React.FC<{ symbol: string }> = ({ symbol }) => {
+const SnapshotPro: React.FC<{ symbol: string; snapshot: PanelState<SnapshotColumnarData> }> = ({ symbol, snapshot }) => {
   const [range, setRange] = useState('1y');
   const [mode, setMode] = useState<'price' | 'percent'>('price');
-  const { data, loading, error } = useStockData<SnapshotData>(`/price-history?symbol=${symbol}&range=${range.toLowerCase()}&mode=${mode}`);
+  // The default view arrives with the dashboard snapshot; only other ranges and modes are fetched here.
+  const isDefaultView = range.toLowerCase() === '1y' && mode === 'price';
+  // Columnar + server-side downsampling keeps long ranges small; 800 points is more than the chart can draw.
+  const fetched = useStockData<SnapshotColumnarData>(
+    isDefaultView ? null : `/price-history?symbol=${symbol}&range=${range.toLowerCase()}&mode=${mode}&format=columnar&points=800`
+  );
+  const { data, loading, error } = isDefaultView ? snapshot : fetched;
 
   const rangeOptions = ['1D', '5D', '1M', '6M', '1Y', '5Y', 'MAX'];
 
+  const series = useMemo<SnapshotChart['series']>(() => {
+    if (!data) return [];
+    const { timestamps, values } = data.chart;
+    return timestamps.map((timestamp, i) => ({ timestamp, value: values[i] }));
+  }, [data]);
+
   const periodChange = useMemo(() => {
-    if (!data || !data.chart.series || data.chart.series.length === 0) {
+    if (!data || series.length === 0) {
       return { change: data?.header.change || 0, percent: data?.header.changePercent || 0 };
     }
-    const firstValidPoint = data.chart.series.find(p => p.value !== null);
+    const firstValidPoint = series.find(p => p.value !== null);
     const startPrice = firstValidPoint ? firstValidPoint.value : null;
     const currentPrice = data.header.price;
 
@@ -30,16 +43,16 @@ const SnapshotPro: React.FC<{ symbol: string }> = ({ symbol }) => {
     const percent = (change / startPrice) * 100;
     
     return { change, percent };
-  }, [data, range]);
+  }, [data, series, range]);
 
   if (loading) return <div className="w-full bg-white dark:bg-slate-900 rounded-xl shadow-md border border-slate-200 dark:border-slate-800 p-6 h-[600px]"><Skeleton className="h-full w-full" /></div>;
   if (error) return <div className="w-full bg-red-50 dark:bg-red-900/20 text-red-600 dark:text-red-400 p-6 rounded-xl">Error: {error}</div>;
   if (!data) return <div className="w-full bg-white dark:bg-slate-900 p-6 rounded-xl text-slate-500">No data available.</div>;
 
-  const { header, chart, metrics } = data;
+  const { header, metrics } = data;
   const isPositive = periodChange.change >= 0;
 
-  const formatXAxisTick = (tick: string) => {
+  const formatXAxisTick = (tick: string | number) => {
     try {
         const date = new Date(tick);
         if (isNaN(date.getTime())) return '';
@@ -91,7 +104,7 @@ const SnapshotPro: React.FC<{ symbol: string }> = ({ symbol }) => {
 
       <div className="h-72 w-full">
         <ResponsiveContainer width="100%" height="100%">
-          <AreaChart data={chart.series} margin={{ left: -20, right: 10, top: 5, bottom: 0 }}>
+          <AreaChart data={series} margin={{ left: -20, right: 10, top: 5, bottom: 0 }}>
              <defs>
                 <linearGradient id="chartGradient" x1="0" y1="0" x2="0" y2="1">
                   <stop offset="5%" stopColor={isPositive ? '#22c55e' : '#ef4444'} stopOpacity={0.15}/>
@@ -0,0 +1,80 @@
+// frontend/hooks/useSnapshot.ts
+
+import { useState, useEffect } from 'react';
+import type { BuffettReviewData, EarningsData, MungerReviewData, SnapshotColumnarData } from '../lib/types';
+
+export interface PanelState<T> {
+  data: T | null;
+  loading: boolean;
+  error: string | null;
+}
+
+export interface SnapshotPanels {
+  chart: PanelState<SnapshotColumnarData>;
+  earnings: PanelState<EarningsData>;
+  buffett: PanelState<BuffettReviewData>;
+  munger: PanelState<MungerReviewData>;
+}
+
+type PanelName = keyof SnapshotPanels;
+
+const PANELS: PanelName[] = ['chart', 'earnings', 'buffett', 'munger'];
+
+const loadingPanels = (): SnapshotPanels => ({
+  chart: { data: null, loading: true, error: null },
+  earnings: { data: null, loading: true, error: null },
+  buffett: { data: null, loading: true, error: null },
+  munger: { data: null, loading: true, error: null },
+});
+
+/**
+ * Loads every dashboard panel for a symbol over one `/api/snapshot` event stream.
+ * Each panel's state updates as soon as its event arrives, so the chart and
+ * earnings render while the AI reviews are still being generated.
+ * @param symbol The stock symbol to load.
+ * @returns The loading, error and data state of each panel.
+ */
+export function useSnapshot(symbol: string) {
+  const [panels, setPanels] = useState<SnapshotPanels>(loadingPanels);
+
+  useEffect(() => {
+    if (!symbol) return;
+    setPanels(loadingPanels());
+
+    // Relative URL, relying on the Next.js rewrite configuration.
+    const params = new URLSearchParams({ symbol, panels: PANELS.join(','), format: 'columnar', points: '800' });
+    const source = new EventSource(`/api/snapshot?${params}`);
+
+    const update = (name: PanelName, state: PanelState<unknown>) =>
+      setPanels((current) => ({ ...current, [name]: state }) as SnapshotPanels);
+
+    PANELS.forEach((name) => {
+      source.addEventListener(name, (event) => {
+        const payload = JSON.parse((event as MessageEvent).data);
+        if (payload.status === 200) {
+          update(name, { data: payload.data, loading: false, error: null });
+        } else {
+          update(name, { data: null, loading: false, error: payload.error || `Failed to load ${name}` });
+        }
+      });
+    });
+    source.addEventListener('done', () => source.close());
+    source.onerror = () => {
+      // Don't let EventSource reconnect and replay the whole snapshot; fail what's still pending.
+      source.close();
+      setPanels((current) => {
+        const next = { ...current };
+        PANELS.forEach((name) => {
+          if (next[name].loading) {
+            next[name] = { data: null, loading: false, error: 'Connection to the server was lost' };
+          }
+        });
+        return next;
+      });
+    };
+
+    return () => source.close();
+  }, [symbol]);
+
+  return panels;
+}
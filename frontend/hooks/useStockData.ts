@@ -2,6 +2,9 @@
 
 import { useState, useEffect } from 'react';
 
+// Set NEXT_PUBLIC_SERVER_TIMING=1 to have the backend report its per-stage timings.
+const SERVER_TIMING = process.env.NEXT_PUBLIC_SERVER_TIMING === '1';
+
 /**
  * A reusable custom hook to fetch stock data from a given API endpoint.
  * It handles loading, error, and data states.
@@ -24,7 +27,12 @@ export function useStockData<T>(endpoint: string | null) {
       setError(null);
       try {
         // The API endpoint is now relative, relying on the Next.js rewrite configuration.
-        const response = await fetch(`/api${endpoint}`);
+        const response = await fetch(`/api${endpoint}`, {
+          headers: SERVER_TIMING ? { 'X-Server-Timing': '1' } : undefined,
+        });
+        if (SERVER_TIMING) {
+          console.debug(`[server-timing] ${endpoint}: ${response.headers.get('Server-Timing')}`);
+        }
         if (!response.ok) {
           const errData = await response.json();
           throw new Error(errData.detail || errData.error || 'Failed to fetch data');
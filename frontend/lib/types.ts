@@ -13,7 +13,15 @@ export interface SnapshotHeader {
 }
 
 export interface SnapshotChart {
-  series: { timestamp: string; value: number | null }[];
+  series: { timestamp: string | number; value: number | null }[];
+}
+
+// `format=columnar` response: parallel arrays of epoch-ms timestamps and values.
+export interface SnapshotColumnarChart {
+  mode: 'price' | 'percent';
+  format: 'columnar';
+  timestamps: number[];
+  values: (number | null)[];
 }
 
 export interface SnapshotMetrics {
@@ -34,6 +42,12 @@ export interface SnapshotData {
   metrics: SnapshotMetrics;
 }
 
+export interface SnapshotColumnarData {
+  header: SnapshotHeader;
+  chart: SnapshotColumnarChart;
+  metrics: SnapshotMetrics;
+}
+
 export interface MungerRating {
   criterion: string;
   explanation: string;
@@ -55,5 +69,6 @@ export interface EarningsData {
   earningsDate: string;
   actualEPS: number | null;
   expectedEPS: number | null;
-  prices: { date: string; cumPctChange: number }[];
+  prices: { date: string; close: number; pctChange: number; cumPctChange: number }[];
+  surprise: number | null;
 }
@@ -6,11 +6,14 @@ import SnapshotPro from '@/components/SnapshotPro';
 import BuffettReview from '@/components/BuffettReview';
 import MungerReview from '@/components/MungerReview';
 import EarningsAnalysis from '@/components/EarningsAnalysis';
+import { useSnapshot } from '@/hooks/useSnapshot';
 
 const HomePage = () => {
   const [symbol, setSymbol] = useState('AAPL');
   const [input, setInput] = useState('AAPL');
   const [activeTab, setActiveTab] = useState('ai-reviews');
+  // Every panel comes from one snapshot stream; the reviews arrive last.
+  const snapshot = useSnapshot(symbol);
 
   const handleSubmit = (e: FormEvent<HTMLFormElement>) => {
     e.preventDefault();
@@ -30,12 +33,12 @@ const HomePage = () => {
       case 'ai-reviews':
         return (
           <div className="space-y-4">
-            <BuffettReview symbol={symbol} />
-            <MungerReview symbol={symbol} />
+            <BuffettReview panel={snapshot.buffett} />
+            <MungerReview panel={snapshot.munger} />
           </div>
         );
       case 'earnings':
-        return <EarningsAnalysis symbol={symbol} />;
+        return <EarningsAnalysis panel={snapshot.earnings} />;
       default:
         return null;
     }
@@ -79,7 +82,7 @@ const HomePage = () => {
         {symbol ? (
           <main className="grid grid-cols-1 lg:grid-cols-5 gap-6">
             <div className="lg:col-span-3">
-              <SnapshotPro symbol={symbol} />
+              <SnapshotPro symbol={symbol} snapshot={snapshot.chart} />
             </div>
             <div className="lg:col-span-2">
               <div className="bg-white dark:bg-slate-900 rounded-xl shadow-md border border-slate-200 dark:border-slate-800">